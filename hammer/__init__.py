@@ -12,9 +12,19 @@ and decorate it with :function:`adapts`. E.g.:
     def ignore_length(*args, **kwargs):
         return Ignore
 """
-from collections import defaultdict
-from functools import wraps
+from collections import defaultdict, namedtuple, OrderedDict
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
 import functools
+import hashlib
+import json
+import math
+import numbers
+import threading
+import types
+import weakref
 import colander
 
 
@@ -44,27 +54,190 @@ def make_iterable(obj, iter_type):
 make_tuple = functools.partial(make_iterable, iter_type=tuple)
 
 
-_adapters = defaultdict(dict)
+_MISSING = object()
+
+# Objects notified around every adapter call; see :func:`add_hook`.
+_hooks = []
+
+
+class RegistrySnapshot(object):
+    """
+    The adapters registered in a :class:`Registry` at one point in time.
+
+    A snapshot never changes once published, so conversions look adapters up
+    in it without locking, and a conversion uses the same adapters throughout
+    even if others are registered while it runs.
+    """
+    __slots__ = ('adapters', '_dispatch_table', '_validator_fields',
+                 '__weakref__')
+
+    def __init__(self, adapters):
+        # Maps draft versions to mappings of adaptees to adapters.
+        self.adapters = types.MappingProxyType(dict(
+            (version, types.MappingProxyType(dict(version_adapters)))
+            for version, version_adapters in adapters.items()))
+        # Maps ``(draft_version, schema_type, typ class)`` and
+        # ``(draft_version, validator class)`` to the adapter resolved for
+        # them, filled in as classes are first seen. Threads that fill in the
+        # same key store the same adapter, so this needs no lock either.
+        self._dispatch_table = {}
+        # Maps ``(id(validator), draft_version, include_types)`` to the
+        # fields converted for the validator. See :func:`_validator_fields`.
+        self._validator_fields = {}
+
+    def find_schema_adapter(self, node, draft_version):
+        """
+        Return the adapter for ``node`` for ``draft_version``, or None if no
+        adapters are registered for that draft version. See
+        :func:`get_schema_adapter`.
+        """
+        schema_type = node.schema_type
+
+        # Bound methods differ for every node, so they would only fill the
+        # table.
+        if isinstance(schema_type, types.MethodType):
+            schema_type = None
+
+        key = (draft_version, schema_type, node.typ.__class__)
+        adapter = self._dispatch_table.get(key, _MISSING)
+
+        if adapter is _MISSING:
+            adapters = self.adapters.get(draft_version, None)
+
+            if adapters is None:
+                return
+
+            adapter = self._dispatch_table[key] = _resolve_adapter(
+                adapters, (schema_type, node.typ.__class__))
+
+        if adapter is None:
+            raise Invalid(node)
+
+        return adapter
+
+    def find_validator_adapter(self, validator, draft_version):
+        """
+        Return the adapter for ``validator`` for ``draft_version``, else
+        None. See :func:`get_validator_adapter`.
+        """
+        key = (draft_version, validator.__class__)
+        adapter = self._dispatch_table.get(key, _MISSING)
+
+        if adapter is _MISSING:
+            adapters = self.adapters.get(draft_version, None)
+
+            if adapters is None:
+                return
+
+            adapter = self._dispatch_table[key] = _resolve_adapter(
+                adapters, (validator.__class__,))
+
+        if adapter is None:
+            # Validators that are functions are registered by identity.
+            adapter = self.adapters[draft_version].get(validator, None)
+
+        return adapter
+
+
+class Registry(object):
+    """
+    A set of adapters that conversions can be asked to use, e.g. one per
+    application in a process, by passing ``registry`` to
+    :func:`to_json_schema`.
+
+    Registering an adapter publishes a new :class:`RegistrySnapshot` in one
+    step, copying the adapters rather than changing the current snapshot, so
+    conversions already running are unaffected and never need a lock. The
+    adapters that come with Hammer are registered in ``default_registry``,
+    which is used unless another registry is given; start from a
+    :meth:`copy` of it to override some of them.
+    """
+    def __init__(self, snapshot=None):
+        self._snapshot = snapshot or RegistrySnapshot({})
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """
+        Return the current :class:`RegistrySnapshot`.
+        """
+        return self._snapshot
+
+    def copy(self):
+        """
+        Return a new registry holding the adapters registered here now.
+        """
+        return Registry(self._snapshot)
+
+    def register(self, adaptees, adapter, draft_version=None):
+        """
+        Register the callable ``adapter`` as an adapter for the Colander
+        entity ``adaptee`` for JSON Schema draft version ``draft_version``.
+        """
+        draft_version = draft_version or SUPPORTED_JSON_DRAFT_VERSIONS
+        draft_version = make_tuple(draft_version)
+        adaptees = make_tuple(adaptees)
+
+        # Registrations are serialized so that none is lost, but lookups only
+        # ever read a published snapshot.
+        with self._lock:
+            adapters = dict((version, dict(version_adapters))
+                            for version, version_adapters
+                            in self._snapshot.adapters.items())
+            for version in draft_version:
+                for adaptee in adaptees:
+                    adapters.setdefault(version, {})[adaptee] = adapter
+            self._snapshot = RegistrySnapshot(adapters)
+
+        # Cached conversions may have been produced by the adapter being
+        # replaced.
+        for cache in list(_caches):
+            cache.invalidate()
+
+    def adapts(self, *adaptees, **kwargs):
+        """
+        A decorator that registers the decorated function as an adapter in
+        this registry. See :func:`adapts`.
+        """
+        draft_version = kwargs.get('draft_version')
+        deferrable = kwargs.get('deferrable', False)
+        draft_independent = kwargs.get('draft_independent', False)
+
+        def wrapper(fn):
+            fn.deferrable = deferrable
+            fn.draft_independent = draft_independent
+            self.register(adaptees, fn, draft_version)
+            return fn
+        return wrapper
+
+
+default_registry = Registry()
+
+
+def _snapshot_of(registry):
+    """
+    Return the :class:`RegistrySnapshot` to convert with for ``registry``: a
+    :class:`Registry`, a snapshot, or None for the default registry.
+    """
+    if registry is None:
+        return default_registry._snapshot
+    if registry.__class__ is RegistrySnapshot:
+        return registry
+    return registry.snapshot()
 
 
 def register_adapter(adaptees, adapter, draft_version=None):
     """
     Register the callable ``adapter`` as an adapter for the Colander entity
-    ``adaptee`` for JSON Schema draft version ``draft_version``.
+    ``adaptee`` for JSON Schema draft version ``draft_version`` in the
+    default registry.
     """
-    draft_version = draft_version or SUPPORTED_JSON_DRAFT_VERSIONS
-    draft_version = make_tuple(draft_version)
-    adaptees = make_tuple(adaptees)
-
-    for version in draft_version:
-        for adaptee in adaptees:
-            _adapters[version][adaptee] = adapter
+    default_registry.register(adaptees, adapter, draft_version)
 
 
 def adapts(*adaptees, **kwargs):
     """
     A decorator that registers the decorated function as a Hammer adapter for
-    a Colander entity.
+    a Colander entity in the default registry.
 
     ``adaptees`` should be the Colander entity or entities that this adapter
     adapts. This might be a Schema, SchemaType or validator.
@@ -73,18 +246,18 @@ def adapts(*adaptees, **kwargs):
     version for which the adapter applies, or an iterable of version numbers. If
     not provided, this value defaults to all supported drafts via
     `SUPPORTED_JSON_DRAFT_VERSIONS`.
-    """
-    draft_version = kwargs.get('draft_version')
 
-    def wrapper(fn):
-        @wraps(fn)
-        def inner_wrapper(*args, **kwargs):
-            return fn(*args, **kwargs)
+    ``deferrable`` may be set to True for adapters that never return
+    :class:`Ignore`. Conversions that walk the tree lazily (e.g.
+    :func:`to_json_schema_events`) may then put off running such an adapter
+    until its output is needed.
 
-        register_adapter(adaptees, inner_wrapper, draft_version)
-
-        return inner_wrapper
-    return wrapper
+    ``draft_independent`` may be set to True for adapters whose output does
+    not depend on ``draft_version``. :func:`to_json_schemas` then converts
+    a node without children whose adapters are all draft independent once
+    for every draft version.
+    """
+    return default_registry.adapts(*adaptees, **kwargs)
 
 
 class Invalid(Exception):
@@ -107,33 +280,139 @@ class Ignore(object):
     pass
 
 
+class Hook(object):
+    """
+    Base class for objects notified of adapter calls; see :func:`add_hook`.
+    Every method does nothing unless overridden.
+    """
+    def enter(self, kind, target, adapter):
+        """
+        Called before ``adapter`` runs for ``target``. ``kind`` is ``schema``
+        if ``target`` is a Colander node, or ``validator`` if it is one of
+        the node's validators.
+        """
+
+    def exit(self, kind, target, adapter):
+        """
+        Called after ``adapter`` has run for ``target``, even if it raised.
+        """
+
+    def defer(self, node):
+        """
+        Called when the conversion of ``node`` is put off: the adapter will be
+        entered later, once its parent's adapter has returned.
+        """
+
+
+def add_hook(hook):
+    """
+    Notify ``hook``, usually a :class:`Hook`, around every schema and
+    validator adapter call made by the conversions that follow, until it is
+    passed to :func:`remove_hook`.
+
+    Documents served from a :class:`SchemaCache` involve no adapter calls.
+    While no hooks are added, conversions only pay for checking that.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """
+    Stop notifying ``hook`` of adapter calls.
+    """
+    _hooks.remove(hook)
+
+
+def _call_with_hooks(kind, target, adapter, call, *args, **kwargs):
+    """
+    Return ``call(*args, **kwargs)``, notifying the current hooks that
+    ``adapter`` is running for ``target``.
+    """
+    hooks = list(_hooks)
+    for hook in hooks:
+        hook.enter(kind, target, adapter)
+    try:
+        return call(*args, **kwargs)
+    finally:
+        for hook in reversed(hooks):
+            hook.exit(kind, target, adapter)
+
+
+class Deferred(object):
+    """
+    A JSON property for a Colander node whose conversion has been put off.
+
+    :func:`build_json_property` returns these in place of the properties of
+    deferrable nodes when called with ``defer=True``.
+    """
+    __slots__ = ('node', 'kwargs')
+
+    def __init__(self, node, kwargs):
+        self.node = node
+        self.kwargs = kwargs
+
+    def resolve(self):
+        """
+        Convert the node, deferring its own children in turn.
+        """
+        kwargs = self.kwargs
+        adapter = _find_schema_adapter(self.node, kwargs['draft_version'],
+                                       kwargs.get('registry'))
+        return _build_json_property(self.node, adapter, **kwargs)
+
+
 def get_schema_adapter(node, **kwargs):
     """
     Return an adapter function for the Colander Schema or SchemaType ``node``
     if one exists, else None.
 
     Checks for an adapter registered for the node's ``schema_type``
-    field first, then the __class__ of its ``typ`` field.
+    field first, then the __class__ of its ``typ`` field, then the base
+    classes of each in method resolution order. A subclass of e.g.
+    :class:`colander.String` therefore uses the adapter for strings unless
+    one is registered for the subclass itself.
 
     Keyword arguments:
         ``draft_version`` is the JSON Schema draft version the adapter should
             target
+        ``registry`` is the :class:`Registry` or :class:`RegistrySnapshot`
+            to look the adapter up in, if not the default registry
     """
-    draft_version = kwargs['draft_version']
-    adapters = _adapters.get(draft_version, None)
+    adapter = _find_schema_adapter(node, kwargs['draft_version'],
+                                   kwargs.get('registry'))
 
-    if adapters is None:
+    if adapter is None:
         return
 
-    adapter = adapters.get(node.schema_type, None)
+    return functools.partial(adapter, **kwargs)
 
-    if adapter is None:
-        adapter = adapters.get(node.typ.__class__, None)
 
-    if adapter is None:
-        raise Invalid(node)
+def _find_schema_adapter(node, draft_version, registry=None):
+    """
+    Return the adapter registered in ``registry`` for ``node`` for
+    ``draft_version``. See :meth:`RegistrySnapshot.find_schema_adapter`.
+    """
+    if registry.__class__ is not RegistrySnapshot:
+        registry = _snapshot_of(registry)
+    return registry.find_schema_adapter(node, draft_version)
 
-    return functools.partial(adapter, **kwargs)
+
+def _resolve_adapter(adapters, adaptees):
+    """
+    Return the adapter in ``adapters`` registered for the first of
+    ``adaptees``, or failing that for the first of their base classes, or
+    None.
+    """
+    for adaptee in adaptees:
+        adapter = adapters.get(adaptee, None)
+        if adapter is not None:
+            return adapter
+
+    for adaptee in reversed(adaptees):
+        for base in getattr(adaptee, '__mro__', ())[1:]:
+            adapter = adapters.get(base, None)
+            if adapter is not None:
+                return adapter
 
 
 def get_validator_adapter(validator, **kwargs):
@@ -141,20 +420,18 @@ def get_validator_adapter(validator, **kwargs):
     Return an adapter function for the Colander validator class ``validator``
     if one exists, else None.
 
+    Checks for an adapter registered for the validator's class or, failing
+    that, its base classes in method resolution order, then for one
+    registered for the validator itself (e.g. a function).
+
     Keyword arguments:
         ``draft_version`` is the JSON Schema draft version the adapter should
             target
+        ``registry`` is the :class:`Registry` or :class:`RegistrySnapshot`
+            to look the adapter up in, if not the default registry
     """
-    draft_version = kwargs['draft_version']
-    adapters = _adapters.get(draft_version, None)
-
-    if adapters is None:
-        return
-
-    adapter = adapters.get(validator.__class__, None)
-
-    if adapter is None:
-        adapter = adapters.get(validator, None)
+    adapter = _find_validator_adapter(validator, kwargs['draft_version'],
+                                      kwargs.get('registry'))
 
     if adapter is None:
         return
@@ -162,45 +439,1218 @@ def get_validator_adapter(validator, **kwargs):
     return functools.partial(adapter, **kwargs)
 
 
-def to_json_schema(schema, draft_version=4, include_types=True):
+def _find_validator_adapter(validator, draft_version, registry=None):
+    """
+    Return the adapter registered in ``registry`` for ``validator`` for
+    ``draft_version``. See :meth:`RegistrySnapshot.find_validator_adapter`.
+    """
+    if registry.__class__ is not RegistrySnapshot:
+        registry = _snapshot_of(registry)
+    return registry.find_validator_adapter(validator, draft_version)
+
+
+def to_json_schema(schema, draft_version=4, include_types=True, cache=None,
+                   use_definitions=False, registry=None):
     """
     Return a JSON schema document for the Colander schema *instance* ``schema``.
+
+    ``cache`` may be a :class:`SchemaCache` to serve the document from, or
+    True to use the module-level ``schema_cache``. Cached documents are
+    copied on the way out, so callers are free to modify the result.
+
+    If ``use_definitions`` is True, subschemas that occur more than once are
+    emitted once under ``definitions`` and referred to with ``$ref``. See
+    :func:`extract_definitions`.
+
+    ``registry`` may be a :class:`Registry` to look adapters up in instead of
+    ``default_registry``.
     """
     if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
         raise ValueError(
             'The following JSON Schema draft versions are supported: '
-            '%s' % ', '.join(SUPPORTED_JSON_DRAFT_VERSIONS))
+            '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
 
-    adapter = get_schema_adapter(schema, draft_version=draft_version,
-                                 include_types=include_types)
-    return adapter(schema)
+    registry = _snapshot_of(registry)
 
+    if cache is True:
+        cache = schema_cache
 
-def build_json_validators(node, **kwargs):
+    if cache is not None:
+        return cache.get(schema, draft_version=draft_version,
+                         include_types=include_types,
+                         use_definitions=use_definitions, registry=registry)
+
+    deferred = []
+    json_schema = _convert_root(schema, draft_version, include_types,
+                                deferred, registry)
+    _resolve_deferred(json_schema, deferred)
+
+    if use_definitions:
+        json_schema = extract_definitions(json_schema)
+
+    return json_schema
+
+
+def _convert_root(schema, draft_version, include_types, deferred=None,
+                  registry=None, shared=None):
     """
-    Find any validator adapters for the Colander Schema or SchemaType ``node``
-    and return a dict that contains the fields all of the adapters generated.
+    Run the schema adapter for the root node ``schema``, deferring the
+    conversion of its children, and appending them to the list ``deferred``
+    if one is given. ``shared`` is passed on to the adapters if given (see
+    :func:`_build_shared_property`).
+
+    The adapters are looked up in a single snapshot of ``registry``, which is
+    passed on to them as the ``registry`` keyword argument.
+    """
+    registry = _snapshot_of(registry)
+    adapter = registry.find_schema_adapter(schema, draft_version)
+    kwargs = {
+        'draft_version': draft_version,
+        'include_types': include_types,
+        'defer': True,
+        'registry': registry,
+    }
+    if deferred is not None:
+        kwargs['deferred'] = deferred
+    if shared is not None:
+        kwargs['shared'] = shared
+    if _hooks:
+        return _call_with_hooks('schema', schema, adapter, adapter, schema,
+                                **kwargs)
+    return adapter(schema, **kwargs)
+
+
+def to_json_schemas(schema, draft_versions=SUPPORTED_JSON_DRAFT_VERSIONS,
+                    include_types=True, registry=None):
+    """
+    Return a dict mapping each of ``draft_versions`` to the JSON schema
+    document for the Colander schema *instance* ``schema``, walking the tree
+    once for all of them.
+
+    Nodes without children whose adapters are all draft independent (see
+    :func:`adapts`) are converted once, and their properties are shared by
+    the documents, differing at most in the ``required`` flag of draft 3.
+    Copy a document (e.g. with :func:`copy.deepcopy`) before modifying it.
+    """
+    for draft_version in draft_versions:
+        if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+            raise ValueError(
+                'The following JSON Schema draft versions are supported: '
+                '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    registry = _snapshot_of(registry)
+    # A node's property is only reused while the node's parent is converted
+    # for every draft, so the table is cleared between parents.
+    shared = _SharedProperties(registry, draft_versions)
+    documents = {}
+    deferred = {}
+    group = {}
+
+    for draft_version in draft_versions:
+        deferred[draft_version] = []
+        documents[draft_version] = _convert_root(
+            schema, draft_version, include_types, deferred[draft_version],
+            registry, shared)
+        group[draft_version] = (documents[draft_version],
+                                len(deferred[draft_version]))
+        del deferred[draft_version][:]
+
+    # Each group holds the properties of one node for every draft version,
+    # so that their children are converted for every draft in turn. See
+    # :func:`_resolve_deferred`.
+    pending = [group]
+
+    while pending:
+        shared.clear()
+        group = pending.pop()
+        children = []
+
+        for draft_version, (json_property, count) in group.items():
+            if not count or not isinstance(json_property, dict):
+                continue
+            positions = _find_deferred(json_property, count)
+            while len(children) < len(positions):
+                children.append({})
+            for index, (container, key) in enumerate(positions):
+                children[index][draft_version] = container, key
+
+        for child in children:
+            resolved = {}
+            for draft_version, (container, key) in child.items():
+                json_property = container[key] = container[key].resolve()
+                resolved[draft_version] = (json_property,
+                                           len(deferred[draft_version]))
+                del deferred[draft_version][:]
+            pending.append(resolved)
+
+    return documents
+
+
+def _freeze(value):
+    """
+    Return a hashable stand-in for ``value``, recursing into containers.
     """
-    validators = []
-    validator_adapters = {}
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return '<unhashable %s>' % id(value)
+    return value
 
-    if hasattr(node.validator, '__call__'):
-        validators.append(node.validator)
 
-    for validator in validators:
-        validator_adapter = get_validator_adapter(validator, **kwargs)
+def _validator_key(validator):
+    """
+    Return a hashable key that identifies ``validator`` by its state.
+
+    Validator instances (e.g. :class:`colander.Range`) compare by class and
+    attributes, so equal validators built separately share a key. Functions
+    and other stateless validators compare by identity.
+    """
+    if validator is None or not hasattr(validator, '__dict__') or \
+            isinstance(validator, (type, types.FunctionType)):
+        return _freeze(validator)
+    return validator.__class__, _freeze(vars(validator))
 
-        if not validator_adapter:
+
+def fingerprint(node):
+    """
+    Return a hashable structural fingerprint of the Colander node ``node``.
+
+    Two node trees with the same fingerprint convert to the same JSON schema:
+    the fingerprint covers each node's name, title, description, schema
+    type, ``typ`` class and attributes, requiredness, ``missing`` value and
+    validator state, and the fingerprints of its children in order.
+
+    Caches, plans and other conversions that reuse output by fingerprint
+    (e.g. :class:`SchemaCache`, :class:`ConversionPlan`) therefore assume
+    that adapters only read that state of a node. An adapter that reads
+    anything else, e.g. ``widget`` or an attribute set on the node, must not
+    be used with them. Those that reuse a subtree under another name (e.g.
+    :func:`hammer.ir.to_schema_ir`) also assume that a node's property does
+    not depend on its own name, nor on a title made from it.
+    """
+    # Built bottom-up with an explicit stack so that deep trees do not
+    # exhaust the recursion limit.
+    fingerprints = {}
+    stack = [(node, False)]
+
+    while stack:
+        current, visited = stack.pop()
+
+        if not visited:
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.children)
             continue
 
-        json_validator = validator_adapter(validator)
+        fingerprints[id(current)] = _node_fingerprint(current) + (
+            tuple(fingerprints[id(child)] for child in current.children),)
+
+    return fingerprints[id(node)]
 
-        if json_validator is Ignore:
+
+def _node_fingerprint(node):
+    """
+    Return the part of the :func:`fingerprint` of ``node`` that does not
+    depend on its children.
+    """
+    return (
+        node.name,
+        node.schema_type,
+        node.typ.__class__,
+        node.required,
+        node.missing is colander.drop,
+        _validator_key(node.validator),
+        # Titles not set explicitly are made from the name.
+        _freeze(getattr(node, 'raw_title', node.title)),
+        _freeze(node.description),
+        _freeze(vars(node.typ)),
+    )
+
+
+def _interned_fingerprints(node, table):
+    """
+    Return a dict mapping the id of every node in the tree ``node`` to an
+    integer standing for the :func:`fingerprint` of its subtree.
+
+    The integers are assigned by interning each node's fingerprint, with its
+    children's replaced by their integers, in the dict ``table``. Subtrees
+    that share an integer are structurally equal, and hashing the keys costs
+    time linear in the size of the tree rather than in its size times its
+    depth.
+    """
+    interned = {}
+    stack = [(node, False)]
+
+    while stack:
+        current, visited = stack.pop()
+
+        if not visited:
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.children)
             continue
 
-        validator_adapters.update(json_validator)
+        key = _node_fingerprint(current) + (
+            tuple(interned[id(child)] for child in current.children),)
+        interned[id(current)] = table.setdefault(key, len(table))
+
+    return interned
+
+
+def _copy_json(obj):
+    """
+    Return a copy of the JSON document ``obj``, copying every dict and list
+    in it but sharing its scalar values.
+    """
+    if isinstance(obj, dict):
+        copy = dict(obj)
+    elif isinstance(obj, list):
+        copy = list(obj)
+    else:
+        return obj
+
+    # Copied with an explicit stack so that deep documents do not exhaust
+    # the recursion limit.
+    pending = [copy]
+
+    while pending:
+        container = pending.pop()
+        if isinstance(container, dict):
+            items = list(container.items())
+        else:
+            items = enumerate(container)
+        for key, value in items:
+            if isinstance(value, dict):
+                value = container[key] = dict(value)
+            elif isinstance(value, list):
+                value = container[key] = list(value)
+            else:
+                continue
+            pending.append(value)
+
+    return copy
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class SerializedSchema(namedtuple('SerializedSchema', 'data digest')):
+    """
+    A JSON schema document serialized to canonical JSON: ``data`` is the
+    UTF-8 encoded text, with sorted keys and no whitespace, and ``digest`` is
+    the hex SHA-256 digest of it. Equal documents have equal ``data``.
+    """
+    __slots__ = ()
+
+    @property
+    def etag(self):
+        """
+        The strong HTTP entity tag of the document.
+        """
+        return '"%s"' % self.digest
+
+    def headers(self):
+        """
+        Return a list of ``(name, value)`` HTTP response headers for
+        serving ``data``.
+        """
+        return [
+            ('Content-Type', 'application/schema+json'),
+            ('Content-Length', str(len(self.data))),
+            ('ETag', self.etag),
+        ]
+
+    def not_modified(self, if_none_match):
+        """
+        Return True if the value of an ``If-None-Match`` request header
+        matches the document, so that a conditional GET can be answered with
+        304 Not Modified instead of ``data``.
+        """
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == self.etag:
+                return True
+        return False
+
+
+_caches = weakref.WeakSet()
+
+
+class SchemaCache(object):
+    """
+    A bounded LRU cache of JSON schema documents.
+
+    Documents are keyed by the :func:`fingerprint` of the converted schema,
+    interned as an integer, plus the options passed to
+    :func:`to_json_schema`, so separately
+    constructed schemas with the same structure share an entry. The least
+    recently used entry is evicted once ``maxsize`` entries are held; a
+    ``maxsize`` of None means the cache is unbounded.
+
+    Documents serialized by :meth:`get_serialized` are cached as entries of
+    their own, and the canonical JSON text of each deferrable subtree
+    (mappings, sequences and tuples) serialized along the way is kept too, up
+    to ``max_fragments`` of them, so that documents sharing parts of their
+    structure only convert and serialize those parts once.
+
+    Every cache is invalidated when :func:`register_adapter` changes the
+    registered adapters.
+    """
+    def __init__(self, maxsize=128, max_fragments=4096):
+        self.maxsize = maxsize
+        self.max_fragments = max_fragments
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._serialized = OrderedDict()
+        self._fragments = {}
+        self._interned = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries) + len(self._serialized)
+
+    def get(self, schema, draft_version=4, include_types=True, **options):
+        """
+        Return a copy of the JSON schema document for ``schema``, converting
+        and storing it first if it is not cached.
+
+        Additional keyword arguments are passed to :func:`to_json_schema`.
+        """
+        # Documents converted with different adapters are kept apart.
+        options['registry'] = _snapshot_of(options.get('registry'))
+
+        with self._lock:
+            # Documents are keyed by interned fingerprints, so that looking
+            # up a deep schema compares integers rather than nested tuples.
+            self._trim_interned()
+            table = self._interned
+            interned = _interned_fingerprints(schema, table)
+            key = (interned[id(schema)], draft_version, include_types,
+                   tuple(sorted(options.items())))
+            json_schema = self._entries.get(key)
+            if json_schema is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if json_schema is None:
+            json_schema = to_json_schema(schema, draft_version=draft_version,
+                                         include_types=include_types,
+                                         **options)
+            with self._lock:
+                if table is not self._interned:
+                    return _copy_json(json_schema)
+                self._entries[key] = json_schema
+                if self.maxsize is not None:
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+
+        return _copy_json(json_schema)
+
+    def get_serialized(self, schema, draft_version=4, include_types=True,
+                       **options):
+        """
+        Return the :class:`SerializedSchema` of the JSON schema document for
+        ``schema``, converting and serializing it first if it is not cached.
+
+        Additional keyword arguments are passed to :func:`to_json_schema`.
+        """
+        options['registry'] = _snapshot_of(options.get('registry'))
+
+        with self._lock:
+            self._trim_interned()
+            interned = _interned_fingerprints(schema, self._interned)
+            key = (interned[id(schema)], draft_version, include_types,
+                   tuple(sorted(options.items())))
+            serialized = self._serialized.get(key)
+            if serialized is not None:
+                self._serialized.move_to_end(key)
+                self.hits += 1
+                return serialized
+            self.misses += 1
+            fragments = self._fragments
+
+        serialized = _serialize_json_schema(
+            schema, draft_version, include_types, options,
+            fragments=fragments, interned=interned)
+
+        with self._lock:
+            if fragments is self._fragments:
+                self._serialized[key] = serialized
+                if self.maxsize is not None:
+                    while len(self._serialized) > self.maxsize:
+                        self._serialized.popitem(last=False)
+
+        return serialized
+
+    def _trim_interned(self):
+        # Documents and fragments are keyed by interned fingerprints, which
+        # are only meaningful with their table.
+        if len(self._fragments) > self.max_fragments or \
+                len(self._interned) > self.max_fragments * 16:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._serialized.clear()
+        self._fragments = {}
+        self._interned = {}
+
+    def invalidate(self, schema=None):
+        """
+        Drop the cached documents for ``schema`` under every combination of
+        options, or drop every document if ``schema`` is None.
+        """
+        with self._lock:
+            if schema is None:
+                self._clear()
+                return
+            interned = _interned_fingerprints(schema, self._interned)
+            for entries in (self._entries, self._serialized):
+                for key in list(entries):
+                    if key[0] == interned[id(schema)]:
+                        del entries[key]
+
+    def info(self):
+        """
+        Return a :class:`CacheInfo` of the cache's hit and miss counters and
+        its current size.
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+
+schema_cache = SchemaCache()
+
+
+# Python's parser refuses deeply nested literals, so deeper templates are
+# emitted by copying instead of by generated code.
+_MAX_LITERAL_DEPTH = 90
+
+_LITERAL_TYPES = (str, int, bool, type(None))
+
+
+def _literal_source(value, constants, depth=0):
+    """
+    Return Python source for an expression that builds ``value``, or None if
+    ``value`` is nested too deeply to be written as a literal.
+
+    Values that cannot be written as literals are added to ``constants`` and
+    referred to by name.
+    """
+    if depth > _MAX_LITERAL_DEPTH:
+        return None
+
+    if isinstance(value, dict):
+        items = []
+        for key, item in value.items():
+            key_source = _literal_source(key, constants, depth + 1)
+            item_source = _literal_source(item, constants, depth + 1)
+            if item_source is None:
+                return None
+            items.append('%s: %s' % (key_source, item_source))
+        return '{%s}' % ', '.join(items)
+
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            item_source = _literal_source(item, constants, depth + 1)
+            if item_source is None:
+                return None
+            items.append(item_source)
+        return '[%s]' % ', '.join(items)
+
+    if type(value) in _LITERAL_TYPES or (type(value) is float and
+                                         math.isfinite(value)):
+        return repr(value)
+
+    name = '_c%d' % len(constants)
+    constants[name] = value
+    return name
+
+
+def _build_emitter(template):
+    """
+    Return a function that builds a fresh copy of the JSON document
+    ``template`` each time it is called.
+    """
+    constants = {}
+    source = _literal_source(template, constants)
+
+    if source is None:
+        return functools.partial(_copy_json, template)
+
+    namespace = dict(constants)
+    exec('def emit():\n    return %s\n' % source, namespace)
+    return namespace['emit']
+
+
+class ConversionPlan(object):
+    """
+    A Colander schema compiled for repeated conversion to JSON schema.
+
+    Adapters are resolved and run once, when the plan is compiled, and the
+    resulting document is turned into generated Python code that rebuilds it.
+    Calling the plan returns a new document that the caller owns, without
+    walking the Colander tree or dispatching to adapters.
+
+    A plan is recompiled on its next use if the adapters registered in the
+    registry it was compiled with change.
+    """
+    def __init__(self, schema, draft_version=4, include_types=True,
+                 **options):
+        self.schema = schema
+        self.draft_version = draft_version
+        self.include_types = include_types
+        self.options = options
+        self._compile()
+
+    def _compile(self):
+        self.snapshot = _snapshot_of(self.options.get('registry'))
+        self.fingerprint = fingerprint(self.schema)
+        options = dict(self.options, registry=self.snapshot)
+        template = to_json_schema(self.schema,
+                                  draft_version=self.draft_version,
+                                  include_types=self.include_types,
+                                  **options)
+        self._emit = _build_emitter(template)
+
+    def emit(self):
+        """
+        Return a new JSON schema document for the compiled schema.
+        """
+        if _snapshot_of(self.options.get('registry')) is not self.snapshot:
+            self._compile()
+        return self._emit()
+
+    __call__ = emit
+
+    def matches(self, schema):
+        """
+        Return True if ``schema`` has the same structure as the compiled
+        schema, so that this plan's output is valid for it as well.
+        """
+        return fingerprint(schema) == self.fingerprint
+
+
+def compile(schema, draft_version=4, include_types=True, **options):
+    """
+    Compile the Colander schema *instance* ``schema`` into a
+    :class:`ConversionPlan` that emits its JSON schema document.
+
+    A plan may be reused for any schema with the same structure, e.g. the
+    same schema class instantiated for many tenants. Additional keyword
+    arguments are passed to :func:`to_json_schema`.
+    """
+    if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    return ConversionPlan(schema, draft_version=draft_version,
+                          include_types=include_types, **options)
+
+
+class _TrackedChildren(list):
+    """
+    The ``children`` list of a Colander node, which tells the
+    :class:`IncrementalConverter` objects in ``listeners`` when it is about
+    to change.
+    """
+    __slots__ = ('node', 'listeners')
+
+    def __init__(self, node, children):
+        list.__init__(self, children)
+        self.node = node
+        self.listeners = weakref.WeakSet()
+
+    def __reduce__(self):
+        # Copies and pickles of the node get a plain list.
+        return list, (list(self),)
+
+    def _changed(self):
+        for listener in list(self.listeners):
+            listener.invalidate(self.node)
+
+
+def _tracking(method):
+    def tracked(self, *args):
+        self._changed()
+        return method(self, *args)
+    tracked.__name__ = method.__name__
+    return tracked
+
+
+for _name in ('append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__',
+              '__imul__'):
+    setattr(_TrackedChildren, _name, _tracking(getattr(list, _name)))
+
+
+class IncrementalConverter(object):
+    """
+    Regenerates the JSON schema document of a Colander schema that is changed
+    in place, e.g. by adding, inserting or removing child nodes.
+
+    Calling the converter returns the document. The first call converts the
+    whole schema; later calls re-run adapters only for the nodes that changed
+    since and their ancestors, reusing the properties of every other
+    deferrable node (mappings, sequences and tuples) from the previous
+    document. Unchanged subtrees are therefore shared between the documents
+    returned, which callers must not modify.
+
+    Changes to the ``children`` of the nodes converted are noticed
+    automatically. Pass a node changed in any other way, e.g. by assigning
+    its ``validator``, to :meth:`invalidate`. The whole schema is converted
+    again if the adapters registered in ``registry`` change.
+    """
+    def __init__(self, schema, draft_version=4, include_types=True,
+                 registry=None):
+        if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+            raise ValueError(
+                'The following JSON Schema draft versions are supported: '
+                '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+        self.schema = schema
+        self.draft_version = draft_version
+        self.include_types = include_types
+        self.registry = registry
+        self._dirty = {}
+        self._reset()
+
+    def _reset(self):
+        self.snapshot = _snapshot_of(self.registry)
+        self._json_schema = None
+        # Map node ids to ``(node, json_property, children)`` for converted
+        # deferrable nodes and the root, and to ``(node, parent ids)`` for
+        # every node below them.
+        self._entries = {}
+        self._parents = {}
+        self._stale = set()
+
+    def invalidate(self, node=None):
+        """
+        Convert ``node`` again on the next call, or the whole schema if
+        ``node`` is None.
+        """
+        if node is None:
+            self._reset()
+        else:
+            self._dirty[id(node)] = node
+
+    def convert(self):
+        """
+        Return the JSON schema document for the schema as it is now.
+        """
+        if _snapshot_of(self.registry) is not self.snapshot:
+            self._reset()
+
+        if self._json_schema is not None:
+            if not self._dirty:
+                return self._json_schema
+            self._stale = self._find_stale()
+            if self._stale is None:
+                self._reset()
+
+        self._dirty.clear()
+        try:
+            self._json_schema = self._convert()
+        except Exception:
+            self._reset()
+            raise
+        finally:
+            self._stale = set()
+        return self._json_schema
+
+    __call__ = convert
+
+    def _find_stale(self):
+        """
+        Return the ids of the changed nodes and their ancestors, or None if a
+        changed node's position is unknown.
+        """
+        root_id = id(self.schema)
+        stale = set()
+        pending = list(self._dirty)
+
+        while pending:
+            node_id = pending.pop()
+            if node_id in stale:
+                continue
+            stale.add(node_id)
+            if node_id == root_id:
+                continue
+            record = self._parents.get(node_id)
+            if record is None or record[0] is not self._dirty.get(
+                    node_id, record[0]):
+                return None
+            pending.extend(record[1])
+
+        return stale
+
+    def _convert(self):
+        deferred = []
+        json_schema = _convert_root(self.schema, self.draft_version,
+                                    self.include_types, deferred,
+                                    self.snapshot)
+        self._record(self.schema, json_schema, deferred)
+        pending = [(json_schema, len(deferred))]
+        del deferred[:]
+
+        # Like _resolve_deferred, substituting the properties of unchanged
+        # nodes instead of converting them.
+        while pending:
+            json_property, count = pending.pop()
+
+            if not count or not isinstance(json_property, dict):
+                continue
+
+            for container, key in _find_deferred(json_property, count):
+                node = container[key].node
+                entry = self._entries.get(id(node))
+                if entry is not None and entry[0] is node and \
+                        id(node) not in self._stale:
+                    container[key] = entry[1]
+                    continue
+
+                resolved = container[key] = container[key].resolve()
+                self._record(node, resolved, deferred)
+                pending.append((resolved, len(deferred)))
+                del deferred[:]
+
+        return json_schema
+
+    def _track(self, node):
+        if node.children.__class__ is not _TrackedChildren:
+            node.children = _TrackedChildren(node, node.children)
+        node.children.listeners.add(self)
+
+    def _add_parent(self, node, parent):
+        record = self._parents.get(id(node))
+        if record is None or record[0] is not node:
+            record = self._parents[id(node)] = (node, set())
+        record[1].add(id(parent))
+
+    def _record(self, node, json_property, deferred):
+        """
+        Remember the property converted for ``node`` and where its children
+        are. ``deferred`` holds the children that were deferred; the others
+        were converted along with ``node``, so every node below them is
+        recorded too.
+        """
+        children = tuple(node.children)
+        previous = self._entries.get(id(node))
+        self._entries[id(node)] = (node, json_property, children)
+        self._track(node)
+
+        if previous is not None and previous[0] is node:
+            current = set(map(id, children))
+            for child in previous[2]:
+                if id(child) not in current:
+                    self._detach(child, node)
+
+        deferred_ids = set(id(item.node) for item in deferred)
+        pending = [(child, node) for child in children]
+        while pending:
+            child, parent = pending.pop()
+            self._add_parent(child, parent)
+            if parent is node and id(child) in deferred_ids:
+                continue
+            self._track(child)
+            pending.extend((grandchild, child)
+                           for grandchild in child.children)
+
+    def _detach(self, node, parent):
+        """
+        Forget ``node`` as a child of ``parent``, and everything recorded
+        below it if it has no other parent.
+        """
+        pending = [(node, parent)]
+        while pending:
+            node, parent = pending.pop()
+            record = self._parents.get(id(node))
+            if record is None or record[0] is not node:
+                continue
+            record[1].discard(id(parent))
+            if record[1]:
+                continue
+
+            del self._parents[id(node)]
+            children = node.children
+            entry = self._entries.get(id(node))
+            if entry is not None and entry[0] is node:
+                del self._entries[id(node)]
+                children = entry[2]
+            if node.children.__class__ is _TrackedChildren:
+                node.children.listeners.discard(self)
+            pending.extend((child, node) for child in children)
+
+
+# Keywords whose value is a subschema, a list of subschemas or a dict of
+# subschemas, across draft 3 and draft 4.
+_SCHEMA_KEYWORDS = ('not', 'additionalProperties', 'additionalItems',
+                    'extends')
+_SCHEMA_LIST_KEYWORDS = ('allOf', 'anyOf', 'oneOf', 'extends', 'items')
+_SCHEMA_DICT_KEYWORDS = ('properties', 'patternProperties', 'dependencies',
+                         'definitions')
+
+
+def _subschema_slots(json_schema):
+    """
+    Yield a ``(container, key, name)`` triple for every subschema directly
+    nested in ``json_schema``. ``container[key]`` is the subschema and
+    ``name`` is a hint for what to call it.
+    """
+    for keyword, value in json_schema.items():
+        if keyword in _SCHEMA_DICT_KEYWORDS and isinstance(value, dict):
+            for name, subschema in value.items():
+                if isinstance(subschema, dict):
+                    yield value, name, name
+        elif keyword in _SCHEMA_LIST_KEYWORDS and isinstance(value, list):
+            for index, subschema in enumerate(value):
+                if isinstance(subschema, dict):
+                    yield value, index, '%s_%d' % (keyword, index)
+        elif isinstance(value, dict) and (keyword in _SCHEMA_KEYWORDS or
+                                          keyword == 'items'):
+            yield json_schema, keyword, keyword
+
+
+def _escape_pointer(token):
+    """
+    Escape ``token`` for use in a JSON pointer (RFC 6901).
+    """
+    return token.replace('~', '~0').replace('/', '~1')
+
+
+def _unescape_pointer(token):
+    """
+    Undo :func:`_escape_pointer`.
+    """
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def extract_definitions(json_schema, min_occurrences=2):
+    """
+    Return a copy of the JSON schema document ``json_schema`` in which every
+    object or array subschema occurring at least ``min_occurrences`` times is
+    emitted once under ``definitions`` and replaced by a ``$ref``.
+
+    Definitions are named after the property (or keyword) at which the
+    subschema first occurs. A definition that ends up referenced only once,
+    e.g. because it only occurs inside another definition, is inlined again.
+    """
+    # Intern every value so that structurally identical subtrees share an
+    # id, without repeatedly hashing large nested tuples. Documents are
+    # walked with explicit stacks so that deep ones do not exhaust the
+    # recursion limit.
+    interned = {}
+    ids = {}
+    pending = [(json_schema, False)]
+
+    while pending:
+        value, visited = pending.pop()
+
+        if not visited:
+            # Read-only values are shared and cannot change, so each is
+            # only walked once.
+            if isinstance(value, (_ReadOnlyList, _ReadOnlyDict)) and \
+                    id(value) in ids:
+                continue
+            if isinstance(value, dict):
+                pending.append((value, True))
+                pending.extend((item, False) for item in value.values())
+                continue
+            if isinstance(value, list):
+                pending.append((value, True))
+                pending.extend((item, False) for item in value)
+                continue
+            structure = ('value', type(value), _freeze(value))
+        elif isinstance(value, dict):
+            structure = ('dict',) + tuple(
+                (key, ids[id(item)]) for key, item in value.items())
+        else:
+            structure = ('list',) + tuple(ids[id(item)] for item in value)
+
+        ids[id(value)] = interned.setdefault(structure, len(interned))
+
+    occurrences = defaultdict(int)
+    pending = [json_schema]
+
+    while pending:
+        for container, key, name in _subschema_slots(pending.pop()):
+            occurrences[ids[id(container[key])]] += 1
+            pending.append(container[key])
+
+    existing_names = set(json_schema.get('definitions', ()))
+    definitions = OrderedDict()
+    names = {}
+
+    def name_definition(hint):
+        name = hint
+        suffix = 1
+        while name in definitions or name in existing_names:
+            suffix += 1
+            name = '%s_%d' % (hint, suffix)
+        return name
+
+    def copy(schema):
+        schema = dict(schema)
+        for keyword, value in schema.items():
+            if keyword in _SCHEMA_DICT_KEYWORDS and isinstance(value, dict):
+                schema[keyword] = dict(value)
+            elif keyword in _SCHEMA_LIST_KEYWORDS and \
+                    isinstance(value, list):
+                schema[keyword] = list(value)
+        return schema
+
+    # Subschemas are rewritten depth first, in the order they occur, so
+    # definitions are named and ordered by their first occurrence.
+    root = copy(json_schema)
+    pending = [iter(list(_subschema_slots(root)))]
+
+    while pending:
+        for container, key, hint in pending[-1]:
+            subschema = container[key]
+            value_id = ids[id(subschema)]
+            compound = any(True for _ in _subschema_slots(subschema))
+            # Shared subschemas, like those of a LargeEnumAdapter, are
+            # worth a definition however small they are.
+            shared = subschema.__class__ is _ReadOnlyDict
+            if shared and 'enum' in subschema:
+                hint = 'enum'
+
+            rewritten = None
+            if not (compound or shared) or \
+                    occurrences[value_id] < min_occurrences:
+                rewritten = container[key] = copy(subschema)
+                pending.append(iter(list(_subschema_slots(rewritten))))
+                break
+
+            name = names.get(value_id)
+            if name is None:
+                name = names[value_id] = name_definition(hint)
+                rewritten = definitions[name] = copy(subschema)
+                pending.append(iter(list(_subschema_slots(rewritten))))
+
+            container[key] = {
+                '$ref': '#/definitions/%s' % _escape_pointer(name)
+            }
+            if rewritten is not None:
+                break
+        else:
+            pending.pop()
+
+    if definitions:
+        _inline_single_references(root, definitions)
+
+    if definitions:
+        root.setdefault('definitions', {}).update(definitions)
+
+    return root
+
+
+def _inline_single_references(root, definitions):
+    """
+    Replace each ``$ref`` to a definition in ``definitions`` that is
+    referenced exactly once by the definition itself.
+    """
+    references = defaultdict(list)
+    pending = [root]
+    pending.extend(definitions.values())
+
+    while pending:
+        for container, key, name in _subschema_slots(pending.pop()):
+            ref = container[key].get('$ref')
+            if ref is not None and len(container[key]) == 1:
+                references[ref].append((container, key))
+            else:
+                pending.append(container[key])
+
+    for name in list(definitions):
+        places = references.get('#/definitions/%s' % _escape_pointer(name))
+        if places is not None and len(places) == 1:
+            container, key = places[0]
+            container[key] = definitions.pop(name)
+
+
+def build_json_validators(node, **kwargs):
+    """
+    Find any validator adapters for the Colander Schema or SchemaType ``node``
+    and return a mapping that contains the fields all of the adapters
+    generated.
+
+    The fields are memoized per validator instance (see
+    :func:`_validator_fields`), so the mapping may be shared and read-only.
+    """
+    validator = node.validator
+
+    if not hasattr(validator, '__call__'):
+        return _NO_FIELDS
+
+    if _hooks:
+        # Hooks are told about every adapter call, so nothing is memoized.
+        return _run_validator_adapter(validator, kwargs)
+
+    return _validator_fields(validator, kwargs)
+
+
+_NO_FIELDS = types.MappingProxyType({})
+
+
+def _run_validator_adapter(validator, kwargs):
+    """
+    Return a dict of the fields the adapter for ``validator`` generates.
+    """
+    validator_adapter = _find_validator_adapter(
+        validator, kwargs['draft_version'], kwargs.get('registry'))
+
+    if not validator_adapter:
+        return {}
+
+    if _hooks:
+        json_validator = _call_with_hooks(
+            'validator', validator, validator_adapter, validator_adapter,
+            validator, **kwargs)
+    else:
+        json_validator = validator_adapter(validator, **kwargs)
+
+    if json_validator is Ignore:
+        return {}
+
+    return json_validator
+
+
+def _validator_fields(validator, kwargs):
+    """
+    Return a mapping of the fields the adapter for ``validator`` generates,
+    running the adapter only the first time ``validator`` is converted for
+    the draft version and registry snapshot in ``kwargs``.
+
+    The fields are shared by every node with the validator, so they are
+    kept read-only, lists and dicts in them included (see
+    :class:`_ReadOnlyList`). Validators are assumed not to change once
+    converted; their fields are forgotten when they are garbage collected or
+    an adapter is registered.
+    """
+    registry = kwargs.get('registry')
+    if registry.__class__ is not RegistrySnapshot:
+        registry = _snapshot_of(registry)
+
+    key = (id(validator), kwargs['draft_version'], kwargs['include_types'])
+    entry = registry._validator_fields.get(key)
+
+    if entry is not None and entry[0]() is validator:
+        return entry[1]
+
+    fields = types.MappingProxyType(dict(
+        (name, _read_only_json(value))
+        for name, value in _run_validator_adapter(validator, kwargs).items()))
+    try:
+        ref = weakref.ref(validator, functools.partial(
+            _forget_validator_fields, registry._validator_fields, key))
+    except TypeError:
+        return fields
+    registry._validator_fields[key] = (ref, fields)
+    return fields
+
+
+def _forget_validator_fields(table, key, ref):
+    entry = table.get(key)
+    if entry is not None and entry[0] is ref:
+        del table[key]
+
+
+def _read_only(method):
+    def read_only(self, *args, **kwargs):
+        raise TypeError('%s objects are shared between documents and '
+                        'cannot be changed; copy them first' %
+                        self.__class__.__name__)
+    read_only.__name__ = method.__name__
+    return read_only
 
-    return validator_adapters
+
+class _ReadOnlyList(list):
+    """
+    A list in memoized validator fields, e.g. an ``enum``, which documents
+    share and so cannot be changed. It is a list to everything that reads
+    it, :mod:`json` included, and copies and pickles of it are plain lists.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class _ReadOnlyDict(dict):
+    """
+    A dict in memoized validator fields. See :class:`_ReadOnlyList`.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+for _name in ('append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__',
+              '__imul__'):
+    setattr(_ReadOnlyList, _name, _read_only(getattr(list, _name)))
+
+for _name in ('__setitem__', '__delitem__', 'clear', 'pop', 'popitem',
+              'setdefault', 'update', '__ior__'):
+    setattr(_ReadOnlyDict, _name, _read_only(getattr(dict, _name)))
+
+
+class EnumChoices(_ReadOnlyList):
+    """
+    The read-only choices of an "enum" converted by a
+    :class:`LargeEnumAdapter`, stored once however many nodes use them.
+
+    ``members`` is a frozenset of the choices for fast membership tests, or
+    None if some of them cannot be hashed. Like any set, it does not tell
+    True from 1. ``strings`` is True if every choice is a string.
+    """
+    __slots__ = ('members', 'strings', 'scalars', 'text')
+
+    def __init__(self, choices):
+        _ReadOnlyList.__init__(self, choices)
+        try:
+            self.members = frozenset(self)
+        except TypeError:
+            self.members = None
+        self.strings = all(choice.__class__ is str for choice in self)
+        self.scalars = self.strings or not any(
+            isinstance(choice, (dict, list)) for choice in self)
+        # The canonical JSON text of the choices, once serialized.
+        self.text = None
+
+
+def _read_only_json(value):
+    """
+    Return a read-only copy of the JSON value ``value``, sharing any parts of
+    it that are read-only already.
+    """
+    if isinstance(value, (_ReadOnlyList, _ReadOnlyDict)):
+        return value
+    if isinstance(value, list):
+        return _ReadOnlyList(_read_only_json(item) for item in value)
+    if isinstance(value, dict):
+        return _ReadOnlyDict((key, _read_only_json(item))
+                             for key, item in value.items())
+    return value
 
 
 def build_json_property(node, **kwargs):
@@ -212,15 +1662,147 @@ def build_json_property(node, **kwargs):
         ``draft_version`` is the JSON Schema draft version to target
         ``include_types`` is a boolean signifying whether or not the JSON
             property should include type information
+        ``defer``, if True, returns a :class:`Deferred` for nodes whose
+            adapter is deferrable instead of converting them, and appends it
+            to the list ``deferred`` if one is given. Adapters pass
+            their keyword arguments on, so an adapter that needs to inspect
+            the properties of its children should call this function with
+            ``defer=False``.
+        ``registry`` is the :class:`RegistrySnapshot` to look adapters up in
     """
-    adapter = get_schema_adapter(node, **kwargs)
-    draft_version = kwargs['draft_version']
-    include_types = kwargs['include_types']
+    if 'shared' in kwargs and not node.children and \
+            kwargs['shared'].uniform:
+        json_property = kwargs['shared'].get(node, kwargs['draft_version'])
+        if json_property is not _MISSING:
+            return json_property
+
+    adapter = _find_schema_adapter(node, kwargs['draft_version'],
+                                   kwargs.get('registry'))
 
     if adapter is None:
         raise Invalid(node)
 
-    json_property = adapter(node)
+    if kwargs.get('defer') and getattr(adapter, 'deferrable', False):
+        deferred = Deferred(node, kwargs)
+        for hook in _hooks:
+            hook.defer(node)
+        if 'deferred' in kwargs:
+            kwargs['deferred'].append(deferred)
+        return deferred
+
+    return _build_json_property(node, adapter, **kwargs)
+
+
+def _build_json_property(node, adapter, **kwargs):
+    """
+    Run the schema adapter ``adapter`` for ``node`` and finish the resulting
+    JSON property. See :func:`build_json_property`.
+    """
+    if 'shared' in kwargs and not node.children:
+        return _build_shared_property(node, adapter, kwargs)
+
+    draft_version = kwargs['draft_version']
+    include_types = kwargs['include_types']
+
+    if _hooks:
+        # Validators run within the node's adapter call.
+        return _call_with_hooks('schema', node, adapter, _finish_json_property,
+                                node, adapter, draft_version, include_types,
+                                kwargs)
+    return _finish_json_property(node, adapter, draft_version, include_types,
+                                 kwargs)
+
+
+class _SharedProperties(object):
+    """
+    The properties of nodes without children converted so far by
+    :func:`to_json_schemas`, by node id, for reuse for other draft versions.
+
+    Only the properties of nodes whose adapters are draft independent are
+    kept. If the adapters registered for every draft version are the same,
+    ``uniform`` is True and a node's adapters need not be looked up again to
+    reuse its property.
+    """
+    __slots__ = ('uniform', '_entries')
+
+    def __init__(self, registry, draft_versions):
+        adapters = [registry.adapters.get(draft_version)
+                    for draft_version in draft_versions]
+        self.uniform = all(version_adapters == adapters[0]
+                           for version_adapters in adapters)
+        self._entries = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, node, draft_version, adapter=None, validator_adapter=None):
+        """
+        Return the property of ``node`` for ``draft_version``, or _MISSING
+        if there is none or, unless ``uniform``, if it was not built by
+        ``adapter`` and ``validator_adapter``.
+        """
+        entry = self._entries.get(id(node))
+        if entry is None:
+            return _MISSING
+        if not self.uniform and (entry[0] is not adapter or
+                                 entry[1] is not validator_adapter):
+            return _MISSING
+
+        json_property = entry[3]
+        # Only the ``required`` flag of draft 3 differs between drafts.
+        if node.required and json_property is not Ignore and \
+                (draft_version == 3) != (entry[2] == 3):
+            json_property = dict(json_property)
+            if draft_version == 3:
+                json_property['required'] = True
+            else:
+                del json_property['required']
+        return json_property
+
+    def add(self, node, adapter, validator_adapter, draft_version,
+            json_property):
+        if getattr(adapter, 'draft_independent', False) and (
+                validator_adapter is None or
+                getattr(validator_adapter, 'draft_independent', False)):
+            self._entries[id(node)] = (adapter, validator_adapter,
+                                       draft_version, json_property)
+
+
+def _build_shared_property(node, adapter, kwargs):
+    """
+    Return the JSON property for ``node``, a node without children, reusing
+    the property built for it for another draft version if its adapters
+    are draft independent. See :func:`to_json_schemas`.
+    """
+    shared = kwargs['shared']
+    draft_version = kwargs['draft_version']
+    validator_adapter = None
+
+    if hasattr(node.validator, '__call__'):
+        validator_adapter = _find_validator_adapter(
+            node.validator, draft_version, kwargs.get('registry'))
+
+    json_property = shared.get(node, draft_version, adapter,
+                               validator_adapter)
+    if json_property is not _MISSING:
+        return json_property
+
+    if _hooks:
+        json_property = _call_with_hooks(
+            'schema', node, adapter, _finish_json_property, node, adapter,
+            draft_version, kwargs['include_types'], kwargs)
+    else:
+        json_property = _finish_json_property(
+            node, adapter, draft_version, kwargs['include_types'], kwargs)
+
+    shared.add(node, adapter, validator_adapter, draft_version,
+               json_property)
+    return json_property
+
+
+def _finish_json_property(node, adapter, draft_version, include_types,
+                          kwargs):
+    json_property = adapter(node, **kwargs)
 
     if json_property is Ignore:
         return Ignore
@@ -242,14 +1824,612 @@ def build_json_property(node, **kwargs):
     return json_property
 
 
-@adapts(colander.Int, colander.Integer)
+def _find_deferred(json_property, count):
+    """
+    Return the ``(container, key)`` positions of the ``count``
+    :class:`Deferred` properties an adapter placed in ``json_property``.
+
+    Adapters put their children's properties directly into the property they
+    return or into a dict or list in it (e.g. ``properties`` or ``items``),
+    so only those are checked unless some are not found there.
+    """
+    positions = []
+
+    for key, value in json_property.items():
+        if value.__class__ is Deferred:
+            positions.append((json_property, key))
+        elif isinstance(value, dict):
+            positions.extend((value, child_key)
+                             for child_key, child in value.items()
+                             if child.__class__ is Deferred)
+        elif isinstance(value, list):
+            positions.extend((value, index)
+                             for index, child in enumerate(value)
+                             if child.__class__ is Deferred)
+
+    if len(positions) >= count:
+        return positions
+
+    positions = []
+    pending = [json_property]
+
+    while pending:
+        container = pending.pop()
+        if isinstance(container, dict):
+            items = container.items()
+        else:
+            items = enumerate(container)
+        for key, value in items:
+            if value.__class__ is Deferred:
+                positions.append((container, key))
+            elif isinstance(value, (dict, list)):
+                pending.append(value)
+
+    return positions
+
+
+def _resolve_deferred(json_property, deferred):
+    """
+    Replace every :class:`Deferred` in ``json_property`` with the property it
+    stands for, in place. ``deferred`` is the list the adapter that returned
+    ``json_property`` appended its :class:`Deferred` properties to.
+
+    Resolving a :class:`Deferred` converts one node and defers its children,
+    so this walks a tree of any depth with an explicit stack instead of
+    recursing once per level.
+    """
+    pending = [(json_property, len(deferred))]
+    del deferred[:]
+
+    while pending:
+        json_property, count = pending.pop()
+
+        if not count or not isinstance(json_property, dict):
+            continue
+
+        for container, key in _find_deferred(json_property, count):
+            resolved = container[key] = container[key].resolve()
+            pending.append((resolved, len(deferred)))
+            del deferred[:]
+
+
+# Marks values inside arrays, which have no key, in _json_events.
+_NO_KEY = object()
+
+
+def _json_events(value, replace=None):
+    """
+    Yield the events that describe the JSON value ``value``, resolving any
+    :class:`Deferred` properties in it as they are reached.
+
+    If ``replace`` is given, it is called with each :class:`Deferred`
+    property first, and its result is used instead unless it is None.
+    """
+    stack = [iter(((_NO_KEY, value),))]
+    ends = [None]
+
+    while stack:
+        for key, item in stack[-1]:
+            if key is not _NO_KEY:
+                yield 'key', key
+
+            if item.__class__ is Deferred:
+                replacement = None
+                if replace is not None:
+                    replacement = replace(item)
+                item = item.resolve() if replacement is None else replacement
+
+            if isinstance(item, dict):
+                yield 'start_object', None
+                stack.append(iter(item.items()))
+                ends.append('end_object')
+                break
+
+            if isinstance(item, list):
+                yield 'start_array', None
+                stack.append(((_NO_KEY, element) for element in item))
+                ends.append('end_array')
+                break
+
+            if item.__class__ is LazySchema or item.__class__ is LazyArray:
+                yield ('start_object' if item.__class__ is LazySchema
+                       else 'start_array'), None
+                stack.append(item._items())
+                ends.append('end_object' if item.__class__ is LazySchema
+                            else 'end_array')
+                break
+
+            yield 'value', item
+        else:
+            stack.pop()
+            end = ends.pop()
+            if end is not None:
+                yield end, None
+
+
+def to_json_schema_events(schema, draft_version=4, include_types=True,
+                          registry=None):
+    """
+    Yield the JSON schema document for the Colander schema *instance*
+    ``schema`` as a stream of ``(event, value)`` pairs.
+
+    The events are ``start_object``, ``key``, ``value``, ``end_object``,
+    ``start_array`` and ``end_array``; ``value`` is the object key for
+    ``key`` events, the scalar for ``value`` events and None otherwise.
+
+    Child nodes with deferrable adapters are converted only when the walk
+    reaches them and are released once their events have been yielded, so
+    memory use is bounded by the depth of the schema rather than its size.
+    """
+    if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    return _json_events(_convert_root(schema, draft_version, include_types,
+                                      registry=registry))
+
+
+def _lazy_value(value, cache, key):
+    """
+    Return ``value``, the value at ``key`` of a :class:`LazySchema` or
+    :class:`LazyArray`, resolving it if it is a :class:`Deferred` and
+    wrapping it if it is a dict or list, and remember it in ``cache``.
+    """
+    resolved = value.__class__ is Deferred
+    if resolved:
+        value = value.resolve()
+    # Read-only values are shared between documents and hold no deferred
+    # properties, so they are returned as they are.
+    if value.__class__ is dict:
+        value = LazySchema(value)
+    elif value.__class__ is list:
+        value = LazyArray(value)
+    elif not resolved:
+        return value
+    cache[key] = value
+    return value
+
+
+class LazySchema(Mapping):
+    """
+    A JSON object in a document built by :func:`to_lazy_json_schema`, which
+    runs the adapters of the nodes in it only when they are read.
+
+    Its items are those of the dict an adapter returned. The properties of
+    child nodes with deferrable adapters (mappings, sequences and tuples),
+    e.g. an entry of ``properties`` or an element of ``items``, are
+    converted the first time they are read, and kept. Dicts and lists in it
+    are read as :class:`LazySchema` and :class:`LazyArray` objects. Other
+    properties are converted along with the object that holds them, as
+    adapters that may return :class:`Ignore` must run to tell whether the
+    property is there at all.
+
+    The adapter's dict is not changed.
+    """
+    __slots__ = ('_data', '_cache')
+
+    def __init__(self, data):
+        self._data = data
+        self._cache = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            return _lazy_value(self._data[key], self._cache, key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '<LazySchema %r>' % (list(self._data),)
+
+    def _items(self):
+        """
+        Yield the items of the object as read so far, without resolving any.
+        """
+        cache = self._cache
+        for key, value in self._data.items():
+            yield key, cache.get(key, value)
+
+    def to_dict(self):
+        """
+        Return the whole document from this object down as plain dicts and
+        lists, converting the nodes that have not been read yet.
+        """
+        return _lazy_to_json(self)
+
+    def events(self):
+        """
+        Yield the document from this object down as ``(event, value)``
+        pairs. See :func:`to_json_schema_events`.
+        """
+        return _json_events(self)
+
+
+class LazyArray(Sequence):
+    """
+    A JSON array in a document built by :func:`to_lazy_json_schema`. See
+    :class:`LazySchema`. It is equal to a list with equal items.
+    """
+    __slots__ = ('_data', '_cache')
+
+    def __init__(self, data):
+        self._data = data
+        self._cache = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[each] for each in range(len(self._data))[index]]
+        if index < 0:
+            index += len(self._data)
+        try:
+            return self._cache[index]
+        except KeyError:
+            return _lazy_value(self._data[index], self._cache, index)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, LazyArray)):
+            return len(self) == len(other) and \
+                all(item == each for item, each in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<LazyArray of %d>' % len(self._data)
+
+    def _items(self):
+        cache = self._cache
+        for index, value in enumerate(self._data):
+            yield _NO_KEY, cache.get(index, value)
+
+    to_dict = LazySchema.to_dict
+    events = LazySchema.events
+
+
+def _lazy_to_json(value):
+    """
+    Return a copy of ``value``, a :class:`LazySchema` or :class:`LazyArray`,
+    as plain dicts and lists, resolving any :class:`Deferred` properties in
+    it. Read-only values are shared with it, as :func:`to_json_schema`
+    shares them.
+    """
+    root = []
+    stack = [(iter(((_NO_KEY, value),)), root)]
+
+    while stack:
+        items, target = stack[-1]
+        for key, item in items:
+            if item.__class__ is Deferred:
+                item = item.resolve()
+
+            if item.__class__ is LazySchema or item.__class__ is LazyArray:
+                copy = {} if item.__class__ is LazySchema else []
+                children = item._items()
+            elif item.__class__ is dict:
+                copy = {}
+                children = iter(item.items())
+            elif item.__class__ is list:
+                copy = []
+                children = ((_NO_KEY, element) for element in item)
+            else:
+                copy = children = None
+
+            if key is _NO_KEY:
+                target.append(item if children is None else copy)
+            else:
+                target[key] = item if children is None else copy
+
+            if children is not None:
+                stack.append((children, copy))
+                break
+        else:
+            stack.pop()
+
+    return root[0]
+
+
+def to_lazy_json_schema(schema, draft_version=4, include_types=True,
+                        registry=None):
+    """
+    Return the JSON schema document for the Colander schema *instance*
+    ``schema`` as a :class:`LazySchema`, which converts the subtrees of the
+    schema as they are read, e.g. by a viewer that shows one branch of a
+    large schema at a time:
+
+        json_schema = to_lazy_json_schema(schema)
+        json_schema['properties']['address']['properties']['city']
+
+    Only the root node is converted up front. :meth:`LazySchema.to_dict`
+    returns the full document, and :meth:`LazySchema.events` streams it (see
+    :func:`iter_json_text`).
+    """
+    if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    json_schema = _convert_root(schema, draft_version, include_types,
+                                registry=registry)
+    if json_schema.__class__ is not dict:
+        return json_schema
+    return LazySchema(json_schema)
+
+
+def iter_json_text(events, chunk_size=65536, default=None):
+    """
+    Encode the ``(event, value)`` pairs from ``events`` as JSON text, and
+    yield it in strings of roughly ``chunk_size`` characters.
+
+    The text is formatted as :func:`json.dumps` formats it by default.
+    ``default`` is passed to :class:`json.JSONEncoder` to encode values it
+    does not support.
+    """
+    encode = json.JSONEncoder(default=default).encode
+    chunk = []
+    size = 0
+    # Whether the next value in the current container needs a separator.
+    separate = False
+
+    for event, value in events:
+        if event == 'key':
+            if not isinstance(value, str):
+                value = encode(value).strip('"')
+            text = '%s%s: ' % (', ' if separate else '', encode(value))
+            separate = False
+        elif event == 'value':
+            text = '%s%s' % (', ' if separate else '', encode(value))
+            separate = True
+        elif event == 'start_object' or event == 'start_array':
+            text = '%s%s' % (', ' if separate else '',
+                             '{' if event == 'start_object' else '[')
+            separate = False
+        else:
+            text = '}' if event == 'end_object' else ']'
+            separate = True
+
+        chunk.append(text)
+        size += len(text)
+
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_json_schema(schema, fp, draft_version=4, include_types=True,
+                      chunk_size=65536, default=None, registry=None):
+    """
+    Write the JSON schema document for the Colander schema *instance*
+    ``schema`` to the file-like object ``fp`` as JSON text, converting it as
+    it is written. See :func:`to_json_schema_events`.
+    """
+    events = to_json_schema_events(schema, draft_version=draft_version,
+                                   include_types=include_types,
+                                   registry=registry)
+    for text in iter_json_text(events, chunk_size=chunk_size,
+                               default=default):
+        fp.write(text)
+
+
+def _json_default(value):
+    """
+    Encode the values that adapters may put in a document but :mod:`json`
+    does not support, like :class:`decimal.Decimal` bounds.
+    """
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return str(value)
+
+
+_canonical_encoder = json.JSONEncoder(separators=(',', ':'),
+                                      default=_json_default)
+
+
+def _canonical_text(value, fragments=None, interned=None):
+    """
+    Return ``value`` serialized as canonical JSON text, resolving any
+    :class:`Deferred` properties in it.
+
+    If ``fragments`` is a dict, each :class:`Deferred` property is looked
+    up in it by the integer that the dict ``interned`` maps its node's id to
+    (see :func:`_interned_fingerprints`) along with its conversion options,
+    and stored in it if it is missing, in which case the node is converted.
+    Rather than its whole text, which would make the fragments of a deep
+    tree take space quadratic in its depth, a fragment is a tuple of strings
+    and the keys of the fragments nested in it.
+    """
+    encode = _canonical_encoder.encode
+    stack = [iter(((_NO_KEY, value),))]
+    # The closing bracket of each open container, and the fragment key of
+    # the Deferred property it stands for, if any.
+    ends = [(None, None)]
+    # The parts of the document and of every fragment being serialized.
+    chunks = [[]]
+    separate = False
+
+    while stack:
+        for key, item in stack[-1]:
+            text = chunks[-1]
+            if separate:
+                text.append(',')
+            if key is not _NO_KEY:
+                text.append(encode(key))
+                text.append(':')
+
+            fragment_key = None
+            if item.__class__ is Deferred:
+                if fragments is not None:
+                    fragment_key = (interned[id(item.node)],
+                                    item.kwargs['draft_version'],
+                                    item.kwargs['include_types'],
+                                    item.kwargs['registry'])
+                    if fragment_key in fragments:
+                        text.append(fragment_key)
+                        separate = True
+                        continue
+                    chunks.append([])
+                item = item.resolve()
+
+            if item.__class__ is EnumChoices and item.scalars:
+                # Shared by every node with the same choices, so that they
+                # are only encoded once.
+                if item.text is None:
+                    item.text = encode(item)
+                chunks[-1].append(item.text)
+                separate = True
+                continue
+
+            if isinstance(item, dict):
+                chunks[-1].append('{')
+                # Keys are unique, so values are never compared.
+                stack.append(iter(sorted(item.items())))
+                ends.append(('}', fragment_key))
+                separate = False
+                break
+
+            if isinstance(item, list):
+                chunks[-1].append('[')
+                stack.append(((_NO_KEY, element) for element in item))
+                ends.append((']', fragment_key))
+                separate = False
+                break
+
+            chunks[-1].append(encode(item))
+            separate = True
+            if fragment_key is not None:
+                fragments[fragment_key] = _join_parts(chunks.pop())
+                chunks[-1].append(fragment_key)
+        else:
+            stack.pop()
+            end, fragment_key = ends.pop()
+            if end is not None:
+                chunks[-1].append(end)
+                separate = True
+            if fragment_key is not None:
+                fragments[fragment_key] = _join_parts(chunks.pop())
+                chunks[-1].append(fragment_key)
+
+    if fragments is None:
+        return ''.join(chunks[0])
+
+    # Expand the fragment keys into their text.
+    text = []
+    stack = [iter(chunks[0])]
+    while stack:
+        for part in stack[-1]:
+            if part.__class__ is tuple:
+                stack.append(iter(fragments[part]))
+                break
+            text.append(part)
+        else:
+            stack.pop()
+    return ''.join(text)
+
+
+def _join_parts(parts):
+    """
+    Return the list of strings and fragment keys ``parts`` as a tuple, with
+    every run of strings joined.
+    """
+    joined = []
+    run = []
+    for part in parts:
+        if part.__class__ is tuple:
+            if run:
+                joined.append(''.join(run))
+                run = []
+            joined.append(part)
+        else:
+            run.append(part)
+    if run:
+        joined.append(''.join(run))
+    return tuple(joined)
+
+
+def _serialize_json_schema(schema, draft_version, include_types, options,
+                           fragments=None, interned=None):
+    """
+    Return the :class:`SerializedSchema` of ``schema``. See
+    :func:`_canonical_text`.
+    """
+    if options.get('use_definitions'):
+        # Definitions are extracted from the whole document, so its subtrees
+        # cannot be serialized separately.
+        text = _canonical_text(to_json_schema(
+            schema, draft_version=draft_version, include_types=include_types,
+            **options))
+    else:
+        text = _canonical_text(
+            _convert_root(schema, draft_version, include_types,
+                          registry=options.get('registry')),
+            fragments=fragments, interned=interned)
+
+    data = text.encode('utf-8')
+    return SerializedSchema(data, hashlib.sha256(data).hexdigest())
+
+
+def to_json_schema_bytes(schema, draft_version=4, include_types=True,
+                         cache=True, use_definitions=False, registry=None):
+    """
+    Return the JSON schema document for the Colander schema *instance*
+    ``schema`` as a :class:`SerializedSchema`: canonical JSON bytes and their
+    digest, ready to be served as they are.
+
+    By default both are kept in the module-level ``schema_cache``, along
+    with the text of the document's subtrees. ``cache`` may be another
+    :class:`SchemaCache`, or None to serialize the document from scratch.
+    Looking a document up still walks ``schema``, so a server should hold
+    on to the result and serve its ``data`` as it is, using
+    :meth:`SerializedSchema.not_modified` to answer conditional requests.
+    """
+    if draft_version not in SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    options = {'registry': _snapshot_of(registry)}
+    if use_definitions:
+        options['use_definitions'] = True
+
+    if cache is True:
+        cache = schema_cache
+
+    if cache is None:
+        return _serialize_json_schema(schema, draft_version, include_types,
+                                      options)
+    return cache.get_serialized(schema, draft_version=draft_version,
+                                include_types=include_types, **options)
+
+
+@adapts(colander.Int, colander.Integer, draft_independent=True)
 def adapt_int(schema, **kwargs):
     return {
         'type': 'number'
     }
 
 
-@adapts(colander.String, colander.Str)
+@adapts(colander.String, colander.Str, draft_independent=True)
 def adapt_string(schema, **kwargs):
     return {
         'type': 'string',
@@ -257,14 +2437,15 @@ def adapt_string(schema, **kwargs):
     }
 
 
-@adapts(colander.Bool)
+@adapts(colander.Bool, draft_independent=True)
 def adapt_bool(schema, **kwargs):
     return {
         'type': 'boolean'
     }
 
 
-@adapts(colander.Schema, colander.MappingSchema, colander.Mapping)
+@adapts(colander.Schema, colander.MappingSchema, colander.Mapping,
+        deferrable=True)
 def adapt_mapping(schema, **kwargs):
     """
     Convert a :class:`colander.MappingSchema` into a JSON object property.
@@ -295,7 +2476,7 @@ def adapt_mapping(schema, **kwargs):
     return json_property
 
 
-@adapts(colander.Sequence)
+@adapts(colander.Sequence, deferrable=True)
 def adapt_sequence(schema, **kwargs):
     """
     Convert a :class:`colander.Sequence` into a JSON array property.
@@ -322,7 +2503,7 @@ def adapt_sequence(schema, **kwargs):
     return json_property
 
 
-@adapts(colander.Set)
+@adapts(colander.Set, draft_independent=True)
 def adapt_set(schema, **kwargs):
     """
     Convert a :class:`colander.Set` into a JSON array property of unique items.
@@ -333,7 +2514,7 @@ def adapt_set(schema, **kwargs):
     }
 
 
-@adapts(colander.Tuple)
+@adapts(colander.Tuple, deferrable=True)
 def adapt_tuple(schema, **kwargs):
     """
     Convert a :class:`colander.Tuple` into a fixed-length JSON array property.
@@ -367,7 +2548,8 @@ def adapt_tuple(schema, **kwargs):
     return json_property
 
 
-@adapts(colander.DateTime, colander.Date, colander.Time)
+@adapts(colander.DateTime, colander.Date, colander.Time,
+        draft_independent=True)
 def adapt_datetime(schema, **kwargs):
     """
     Convert various Colander datetime types into a "string" type with a
@@ -406,7 +2588,7 @@ def adapt_float(schema, **kwargs):
     return json_property
 
 
-@adapts(colander.Regex)
+@adapts(colander.Regex, draft_independent=True)
 def adapt_regex(regex, **kwargs):
     """
     Convert a :class:`colander.Regex` into a "pattern" validator.
@@ -416,7 +2598,7 @@ def adapt_regex(regex, **kwargs):
     }
 
 
-@adapts(colander.Email)
+@adapts(colander.Email, draft_independent=True)
 def adapt_email(email, **kwargs):
     """
     Convert a :class:`colander.Email` into an "email" validator.
@@ -426,7 +2608,7 @@ def adapt_email(email, **kwargs):
     }
 
 
-@adapts(colander.Range)
+@adapts(colander.Range, draft_independent=True)
 def adapt_range(_range, **kwargs):
     """
     Convert a :class:`colander.Range` into "min" and "max" fields.
@@ -441,7 +2623,7 @@ def adapt_range(_range, **kwargs):
     return fields
 
 
-@adapts(colander.Length)
+@adapts(colander.Length, draft_independent=True)
 def convert_length(length, **kwargs):
     """
     Convert a :class:`colander.Range` into "min" and "max" fields.
@@ -452,7 +2634,7 @@ def convert_length(length, **kwargs):
     }
 
 
-@adapts(colander.OneOf)
+@adapts(colander.OneOf, draft_independent=True)
 def adapt_one_of(one_of, **kwargs):
     """
     Convert a :class:`colander.OneOf` into an "enum" field.
@@ -462,8 +2644,139 @@ def adapt_one_of(one_of, **kwargs):
     }
 
 
+class LargeEnumAdapter(object):
+    """
+    An adapter for :class:`colander.OneOf` validators with large sets of
+    choices, e.g. of countries or SKUs, to register in place of
+    :func:`adapt_one_of`:
+
+        registry = hammer.default_registry.copy()
+        registry.register(colander.OneOf, LargeEnumAdapter(min_size=1000))
+
+    Validators with at least ``min_size`` choices are converted into an
+    "enum" subschema in "allOf" (or "extends" for draft 3). Every validator
+    with the same choices gets the same subschema object, which is stored
+    once, serialized once by :func:`to_json_schema_bytes` and emitted once
+    under ``definitions`` and referred to by ``$ref`` if definitions are
+    used (see :func:`extract_definitions`). Choices are deduplicated, and
+    sorted too if ``sort`` is True. Smaller sets of choices are converted as
+    :func:`adapt_one_of` converts them.
+    """
+    deferrable = False
+    draft_independent = False
+
+    def __init__(self, min_size=1000, sort=False):
+        self.min_size = min_size
+        self.sort = sort
+        # Maps the key of each distinct set of choices to its subschema.
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, one_of, **kwargs):
+        if len(one_of.choices) < self.min_size:
+            return adapt_one_of(one_of, **kwargs)
+        keyword = 'extends' if kwargs['draft_version'] == 3 else 'allOf'
+        return {keyword: [self.schema(one_of.choices)]}
+
+    def schema(self, choices):
+        """
+        Return the shared, read-only "enum" subschema for ``choices``.
+        """
+        keys = [(choice.__class__, _freeze(choice)) for choice in choices]
+        key = tuple(keys)
+        schema = self._schemas.get(key)
+
+        if schema is None:
+            # Choices are only told apart by type and value, so that e.g.
+            # True and 1 are both kept.
+            unique = OrderedDict()
+            for choice_key, choice in zip(keys, choices):
+                unique.setdefault(choice_key, choice)
+            choices = list(unique.values())
+            if self.sort:
+                try:
+                    choices.sort(key=lambda choice: (
+                        choice.__class__.__name__, choice))
+                except TypeError:
+                    pass
+            schema = _ReadOnlyDict(enum=EnumChoices(choices))
+            with self._lock:
+                schema = self._schemas.setdefault(key, schema)
+
+        return schema
+
+    def choices(self, one_of):
+        """
+        Return the :class:`EnumChoices` for the validator ``one_of``, e.g. to
+        test values against its ``members``.
+        """
+        return self.schema(one_of.choices)['enum']
+
+    def clear(self):
+        """
+        Forget the choices stored so far.
+        """
+        with self._lock:
+            self._schemas.clear()
+
+
+# The fields whose values only ever narrow a bound when validators are
+# combined.
+_LOWER_BOUNDS = ('minimum', 'minLength', 'minItems')
+_UPPER_BOUNDS = ('maximum', 'maxLength', 'maxItems')
+
+
+@adapts(colander.All)
+def adapt_all(validator, **kwargs):
+    """
+    Convert a :class:`colander.All` into the merged fields of its validators,
+    flattening any nested :class:`colander.All`.
+
+    Where validators set the same field, bounds are narrowed and enums are
+    intersected. Any other field set to different values is emitted once
+    more in a subschema in "allOf" (or "extends" for draft 3).
+    """
+    fields = {}
+    conflicting = []
+    pending = list(reversed(validator.validators))
+
+    while pending:
+        current = pending.pop()
+
+        if isinstance(current, colander.All):
+            pending.extend(reversed(current.validators))
+            continue
+
+        if not hasattr(current, '__call__'):
+            continue
+
+        for name, value in _validator_fields(current, kwargs).items():
+            existing = fields.get(name)
+            if name not in fields or existing is None:
+                fields[name] = value
+            elif value is None or value == existing:
+                continue
+            elif name in _LOWER_BOUNDS:
+                fields[name] = max(existing, value)
+            elif name in _UPPER_BOUNDS:
+                fields[name] = min(existing, value)
+            elif name == 'enum':
+                fields[name] = [choice for choice in existing
+                                if choice in value]
+            elif name == 'allOf' or name == 'extends':
+                fields[name] = list(existing) + list(value)
+            else:
+                conflicting.append({name: value})
+
+    if conflicting:
+        keyword = 'extends' if kwargs['draft_version'] == 3 else 'allOf'
+        fields[keyword] = list(fields.get(keyword, ())) + conflicting
+
+    return fields
+
 
 # Ignored validators
-@adapts(colander.Function, colander.All, colander.ContainsOnly, colander.luhnok)
+@adapts(colander.Function, colander.ContainsOnly, colander.luhnok,
+        draft_independent=True)
 def ignore(*args, **kwargs):
     return Ignore
\ No newline at end of file
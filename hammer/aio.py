@@ -0,0 +1,86 @@
+# coding=utf-8
+"""
+aio.py: Convert schemas from asyncio code without blocking the event loop.
+
+Conversions run in an executor (the loop's default one unless another is
+given), and concurrent requests to convert schemas with the same
+:func:`hammer.fingerprint` and options share a single conversion, even if
+each request builds its own schema instance:
+
+    json_schema = await aio.to_json_schema(Person(), draft_version=4)
+
+Serving many requests after a cold start or a cache flush then costs one
+conversion rather than one per request. :func:`to_json_schema_bytes` suits
+HTTP handlers best, since its result is immutable and so can be handed to
+every waiter as it is.
+"""
+import asyncio
+import functools
+
+import hammer
+
+
+# Maps ``(loop, function, fingerprint(schema), arguments)`` to the future of
+# the conversion in flight for them.
+_in_flight = {}
+
+
+async def _single_flight(executor, function, schema, **kwargs):
+    """
+    Return ``function(schema, **kwargs)`` run in ``executor``, sharing the
+    call with any others already in flight for the same arguments or for a
+    schema with the same fingerprint.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, function, hammer.fingerprint(schema),
+           tuple(sorted(kwargs.items())))
+    future = _in_flight.get(key)
+
+    if future is None:
+        future = loop.run_in_executor(
+            executor, functools.partial(function, schema, **kwargs))
+        _in_flight[key] = future
+
+        def done(future):
+            if _in_flight.get(key) is future:
+                del _in_flight[key]
+
+        future.add_done_callback(done)
+
+    # A waiter that is cancelled must not cancel the conversion the others
+    # are waiting for.
+    return await asyncio.shield(future)
+
+
+def in_flight():
+    """
+    Return the number of conversions currently running.
+    """
+    return len(_in_flight)
+
+
+async def to_json_schema(schema, draft_version=4, include_types=True,
+                         executor=None, **options):
+    """
+    Return the JSON schema document for ``schema``, as
+    :func:`hammer.to_json_schema` does with the same arguments, converting
+    it in ``executor``.
+
+    Each caller gets its own copy of the document.
+    """
+    json_schema = await _single_flight(
+        executor, hammer.to_json_schema, schema, draft_version=draft_version,
+        include_types=include_types, **options)
+    return hammer._copy_json(json_schema)
+
+
+async def to_json_schema_bytes(schema, draft_version=4, include_types=True,
+                               executor=None, **options):
+    """
+    Return the :class:`hammer.SerializedSchema` for ``schema``, as
+    :func:`hammer.to_json_schema_bytes` does with the same arguments,
+    serializing it in ``executor``.
+    """
+    return await _single_flight(
+        executor, hammer.to_json_schema_bytes, schema,
+        draft_version=draft_version, include_types=include_types, **options)
@@ -0,0 +1,285 @@
+# coding=utf-8
+"""
+benchmark.py: Measure how conversion scales with the shape of a schema.
+
+Synthetic Colander schemas are generated from a width (children per mapping),
+a depth (levels of nested mappings), a mix of node types and a validator
+density. Each is converted for every draft version, timing the conversion and
+tracking its peak memory, and the results are written as JSON so that they
+can be compared against a baseline:
+
+    python -m hammer.benchmark --width 10 50 --depth 4 -o results.json
+    python -m hammer.benchmark --width 10 50 --depth 4 --baseline results.json
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+
+import colander
+import hammer
+
+
+# The relative frequency of each kind of leaf and container node generated,
+# unless another mix is given.
+DEFAULT_TYPE_MIX = {
+    'string': 4,
+    'int': 2,
+    'float': 1,
+    'bool': 1,
+    'datetime': 1,
+    'set': 1,
+    'sequence': 1,
+    'tuple': 1,
+}
+
+_LEAF_TYPES = {
+    'string': colander.String,
+    'int': colander.Int,
+    'float': colander.Float,
+    'bool': colander.Boolean,
+    'datetime': colander.DateTime,
+    'set': colander.Set,
+}
+
+
+def _make_validator(kind, rng):
+    """
+    Return a validator suited to a node of type ``kind``, or None.
+    """
+    if kind in ('int', 'float'):
+        return colander.Range(min=rng.randint(0, 10),
+                              max=rng.choice((None, rng.randint(11, 1000))))
+    if kind == 'string':
+        return rng.choice((
+            colander.Length(min=1, max=rng.randint(2, 64)),
+            colander.Regex(r'^[a-z]{%d}$' % rng.randint(1, 8)),
+            colander.OneOf(['choice%d' % i
+                            for i in range(rng.randint(2, 20))]),
+            colander.Email(),
+        ))
+    return None
+
+
+def _make_leaf(kind, name, rng, validator_density):
+    validator = None
+    if rng.random() < validator_density:
+        validator = _make_validator(kind, rng)
+    return colander.SchemaNode(_LEAF_TYPES[kind](), name=name,
+                               validator=validator)
+
+
+def generate_schema(width, depth, type_mix=None, validator_density=0.5,
+                    seed=0):
+    """
+    Return a synthetic Colander mapping schema.
+
+    Every mapping has ``width`` children. Below ``depth`` levels of nesting,
+    a child is a nested mapping with probability ``1 / width`` (but at least
+    one child of each mapping is), and otherwise a node drawn from
+    ``type_mix``, a dict of relative frequencies keyed by the names in
+    :data:`DEFAULT_TYPE_MIX`. Sequences and tuples hold leaves. A leaf gets a
+    validator with probability ``validator_density``. The same arguments
+    always generate the same schema.
+    """
+    rng = random.Random(seed)
+    type_mix = type_mix or DEFAULT_TYPE_MIX
+    kinds = sorted(type_mix)
+    weights = [type_mix[kind] for kind in kinds]
+    leaf_kinds = [kind for kind in kinds if kind in _LEAF_TYPES] or ['string']
+
+    def leaf(name):
+        return _make_leaf(rng.choice(leaf_kinds), name, rng,
+                          validator_density)
+
+    def node(kind, name):
+        if kind == 'sequence':
+            return colander.SchemaNode(colander.Sequence(), leaf('item'),
+                                       name=name)
+        if kind == 'tuple':
+            return colander.SchemaNode(
+                colander.Tuple(),
+                *[leaf('item%d' % i) for i in range(rng.randint(2, 4))],
+                name=name)
+        return _make_leaf(kind, name, rng, validator_density)
+
+    # Built level by level rather than recursively so that deep schemas can
+    # be generated too.
+    root = colander.SchemaNode(colander.Mapping(), name='root')
+    level = [root]
+
+    for current_depth in range(depth + 1):
+        next_level = []
+        for mapping in level:
+            for index in range(width):
+                name = 'field%d' % index
+                nested = current_depth < depth and (
+                    index == 0 or rng.random() < 1.0 / width)
+                if nested:
+                    child = colander.SchemaNode(colander.Mapping(), name=name)
+                    next_level.append(child)
+                else:
+                    kind = rng.choices(kinds, weights)[0]
+                    child = node(kind, name)
+                mapping.add(child)
+        level = next_level
+
+    return root
+
+
+def count_nodes(schema):
+    """
+    Return the number of nodes in the tree ``schema``.
+    """
+    count = 0
+    pending = [schema]
+    while pending:
+        node = pending.pop()
+        count += 1
+        pending.extend(node.children)
+    return count
+
+
+def measure(schema, draft_version=4, repeat=5, number=None, **options):
+    """
+    Return a dict of timings and peak memory for converting ``schema``.
+
+    The conversion is timed ``repeat`` times, ``number`` conversions at a
+    time (by default, as many as take about 0.2 seconds).
+    """
+    def convert():
+        hammer.to_json_schema(schema, draft_version=draft_version, **options)
+
+    timer = timeit.Timer(convert)
+    if number is None:
+        number, _ = timer.autorange()
+        number = max(1, number // 2)
+    timings = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+
+    tracemalloc.start()
+    try:
+        convert()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'best': min(timings),
+        'mean': sum(timings) / len(timings),
+        'peak_memory': peak_memory,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run(widths, depths, draft_versions=hammer.SUPPORTED_JSON_DRAFT_VERSIONS,
+        type_mix=None, validator_density=0.5, seed=0, repeat=5, number=None,
+        **options):
+    """
+    Measure every combination of ``widths``, ``depths`` and
+    ``draft_versions``, returning a list of result dicts. Additional keyword
+    arguments are passed to :func:`hammer.to_json_schema`.
+    """
+    results = []
+    for width in widths:
+        for depth in depths:
+            schema = generate_schema(width, depth, type_mix=type_mix,
+                                     validator_density=validator_density,
+                                     seed=seed)
+            nodes = count_nodes(schema)
+            for draft_version in draft_versions:
+                result = {
+                    'case': 'width=%d,depth=%d,draft=%d' % (
+                        width, depth, draft_version),
+                    'width': width,
+                    'depth': depth,
+                    'draft_version': draft_version,
+                    'nodes': nodes,
+                    'validator_density': validator_density,
+                    'seed': seed,
+                }
+                result.update(measure(schema, draft_version=draft_version,
+                                      repeat=repeat, number=number,
+                                      **options))
+                results.append(result)
+    return results
+
+
+def compare(baseline, results, tolerance=0.2):
+    """
+    Return a list of ``(case, baseline_time, time)`` triples for each result
+    in ``results`` whose best time is more than ``tolerance`` (a fraction)
+    slower than the result for the same case in ``baseline``.
+    """
+    baseline_times = dict((result['case'], result['best'])
+                          for result in baseline)
+    regressions = []
+    for result in results:
+        baseline_time = baseline_times.get(result['case'])
+        if baseline_time is not None and \
+                result['best'] > baseline_time * (1 + tolerance):
+            regressions.append((result['case'], baseline_time,
+                                result['best']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m hammer.benchmark',
+        description='Benchmark conversion of synthetic Colander schemas.')
+    parser.add_argument('--width', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--depth', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('-d', '--draft-version', type=int, action='append',
+                        dest='draft_versions',
+                        choices=hammer.SUPPORTED_JSON_DRAFT_VERSIONS)
+    parser.add_argument('--validator-density', type=float, default=0.5)
+    parser.add_argument('--type-mix', type=json.loads, default=None,
+                        help='relative frequency of each node type as JSON, '
+                             'e.g. \'{"string": 3, "int": 1}\'')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=None)
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the results to FILE as well')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='fail if any case is slower than in the results '
+                             'in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction by which a case may be slower than '
+                             'its baseline (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    # Read before running, in case the results overwrite the baseline.
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    results = run(args.width, args.depth,
+                  draft_versions=args.draft_versions or
+                  hammer.SUPPORTED_JSON_DRAFT_VERSIONS,
+                  type_mix=args.type_mix,
+                  validator_density=args.validator_density, seed=args.seed,
+                  repeat=args.repeat, number=args.number)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    sys.stdout.write(output + '\n')
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output + '\n')
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.tolerance)
+        for case, baseline_time, time in regressions:
+            sys.stderr.write('%s: %.6fs, up from %.6fs\n' % (
+                case, time, baseline_time))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,539 @@
+# coding=utf-8
+"""
+builder.py: Build Colander schemas from JSON Schema documents (draft 3 or 4).
+
+This is the inverse of :func:`hammer.to_json_schema`: each kind of property
+the adapters emit is turned back into the Colander type and validators that
+produce it, e.g. an ``object`` with ``properties`` into a mapping and
+``minimum`` and ``maximum`` into a :class:`colander.Range`:
+
+    schema = builder.from_json_schema(document)
+    appstruct = schema.deserialize(cstruct)
+
+A document is compiled once into a :class:`SchemaBuilder`, resolving its
+``$ref`` references, and builders are cached by a hash of their document, so
+building a schema for a document seen before only instantiates its nodes.
+
+To support another kind of property, register a function that returns a
+Colander type for it with :func:`builds_type`, or one that returns a
+validator for some keywords with :func:`builds_validator`.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import numbers
+import threading
+
+import colander
+import hammer
+
+
+# Maps ``(type, format)`` to a function of the property that returns a
+# Colander type, with None for a format standing for any other format.
+_type_builders = {}
+
+# Pairs of the keywords a validator builder handles and the builder, in the
+# order they were registered.
+_validator_builders = []
+
+
+def builds_type(json_type, json_format=None):
+    """
+    A decorator that registers the decorated function as the builder of the
+    Colander type for properties of JSON type ``json_type`` with the
+    ``format`` ``json_format``, or with any format unless another builder is
+    registered for it if ``json_format`` is None.
+
+    The function is passed the property and returns a
+    :class:`colander.SchemaType` *class* or another callable that returns a
+    new instance of one, since every schema built gets its own types.
+    """
+    def wrapper(fn):
+        _type_builders[json_type, json_format] = fn
+        return fn
+    return wrapper
+
+
+def builds_validator(*keywords):
+    """
+    A decorator that registers the decorated function as the builder of a
+    validator for properties with any of ``keywords``.
+
+    The function is passed the property and returns a Colander validator, or
+    None. Validators are shared between the schemas built from a document, so
+    they must not be changed.
+    """
+    def wrapper(fn):
+        _validator_builders.append((frozenset(keywords), fn))
+        return fn
+    return wrapper
+
+
+@builds_type('string')
+def build_string(json_property):
+    return colander.String
+
+
+@builds_type('string', 'date-time')
+def build_datetime(json_property):
+    return colander.DateTime
+
+
+@builds_type('string', 'date')
+def build_date(json_property):
+    return colander.Date
+
+
+@builds_type('string', 'time')
+def build_time(json_property):
+    return colander.Time
+
+
+@builds_type('integer')
+def build_int(json_property):
+    return colander.Int
+
+
+class Number(colander.Number):
+    """
+    A JSON Schema ``number``: an integer or not. Integers stay integers and
+    other numbers become floats, so no fraction is dropped.
+    """
+    @staticmethod
+    def num(value):
+        if isinstance(value, numbers.Integral) and value.__class__ is not bool:
+            return int(value)
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        return float(value)
+
+
+@hammer.adapts(Number, draft_independent=True)
+def adapt_number(schema, **kwargs):
+    return {
+        'type': 'number'
+    }
+
+
+class Anything(colander.SchemaType):
+    """
+    A value of any kind, passed through as it is, e.g. the items of an array
+    without ``items``. It is converted into no constraint at all.
+    """
+    def serialize(self, node, appstruct):
+        return appstruct
+
+    def deserialize(self, node, cstruct):
+        return cstruct
+
+
+@hammer.adapts(Anything, draft_independent=True)
+def adapt_anything(schema, **kwargs):
+    return hammer.Ignore
+
+
+# The constraint :func:`hammer.adapt_float` adds to numbers, for each draft.
+_NOT_INTEGRAL = ({'divisibleBy': 1}, {'multipleOf': 1})
+
+
+@builds_type('number')
+def build_number(json_property):
+    """
+    Build a :class:`colander.Float` for the numbers that must not be
+    integers :func:`hammer.adapt_float` emits, and a :class:`Number`, which
+    keeps any fraction, for other numbers, including those
+    :func:`hammer.adapt_int` emits.
+    """
+    if json_property.get('not') in _NOT_INTEGRAL:
+        return colander.Float
+    return Number
+
+
+@builds_type('boolean')
+def build_bool(json_property):
+    return colander.Boolean
+
+
+@builds_type('object')
+def build_mapping(json_property):
+    unknown = 'ignore'
+    if json_property.get('additionalProperties') is False:
+        unknown = 'raise'
+    return lambda: colander.Mapping(unknown=unknown)
+
+
+@builds_type('array')
+def build_array(json_property):
+    """
+    Build a :class:`colander.Tuple` for arrays with a list of ``items``,
+    a :class:`colander.Set` for arrays of unique items of any kind and a
+    :class:`colander.Sequence` otherwise.
+    """
+    items = json_property.get('items')
+    if isinstance(items, list):
+        return colander.Tuple
+    if items is None and json_property.get('uniqueItems'):
+        return colander.Set
+    return colander.Sequence
+
+
+@builds_validator('pattern')
+def build_regex(json_property):
+    return colander.Regex(json_property['pattern'])
+
+
+@builds_validator('format')
+def build_email(json_property):
+    if json_property['format'] == 'email':
+        return colander.Email()
+
+
+@builds_validator('minimum', 'maximum')
+def build_range(json_property):
+    return colander.Range(min=json_property.get('minimum'),
+                          max=json_property.get('maximum'))
+
+
+@builds_validator('minLength', 'maxLength')
+def build_length(json_property):
+    return colander.Length(min=json_property.get('minLength'),
+                           max=json_property.get('maxLength'))
+
+
+@builds_validator('minItems', 'maxItems')
+def build_items_length(json_property):
+    # The length of a tuple is already fixed by its items.
+    if not isinstance(json_property.get('items'), list):
+        return colander.Length(min=json_property.get('minItems'),
+                               max=json_property.get('maxItems'))
+
+
+@builds_validator('enum')
+def build_one_of(json_property):
+    return colander.OneOf(json_property['enum'])
+
+
+# The JSON type of the values of an enum without a type.
+_ENUM_TYPES = (
+    (bool, 'boolean'),
+    (int, 'integer'),
+    (float, 'number'),
+    (str, 'string'),
+)
+
+
+def _json_type(json_property):
+    """
+    Return the JSON type of ``json_property``, ignoring ``null``.
+    """
+    json_type = json_property.get('type')
+
+    if isinstance(json_type, list):
+        types = [each for each in json_type if each != 'null']
+        if len(types) != 1:
+            raise ValueError('Unsupported type: %r' % (json_type,))
+        json_type = types[0]
+
+    if json_type is None:
+        if 'properties' in json_property:
+            json_type = 'object'
+        elif 'items' in json_property:
+            json_type = 'array'
+        elif json_property.get('enum'):
+            value = json_property['enum'][0]
+            for value_type, enum_type in _ENUM_TYPES:
+                if isinstance(value, value_type):
+                    json_type = enum_type
+                    break
+
+    if json_type is None:
+        raise ValueError('Cannot tell the type of %r' % (json_property,))
+    return json_type
+
+
+class _Shape(object):
+    """
+    A compiled property: everything needed to build a node for it but its
+    name and whether it is required, which depend on where it is used.
+    """
+    __slots__ = ('make_type', 'kwargs', 'children')
+
+    def __init__(self):
+        self.make_type = None
+        self.kwargs = {}
+        # ``(name, required, missing, shape)`` for each child.
+        self.children = []
+
+
+class SchemaBuilder(object):
+    """
+    A JSON Schema document compiled into a function that builds an
+    equivalent Colander schema.
+
+    References are resolved once, when the builder is compiled, and a
+    subschema referred to from several places is compiled only once.
+    Calling the builder returns a new schema each time; the validators in it
+    are shared between the schemas.
+    """
+    def __init__(self, document, draft_version=None):
+        if draft_version is None:
+            draft_version = 3 if 'draft-03' in document.get('$schema', '') \
+                else 4
+        if draft_version not in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            raise ValueError(
+                'The following JSON Schema draft versions are supported: '
+                '%s' % ', '.join(map(str,
+                                     hammer.SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+        self.document = document
+        self.draft_version = draft_version
+        self._shapes = {}
+        self._pending = []
+        self.shape = self._shape(document, '#')
+
+        while self._pending:
+            self._compile(*self._pending.pop())
+
+        self._check_acyclic()
+
+    def _resolve(self, ref):
+        if not ref.startswith('#'):
+            raise ValueError('Only local references are supported: %s' % ref)
+        json_property = self.document
+        for token in ref[1:].split('/')[1:]:
+            token = hammer._unescape_pointer(token)
+            json_property = json_property[
+                int(token) if isinstance(json_property, list) else token]
+        return json_property
+
+    def _shape(self, json_property, pointer):
+        """
+        Return the shape for ``json_property`` at ``pointer``, following any
+        ``$ref`` and queueing the shape to be compiled if it is new.
+        """
+        seen = set()
+        while '$ref' in json_property:
+            pointer = json_property['$ref']
+            if pointer in seen:
+                raise ValueError('Circular $ref: %s' % pointer)
+            seen.add(pointer)
+            json_property = self._resolve(pointer)
+
+        shape = self._shapes.get(pointer)
+        if shape is None:
+            shape = self._shapes[pointer] = _Shape()
+            self._pending.append((shape, json_property, pointer))
+        return shape
+
+    def _compile(self, shape, json_property, pointer):
+        json_type = _json_type(json_property)
+        format_builder = _type_builders.get(
+            (json_type, json_property.get('format')))
+        type_builder = format_builder or _type_builders.get((json_type, None))
+        if type_builder is None:
+            raise ValueError('Unsupported type: %r' % (json_type,))
+        shape.make_type = type_builder(json_property)
+
+        validators = []
+        for keywords, validator_builder in _validator_builders:
+            if not keywords.isdisjoint(json_property):
+                validator = validator_builder(json_property)
+                if validator is not None:
+                    validators.append(validator)
+        if len(validators) == 1:
+            shape.kwargs['validator'] = validators[0]
+        elif validators:
+            shape.kwargs['validator'] = colander.All(*validators)
+
+        for keyword in ('title', 'description'):
+            if keyword in json_property:
+                shape.kwargs[keyword] = json_property[keyword]
+
+        if json_type == 'object':
+            required = json_property.get('required')
+            required = set(required) if isinstance(required, list) else ()
+            for name, child in json_property.get('properties', {}).items():
+                self._add_child(shape, name, child, name in required,
+                                '%s/properties/%s' % (pointer, name))
+        elif json_type == 'array':
+            items = json_property.get('items')
+            if isinstance(items, list):
+                for index, child in enumerate(items):
+                    self._add_child(shape, 'item%d' % index, child, True,
+                                    '%s/items/%d' % (pointer, index))
+            elif items is not None:
+                self._add_child(shape, 'item', items, True,
+                                '%s/items' % pointer)
+            elif shape.make_type is colander.Sequence:
+                # Items of any kind are allowed.
+                child = _Shape()
+                child.make_type = Anything
+                shape.children.append(('item', True, colander.drop,
+                                       child))
+
+    def _add_child(self, shape, name, json_property, required, pointer):
+        target = json_property
+        if '$ref' in json_property and len(json_property) == 1:
+            target = self._resolve(json_property['$ref'])
+
+        if self.draft_version == 3:
+            required = bool(json_property.get('required',
+                                              target.get('required')))
+        if json_property.get('optional', target.get('optional')):
+            required = False
+
+        missing = json_property.get('default', target.get('default',
+                                                          colander.drop))
+        shape.children.append((name, required, missing,
+                               self._shape(json_property, pointer)))
+
+    def _check_acyclic(self):
+        """
+        Raise a ValueError if a subschema contains itself, in which case no
+        finite Colander schema is equivalent to the document.
+        """
+        done = set()
+        stack = [(self.shape, iter(self.shape.children))]
+        active = set([id(self.shape)])
+
+        while stack:
+            for _, _, _, child in stack[-1][1]:
+                if id(child) in active:
+                    raise ValueError('The document is recursive')
+                if id(child) not in done:
+                    active.add(id(child))
+                    stack.append((child, iter(child.children)))
+                    break
+            else:
+                shape, _ = stack.pop()
+                active.discard(id(shape))
+                done.add(id(shape))
+
+    def build(self, name=''):
+        """
+        Return a new Colander schema for the document.
+        """
+        root = None
+        pending = [(self.shape, name, True, None, None)]
+
+        while pending:
+            shape, name, required, missing, parent = pending.pop()
+            kwargs = shape.kwargs
+            if not required:
+                kwargs = dict(kwargs, missing=missing)
+            node = colander.SchemaNode(shape.make_type(), name=name,
+                                       **kwargs)
+
+            if parent is None:
+                root = node
+            else:
+                parent.children.append(node)
+
+            # Reversed, so that children are popped and added in order.
+            pending.extend((child, child_name, child_required,
+                            child_missing, node)
+                           for child_name, child_required, child_missing,
+                           child in reversed(shape.children))
+
+        return root
+
+    __call__ = build
+
+
+class BuilderCache(object):
+    """
+    A bounded LRU cache of :class:`SchemaBuilder` objects, keyed by the hash
+    of their document.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._builders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._builders)
+
+    def get(self, document, draft_version=None):
+        """
+        Return the builder for ``document``: a JSON Schema document, or its
+        JSON text (as a string or bytes), which is only parsed if the cache
+        holds no builder for it.
+        """
+        if isinstance(document, (str, bytes)):
+            text = document
+            document = None
+        else:
+            text = json.dumps(document, sort_keys=True,
+                              separators=(',', ':'),
+                              default=hammer._json_default)
+        if isinstance(text, str):
+            text = text.encode('utf-8')
+        key = (hashlib.sha256(text).digest(), draft_version)
+
+        with self._lock:
+            builder = self._builders.get(key)
+            if builder is not None:
+                self._builders.move_to_end(key)
+                self.hits += 1
+                return builder
+            self.misses += 1
+
+        if document is None:
+            document = json.loads(text.decode('utf-8'))
+        builder = SchemaBuilder(document, draft_version=draft_version)
+
+        with self._lock:
+            self._builders[key] = builder
+            if self.maxsize is not None:
+                while len(self._builders) > self.maxsize:
+                    self._builders.popitem(last=False)
+
+        return builder
+
+    def clear(self):
+        with self._lock:
+            self._builders.clear()
+
+    def info(self):
+        """
+        Return a :class:`hammer.CacheInfo` of the cache's hit and miss
+        counters and its current size.
+        """
+        with self._lock:
+            return hammer.CacheInfo(self.hits, self.misses, self.maxsize,
+                                    len(self._builders))
+
+
+builder_cache = BuilderCache()
+
+
+def compile_builder(document, draft_version=None, cache=True):
+    """
+    Return a :class:`SchemaBuilder` for ``document``, a JSON Schema document
+    or its JSON text, from ``cache``: a :class:`BuilderCache`, True for the
+    module-level ``builder_cache`` or None to always compile a new builder.
+
+    ``draft_version`` is taken from the document's ``$schema`` if not given,
+    defaulting to 4.
+    """
+    if cache is True:
+        cache = builder_cache
+    if cache is not None:
+        return cache.get(document, draft_version=draft_version)
+    if isinstance(document, (str, bytes)):
+        document = json.loads(document)
+    return SchemaBuilder(document, draft_version=draft_version)
+
+
+def from_json_schema(document, draft_version=None, cache=True):
+    """
+    Return a new Colander schema equivalent to ``document``, a JSON Schema
+    document or its JSON text. See :func:`compile_builder`.
+    """
+    return compile_builder(document, draft_version=draft_version,
+                           cache=cache)()
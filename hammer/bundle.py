@@ -0,0 +1,267 @@
+# coding=utf-8
+"""
+bundle.py: Convert many schemas into a single document of shared definitions.
+
+Every schema is emitted under its name, and every object or array subschema
+that occurs more than once across the schemas is emitted once and referred to
+with ``$ref``, so a subschema shared by hundreds of schemas is converted and
+written only once:
+
+    with open('schemas.json', 'w') as fp:
+        bundle.write_bundle({'Person': Person(), 'Friend': Friend()}, fp)
+
+The document is either a JSON Schema ``definitions`` document or, with
+``style='openapi'``, an OpenAPI ``components`` object to merge into an API
+description. Shared subschemas are found by comparing the Colander nodes
+themselves, before anything is converted, and the document is converted as
+it is written, so writing a bundle does not hold the whole of it in memory.
+"""
+import colander
+import hammer
+
+
+# Maps each style of bundle to the path of keys its schemas are under.
+STYLES = {
+    'definitions': ('definitions',),
+    'openapi': ('components', 'schemas'),
+}
+
+
+class _Plan(object):
+    """
+    What to emit for a bundle: the key of every node and the name and first
+    node of every shared subschema or schema by its key.
+    """
+    def __init__(self, schemas, draft_version, include_types, registry,
+                 min_occurrences):
+        self.keys = {}
+        self.root_keys = {}
+        self.names = {}
+        self.first_nodes = {}
+        self.definitions = []
+        self.min_occurrences = min_occurrences
+
+        table = {}
+        shape_table = {}
+        occurrences = {}
+        first_seen = []
+
+        for name, schema in schemas:
+            interned = hammer._interned_fingerprints(schema, table)
+            pending = [(schema, True)]
+
+            while pending:
+                node, is_root = pending.pop()
+                if not is_root:
+                    adapter = registry.find_schema_adapter(node,
+                                                           draft_version)
+                    if not getattr(adapter, 'deferrable', False):
+                        pending.extend((child, False)
+                                       for child in node.children)
+                        continue
+
+                # A node's name is not part of its property, so equal
+                # subtrees under different names share a key.
+                keys = self.root_keys if is_root else self.keys
+                key = keys.get(id(node))
+                if key is None:
+                    shape = hammer._node_fingerprint(node)[1:] + (
+                        tuple(interned[id(child)]
+                              for child in node.children),)
+                    # Roots are converted without the fields a property
+                    # gets from its node, so a property that has any only
+                    # shares a key with equal properties.
+                    if not is_root and not _converts_as_root(
+                            node, draft_version, include_types):
+                        shape += ('property',)
+                    key = keys[id(node)] = shape_table.setdefault(
+                        shape, len(shape_table))
+
+                if is_root and key not in self.names:
+                    self.names[key] = name
+
+                # Only the first occurrence of a subtree is emitted in full,
+                # so only its subschemas count.
+                if key in occurrences:
+                    occurrences[key] += 1
+                    continue
+                occurrences[key] = 1
+                self.first_nodes[key] = node
+                first_seen.append(key)
+                pending.extend((child, False)
+                               for child in reversed(node.children))
+
+        taken = set(name for name, _ in schemas)
+        for key in first_seen:
+            if key in self.names or occurrences[key] < min_occurrences:
+                continue
+            hint = self.first_nodes[key].name or 'schema'
+            name = hint
+            suffix = 1
+            while name in taken:
+                suffix += 1
+                name = '%s_%d' % (hint, suffix)
+            taken.add(name)
+            self.names[key] = name
+            self.definitions.append((name, self.first_nodes[key]))
+
+        self.occurrences = occurrences
+
+    def is_shared(self, node):
+        key = self.keys.get(id(node))
+        return key is not None and \
+            self.occurrences[key] >= self.min_occurrences
+
+
+def _converts_as_root(node, draft_version, include_types):
+    """
+    Whether the property of ``node`` is what ``node`` converts to as the
+    root of a schema: the root keeps its type, and gets no ``required`` or
+    ``optional`` flag and no fields from its validator.
+    """
+    return include_types and node.validator is None and \
+        not (draft_version == 3 and node.required) and \
+        node.missing is not colander.drop
+
+
+def bundle_events(schemas, draft_version=4, include_types=True,
+                  style='definitions', min_occurrences=2, registry=None):
+    """
+    Yield the bundle document for ``schemas`` as a stream of
+    ``(event, value)`` pairs (see :func:`hammer.to_json_schema_events`).
+
+    ``schemas`` maps names to Colander schema *instances*, or is a sequence
+    of ``(name, schema)`` pairs. ``style`` is ``'definitions'`` or
+    ``'openapi'`` (see :data:`STYLES`). Object and array subschemas that
+    occur at least ``min_occurrences`` times are emitted once, under the
+    name of the schema they are equal to or else of the node they first
+    occur at, and referred to with ``$ref`` everywhere else.
+    """
+    if draft_version not in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, hammer.SUPPORTED_JSON_DRAFT_VERSIONS)))
+    if style not in STYLES:
+        raise ValueError('Unknown bundle style: %s' % style)
+
+    if hasattr(schemas, 'items'):
+        schemas = list(schemas.items())
+    else:
+        schemas = list(schemas)
+
+    registry = hammer._snapshot_of(registry)
+    path = STYLES[style]
+    prefix = '#/%s/' % '/'.join(path)
+    plan = _Plan(schemas, draft_version, include_types, registry,
+                 min_occurrences)
+
+    def reference(key):
+        return {'$ref': prefix + hammer._escape_pointer(plan.names[key])}
+
+    def replace(deferred):
+        node = deferred.node
+        if plan.is_shared(node):
+            ref = reference(plan.keys[id(node)])
+            # Draft 3 validators only look for the flag in the parent's
+            # "properties", not in the schema referred to.
+            if draft_version == 3 and node.required:
+                ref['required'] = True
+            return ref
+
+    def convert(node):
+        return hammer._json_events(
+            hammer._convert_root(node, draft_version, include_types,
+                                 registry=registry),
+            replace)
+
+    def convert_definition(node):
+        # Shared subschemas are converted as the properties they stand for,
+        # not as roots, so that they keep e.g. their ``optional`` flag.
+        deferred = hammer.Deferred(node, {
+            'draft_version': draft_version,
+            'include_types': include_types,
+            'defer': True,
+            'registry': registry,
+        })
+        return hammer._json_events(deferred.resolve(), replace)
+
+    yield 'start_object', None
+    for key in path:
+        yield 'key', key
+        yield 'start_object', None
+
+    for name, schema in schemas:
+        yield 'key', name
+        key = plan.root_keys[id(schema)]
+        if plan.names[key] == name:
+            # The first node with the key is the one whose subtree was
+            # walked, which may be a subschema of an earlier schema.
+            events = convert(plan.first_nodes[key])
+        else:
+            # Equal to a schema emitted under another name.
+            events = hammer._json_events(reference(key))
+        for event in events:
+            yield event
+
+    for name, node in plan.definitions:
+        yield 'key', name
+        for event in convert_definition(node):
+            yield event
+
+    for _ in path:
+        yield 'end_object', None
+    yield 'end_object', None
+
+
+def write_bundle(schemas, fp, draft_version=4, include_types=True,
+                 style='definitions', min_occurrences=2, chunk_size=65536,
+                 registry=None):
+    """
+    Write the bundle document for ``schemas`` to the file-like object ``fp``
+    as JSON text, converting it as it is written. See :func:`bundle_events`.
+    """
+    events = bundle_events(schemas, draft_version=draft_version,
+                           include_types=include_types, style=style,
+                           min_occurrences=min_occurrences,
+                           registry=registry)
+    for text in hammer.iter_json_text(events, chunk_size=chunk_size,
+                                      default=hammer._json_default):
+        fp.write(text)
+
+
+def bundle(schemas, draft_version=4, include_types=True, style='definitions',
+           min_occurrences=2, registry=None):
+    """
+    Return the bundle document for ``schemas``. See :func:`bundle_events`.
+    """
+    events = bundle_events(schemas, draft_version=draft_version,
+                           include_types=include_types, style=style,
+                           min_occurrences=min_occurrences,
+                           registry=registry)
+    root = []
+    stack = [root]
+    key = None
+
+    for event, value in events:
+        if event == 'key':
+            key = value
+            continue
+        if event == 'end_object' or event == 'end_array':
+            stack.pop()
+            continue
+
+        if event == 'start_object':
+            value = {}
+        elif event == 'start_array':
+            value = []
+
+        container = stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+        if event != 'value':
+            stack.append(value)
+
+    return root[0]
@@ -0,0 +1,246 @@
+# coding=utf-8
+"""
+cli.py: The ``hammer`` command, which converts the Colander schemas found in
+Python modules into JSON Schema documents.
+
+Each target is a module (``myapp.schemas``), in which case every schema class
+defined in it is converted, or the dotted path of a single schema class
+(``myapp.schemas.Person`` or ``myapp.schemas:Person``). Schemas are converted
+across a pool of worker processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import importlib
+import inspect
+import json
+import os
+import sys
+
+import colander
+import hammer
+from hammer import freeze
+
+
+def is_schema_class(obj):
+    """
+    Return True if ``obj`` is a Colander schema class that can be
+    instantiated without arguments, e.g. a :class:`colander.MappingSchema`
+    subclass.
+    """
+    return (inspect.isclass(obj) and
+            issubclass(obj, colander.SchemaNode) and
+            obj.__module__ != colander.__name__ and
+            obj.schema_type is not colander.SchemaNode.schema_type)
+
+
+def find_schema_classes(target):
+    """
+    Return a list of the dotted paths of the schema classes identified by
+    ``target``: the module or class path given on the command line.
+    """
+    if ':' in target:
+        module_name, class_name = target.split(':', 1)
+    else:
+        try:
+            module = importlib.import_module(target)
+        except ImportError as e:
+            if e.name != target or '.' not in target:
+                raise
+            module_name, _, class_name = target.rpartition('.')
+        else:
+            module_name = class_name = None
+
+    if class_name is not None:
+        module = importlib.import_module(module_name)
+        if not hasattr(module, class_name):
+            raise ImportError('No module or class named %s' % target)
+        if not is_schema_class(getattr(module, class_name)):
+            raise ValueError('%s is not a Colander schema class' % target)
+        return ['%s.%s' % (module_name, class_name)]
+
+    return ['%s.%s' % (module.__name__, name)
+            for name, obj in vars(module).items()
+            if is_schema_class(obj) and obj.__module__ == module.__name__]
+
+
+def convert(path, draft_versions, options):
+    """
+    Instantiate the schema class at the dotted path ``path`` and return a
+    ``(path, documents, error)`` triple, where ``documents`` maps each draft
+    version to JSON text and ``error`` describes a failed conversion.
+
+    This runs in the worker processes.
+    """
+    module_name, _, class_name = path.rpartition('.')
+
+    try:
+        schema = getattr(importlib.import_module(module_name), class_name)()
+        documents = {}
+        for draft_version in draft_versions:
+            json_schema = hammer.to_json_schema(
+                schema, draft_version=draft_version, **options)
+            documents[draft_version] = json.dumps(
+                json_schema, indent=2, sort_keys=True,
+                default=hammer._json_default)
+    except Exception as e:
+        return path, None, '%s: %s' % (e.__class__.__name__, e)
+
+    return path, documents, None
+
+
+def _init_worker(path):
+    sys.path[:] = path
+
+
+def convert_all(paths, draft_versions, options, jobs=None):
+    """
+    Convert the schema classes at ``paths`` using ``jobs`` worker processes,
+    yielding the result of :func:`convert` for each as it completes.
+
+    With a single job, the schemas are converted in this process.
+    """
+    if jobs == 1 or len(paths) < 2:
+        for path in paths:
+            yield convert(path, draft_versions, options)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(list(sys.path),)) as executor:
+        chunksize = max(1, len(paths) // ((jobs or os.cpu_count() or 1) * 4))
+        for result in executor.map(convert, paths,
+                                   [draft_versions] * len(paths),
+                                   [options] * len(paths),
+                                   chunksize=chunksize):
+            yield result
+
+
+def write_bundle(results, fp):
+    """
+    Write the converted ``results`` to ``fp`` as one JSON object mapping each
+    schema path to an object of its documents keyed by ``draftN``.
+    """
+    fp.write('{')
+    for index, (path, documents) in enumerate(results):
+        fp.write('%s\n%s: {' % (',' if index else '', json.dumps(path)))
+        fp.write(', '.join('"draft%d": %s' % (draft_version, document)
+                           for draft_version, document
+                           in sorted(documents.items())))
+        fp.write('}')
+    fp.write('\n}\n')
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError('must be at least 1: %s' % text)
+    return value
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='hammer',
+        description='Convert Colander schemas into JSON Schema documents.')
+    parser.add_argument(
+        'targets', nargs='+', metavar='TARGET',
+        help='a module whose schema classes to convert, or the dotted path '
+             'of a schema class')
+    parser.add_argument(
+        '-d', '--draft-version', type=int, action='append',
+        dest='draft_versions',
+        choices=hammer.SUPPORTED_JSON_DRAFT_VERSIONS,
+        help='JSON Schema draft version to generate; may be repeated '
+             '(default: 4)')
+    parser.add_argument(
+        '-j', '--jobs', type=_positive_int, default=None,
+        help='number of worker processes (default: one per CPU)')
+    parser.add_argument(
+        '-o', '--output-dir', default='.',
+        help='directory to write one PATH.draftN.json file per schema and '
+             'draft version into (default: the current directory)')
+    parser.add_argument(
+        '-b', '--bundle', metavar='FILE',
+        help='write every document into FILE instead, or to standard output '
+             'if FILE is -')
+    parser.add_argument(
+        '--freeze', metavar='FILE',
+        help='also freeze every document into FILE: a Python module if it '
+             'ends in .py, else a JSON artifact (see hammer.freeze)')
+    parser.add_argument(
+        '--no-types', dest='include_types', action='store_false',
+        help='omit "type" from the generated properties')
+    parser.add_argument(
+        '--use-definitions', action='store_true',
+        help='emit repeated subschemas once under "definitions"')
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    draft_versions = tuple(sorted(set(args.draft_versions or (4,))))
+    options = {
+        'include_types': args.include_types,
+        'use_definitions': args.use_definitions,
+    }
+
+    # Like ``python -m``, allow importing modules from the working directory.
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    paths = []
+    for target in args.targets:
+        try:
+            paths.extend(find_schema_classes(target))
+        except (ImportError, ValueError) as e:
+            sys.stderr.write('hammer: cannot load %s: %s\n' % (target, e))
+            return 1
+
+    if not args.bundle:
+        try:
+            os.makedirs(args.output_dir, exist_ok=True)
+        except OSError as e:
+            parser.error('cannot create output directory %s: %s' % (
+                args.output_dir, e.strerror))
+
+    converted = []
+    status = 0
+    for path, documents, error in convert_all(paths, draft_versions, options,
+                                              jobs=args.jobs):
+        if error is not None:
+            sys.stderr.write('hammer: cannot convert %s: %s\n' % (path, error))
+            status = 1
+            continue
+
+        if args.bundle or args.freeze:
+            converted.append((path, documents))
+
+        if args.bundle:
+            continue
+
+        for draft_version, document in documents.items():
+            filename = os.path.join(args.output_dir, '%s.draft%d.json' % (
+                path, draft_version))
+            with open(filename, 'w') as fp:
+                fp.write(document + '\n')
+
+    if args.freeze:
+        frozen = dict((path, dict((draft_version, json.loads(document))
+                                  for draft_version, document
+                                  in documents.items()))
+                      for path, documents in converted)
+        if args.freeze.endswith('.py'):
+            freeze.write_module(frozen, args.freeze, options)
+        else:
+            freeze.write_artifact(frozen, args.freeze, options)
+
+    if args.bundle == '-':
+        write_bundle(converted, sys.stdout)
+    elif args.bundle:
+        with open(args.bundle, 'w') as fp:
+            write_bundle(converted, fp)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
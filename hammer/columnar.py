@@ -0,0 +1,655 @@
+# coding=utf-8
+"""
+columnar.py: Validate many records at once, a column at a time, with NumPy.
+
+A :class:`ColumnarValidator` accepts exactly what a
+:class:`hammer.validation.Validator` for the same JSON schema accepts, but
+validates a whole list of records at once: the values of each property are
+gathered into a column, and numeric ranges, choices, string and tuple
+lengths, patterns and required properties are checked with array
+operations over the column, or a single pass of a builtin over it, instead
+of once per record:
+
+    validator = columnar.compile_columnar_validator(Orders())
+    result = validator.validate(rows)
+    for path, indexes in result.errors.items():
+        ...
+
+Values of unusual types, like subclasses of ``str``, and keywords without
+array operations, like ``uniqueItems``, are validated one value at a time
+by a :class:`hammer.validation.Validator` for their subschema.
+
+Records that are columns already, like NumPy arrays read from a CSV file,
+are validated with :meth:`ColumnarValidator.validate_columns`, which checks
+arrays of numbers, booleans and strings without a pass over their values.
+
+Requires NumPy.
+"""
+from collections import namedtuple
+from itertools import chain, compress, repeat
+from operator import is_, itemgetter
+import re
+
+import numpy
+
+import hammer
+from hammer import validation
+
+
+class BatchResult(namedtuple('BatchResult', 'invalid errors')):
+    """
+    The result of validating a list of records: ``invalid`` is a sorted
+    array of the indexes of the invalid records, and ``errors`` maps the
+    path of each invalid value, a tuple of property names, tuple positions
+    and None for any item of a sequence, to a sorted array of the indexes
+    of the records it is invalid in. The path of records that are invalid
+    themselves, e.g. because they lack a required property, is ``()``.
+    """
+    __slots__ = ()
+
+    @property
+    def valid(self):
+        return not len(self.invalid)
+
+
+class _Missing(object):
+    """
+    The value of a property that a record lacks.
+    """
+
+
+_MISSING = _Missing()
+
+
+class _Kinds(dict):
+    """
+    Maps Python types to kinds of values. Other types, like subclasses,
+    are validated one value at a time.
+    """
+    def __missing__(self, key):
+        return _OTHER
+
+
+_INT, _FLOAT, _STR, _BOOL, _LIST, _DICT, _NONE, _MISSING_KIND, _OTHER = \
+    range(9)
+_KINDS = _Kinds({int: _INT, float: _FLOAT, str: _STR, bool: _BOOL,
+                 list: _LIST, dict: _DICT, type(None): _NONE,
+                 _Missing: _MISSING_KIND})
+
+# Integers beyond this are not converted to floats exactly.
+_EXACT_INTEGERS = 2 ** 53
+
+
+def _kinds(values):
+    classes = list(map(type, values))
+    distinct = set(classes)
+    if len(distinct) == 1:
+        return numpy.full(len(values), _KINDS[distinct.pop()],
+                          dtype=numpy.int8)
+    return numpy.fromiter(map(_KINDS.__getitem__, classes),
+                          dtype=numpy.int8, count=len(values))
+
+
+def _lengths(values):
+    return numpy.fromiter(map(len, values), dtype=numpy.intp,
+                          count=len(values))
+
+
+def _exact(bound):
+    return bound.__class__ in (int, float) and float(bound) == bound
+
+
+class _Column(object):
+    """
+    Validates the values at one path of every record.
+
+    ``check(values, kinds, indexes, errors)`` validates the list
+    ``values`` of the records at ``indexes``, an array, and appends the
+    indexes of records with invalid values to ``errors[self.path]``.
+    ``kinds`` is the array of the kinds of the values.
+    """
+    # The kind of value that is of the column's type.
+    kind = None
+
+    def __init__(self, schema, path, compiler):
+        self.schema = schema
+        self.path = path
+        self.compiler = compiler
+        self._fallback = None
+
+    def fallback(self, values, indexes, errors):
+        """
+        Validate ``values`` one at a time.
+        """
+        if self._fallback is None:
+            self._fallback = self.compiler.validator(self.schema)
+        check = self._fallback._check
+        invalid = [check(value) is not None for value in values]
+        self.fail(errors, indexes[numpy.array(invalid, dtype=bool)])
+
+    def fail(self, errors, indexes):
+        if len(indexes):
+            errors.setdefault(self.path, []).append(indexes)
+
+    def check(self, values, kinds, indexes, errors):
+        other = kinds == _OTHER
+        if other.any():
+            self.fallback(list(compress(values, other)), indexes[other],
+                          errors)
+        ok = kinds == self.kind
+        self.fail(errors, indexes[~(ok | other)])
+        if ok.all():
+            self.check_values(values, indexes, errors)
+        elif ok.any():
+            self.check_values(list(compress(values, ok)), indexes[ok],
+                              errors)
+
+    def check_values(self, values, indexes, errors):
+        """
+        Check the values of the column's type.
+        """
+
+    def check_array(self, array, indexes, errors):
+        """
+        Check the values of the NumPy array ``array``.
+        """
+        values = array.tolist()
+        self.check(values, _kinds(values), indexes, errors)
+
+
+class _Fallback(_Column):
+    def check(self, values, kinds, indexes, errors):
+        self.fallback(values, indexes, errors)
+
+
+class _Booleans(_Column):
+    kind = _BOOL
+
+    def check_array(self, array, indexes, errors):
+        if array.dtype.kind in 'iufU':
+            self.fail(errors, indexes)
+        elif array.dtype.kind != 'b':
+            super(_Booleans, self).check_array(array, indexes, errors)
+
+
+class _Strings(_Column):
+    kind = _STR
+
+    def __init__(self, schema, path, compiler):
+        super(_Strings, self).__init__(schema, path, compiler)
+        self.min_length = schema.get('minLength')
+        self.max_length = schema.get('maxLength')
+        self.members = _members(schema.get('enum'))
+        if self.members is not None:
+            self.choices = numpy.array(sorted(self.members))
+        self.search = None
+        if 'pattern' in schema:
+            self.search = re.compile(schema['pattern']).search
+
+    def check_array(self, array, indexes, errors):
+        if array.dtype.kind == 'U':
+            self.check_values(array, indexes, errors)
+        elif array.dtype.kind in 'biuf':
+            self.fail(errors, indexes)
+        else:
+            super(_Strings, self).check_array(array, indexes, errors)
+
+    def check_values(self, values, indexes, errors):
+        is_array = isinstance(values, numpy.ndarray)
+        bad = numpy.zeros(len(values), dtype=bool)
+        if self.min_length is not None or self.max_length is not None:
+            if is_array:
+                lengths = numpy.char.str_len(values)
+            else:
+                lengths = _lengths(values)
+            if self.min_length is not None:
+                bad |= lengths < self.min_length
+            if self.max_length is not None:
+                bad |= lengths > self.max_length
+        if self.members is not None:
+            if is_array:
+                bad |= ~numpy.isin(values, self.choices)
+            else:
+                bad |= ~_contained(self.members, values)
+        if self.search is not None:
+            if is_array:
+                values = values.tolist()
+            bad |= numpy.fromiter(
+                map(is_, map(self.search, values), repeat(None)),
+                dtype=bool, count=len(values))
+        self.fail(errors, indexes[bad])
+
+
+def _members(choices):
+    """
+    Return a frozenset of ``choices`` if they are all strings, or None.
+    """
+    if choices is None:
+        return None
+    if choices.__class__ is hammer.EnumChoices and choices.strings:
+        return choices.members
+    if not all(choice.__class__ is str for choice in choices):
+        return None
+    return frozenset(choices)
+
+
+def _contained(members, values):
+    return numpy.fromiter(map(members.__contains__, values), dtype=bool,
+                          count=len(values))
+
+
+class _Numbers(_Column):
+    def __init__(self, schema, path, compiler):
+        super(_Numbers, self).__init__(schema, path, compiler)
+        self.integer = schema['type'] == 'integer'
+        self.minimum = schema.get('minimum')
+        self.maximum = schema.get('maximum')
+        self.exclusive_minimum = bool(schema.get('exclusiveMinimum'))
+        self.exclusive_maximum = bool(schema.get('exclusiveMaximum'))
+        # Floats are converted as numbers that are not integers.
+        self.not_integral = 'not' in schema and compiler.draft_version == 4
+        self.choices = None
+        if 'enum' in schema:
+            self.choices = numpy.array(sorted(schema['enum']),
+                                       dtype=numpy.float64)
+
+    def check(self, values, kinds, indexes, errors):
+        ints = kinds == _INT
+        numbers = ints | (kinds == _FLOAT)
+        other = kinds == _OTHER
+        self.fail(errors, indexes[~(numbers | other)])
+
+        if numbers.all():
+            column = values
+        else:
+            column = list(compress(values, numbers))
+            ints = ints[numbers]
+
+        try:
+            array = numpy.array(column, dtype=numpy.float64)
+        except OverflowError:
+            self.fallback(values, indexes, errors)
+            return
+
+        # Integers that floats do not represent exactly are validated one
+        # at a time.
+        inexact = ints & (numpy.abs(array) >= _EXACT_INTEGERS)
+        if inexact.any():
+            keep = ~inexact
+            other[numpy.flatnonzero(numbers)[inexact]] = True
+            numbers[numbers] = keep
+            array, ints = array[keep], ints[keep]
+        if other.any():
+            self.fallback(list(compress(values, other)), indexes[other],
+                          errors)
+        self.check_numbers(array, ints, indexes[numbers], errors)
+
+    def check_array(self, array, indexes, errors):
+        if array.dtype.kind == 'f':
+            ints = numpy.zeros(len(array), dtype=bool)
+        elif array.dtype.kind in 'iu':
+            ints = numpy.ones(len(array), dtype=bool)
+            inexact = numpy.abs(array) >= _EXACT_INTEGERS
+            if inexact.any():
+                self.fallback(array[inexact].tolist(), indexes[inexact],
+                              errors)
+                array, ints, indexes = array[~inexact], ints[~inexact], \
+                    indexes[~inexact]
+        else:
+            super(_Numbers, self).check_array(array, indexes, errors)
+            return
+        self.check_numbers(array.astype(numpy.float64), ints, indexes,
+                           errors)
+
+    def check_numbers(self, array, ints, indexes, errors):
+        """
+        Check the numbers ``array``, of which those in the mask ``ints``
+        are integers.
+        """
+        floats = ~ints
+        bad = numpy.zeros(len(array), dtype=bool)
+        if self.integer:
+            # Floats are never integers in drafts 3 and 4, even when
+            # integral.
+            bad |= floats
+        if self.minimum is not None:
+            if self.exclusive_minimum:
+                bad |= array <= self.minimum
+            else:
+                bad |= array < self.minimum
+        if self.maximum is not None:
+            if self.exclusive_maximum:
+                bad |= array >= self.maximum
+            else:
+                bad |= array > self.maximum
+        if self.not_integral:
+            bad |= ints | (numpy.mod(array, 1) == 0)
+        if self.choices is not None:
+            bad |= ~numpy.isin(array, self.choices)
+        self.fail(errors, indexes[bad])
+
+
+class _Arrays(_Column):
+    kind = _LIST
+
+    def __init__(self, schema, path, compiler):
+        super(_Arrays, self).__init__(schema, path, compiler)
+        self.min_items = schema.get('minItems')
+        self.max_items = schema.get('maxItems')
+        items = schema.get('items', {})
+        self.item = None
+        self.items = []
+        if isinstance(items, dict):
+            if items:
+                self.item = compiler.column(items, path + (None,))
+            self.closed = False
+        else:
+            self.items = [compiler.column(subschema, path + (index,))
+                          for index, subschema in enumerate(items)]
+            self.closed = schema.get('additionalItems') is False
+
+    def check_values(self, values, indexes, errors):
+        lengths = _lengths(values)
+        bad = numpy.zeros(len(values), dtype=bool)
+        if self.min_items is not None:
+            bad |= lengths < self.min_items
+        if self.max_items is not None:
+            bad |= lengths > self.max_items
+        if self.closed:
+            bad |= lengths > len(self.items)
+        self.fail(errors, indexes[bad])
+
+        if self.item is not None:
+            # The items of all the arrays form one column.
+            items = list(chain.from_iterable(values))
+            self.item.check(items, _kinds(items),
+                            numpy.repeat(indexes, lengths), errors)
+
+        for index, column in enumerate(self.items):
+            has = lengths > index
+            if has.all():
+                items = list(map(itemgetter(index), values))
+                column.check(items, _kinds(items), indexes, errors)
+            elif has.any():
+                items = list(map(itemgetter(index), compress(values, has)))
+                column.check(items, _kinds(items), indexes[has], errors)
+
+
+class _Objects(_Column):
+    kind = _DICT
+
+    def __init__(self, schema, path, compiler):
+        super(_Objects, self).__init__(schema, path, compiler)
+        properties = schema.get('properties', {})
+        self.properties = [
+            (name, compiler.column(subschema, path + (name,)))
+            for name, subschema in properties.items()]
+
+        if compiler.draft_version == 3:
+            required = [name for name, subschema in properties.items()
+                        if compiler.dereference(subschema).get('required')
+                        is True]
+        else:
+            required = schema.get('required')
+        self.required = frozenset(required if isinstance(required, list)
+                                  else ())
+        # Required properties without a schema of their own.
+        self.unchecked = sorted(self.required - set(properties))
+        self.closed = schema.get('additionalProperties', True) is False
+        self.names = frozenset(properties)
+        self.min_properties = schema.get('minProperties')
+        self.max_properties = schema.get('maxProperties')
+
+    def check_values(self, values, indexes, errors):
+        size = len(values)
+        bad = numpy.zeros(size, dtype=bool)
+        known = numpy.zeros(size, dtype=numpy.intp)
+        missing = repeat(_MISSING)
+
+        for name, column in self.properties:
+            try:
+                column_values = list(map(itemgetter(name), values))
+            except KeyError:
+                column_values = list(map(dict.get, values, repeat(name),
+                                         missing))
+            kinds = _kinds(column_values)
+            has = kinds != _MISSING_KIND
+            known += has
+            if name in self.required:
+                bad |= ~has
+            if has.all():
+                column.check(column_values, kinds, indexes, errors)
+            elif has.any():
+                column.check(list(compress(column_values, has)), kinds[has],
+                             indexes[has], errors)
+
+        for name in self.unchecked:
+            bad |= ~numpy.fromiter(
+                map(dict.__contains__, values, repeat(name)), dtype=bool,
+                count=size)
+
+        lengths = None
+        if self.closed or self.min_properties is not None or \
+                self.max_properties is not None:
+            lengths = _lengths(values)
+        if self.min_properties is not None:
+            bad |= lengths < self.min_properties
+        if self.max_properties is not None:
+            bad |= lengths > self.max_properties
+
+        if self.closed:
+            bad |= lengths > known
+        self.fail(errors, indexes[bad])
+
+    def check_columns(self, columns, indexes, errors):
+        """
+        Check records given as ``columns``, which maps property names to
+        sequences of their values.
+        """
+        names = set(columns)
+        count = len(names)
+        if not self.required <= names or \
+                self.closed and not names <= self.names or \
+                self.min_properties is not None and \
+                count < self.min_properties or \
+                self.max_properties is not None and \
+                count > self.max_properties:
+            self.fail(errors, indexes)
+
+        for name, column in self.properties:
+            values = columns.get(name)
+            if values is None:
+                continue
+            if isinstance(values, numpy.ndarray):
+                column.check_array(values, indexes, errors)
+            else:
+                values = list(values)
+                column.check(values, _kinds(values), indexes, errors)
+
+
+# The keywords each kind of column checks, besides ``type`` and those that
+# do not affect validation.
+_COLUMN_KEYWORDS = (
+    ('boolean', _Booleans, frozenset()),
+    ('string', _Strings, frozenset(('minLength', 'maxLength', 'pattern',
+                                    'enum'))),
+    ('number', _Numbers, frozenset(('minimum', 'maximum', 'enum', 'not'))),
+    ('integer', _Numbers, frozenset(('minimum', 'maximum', 'enum', 'not'))),
+    ('array', _Arrays, frozenset(('items', 'minItems', 'maxItems',
+                                  'additionalItems'))),
+    ('object', _Objects, frozenset(('properties', 'required',
+                                    'additionalProperties', 'minProperties',
+                                    'maxProperties'))),
+)
+
+# The types that each group of keywords applies to.
+_TYPE_GROUPS = (
+    (('number', 'integer'), validation._NUMBER_KEYWORDS),
+    (('string',), validation._STRING_KEYWORDS),
+    (('array',), validation._ARRAY_KEYWORDS),
+    (('object',), validation._OBJECT_KEYWORDS),
+)
+
+# The subschema of ``not`` that means "not an integer".
+_NOT_INTEGRAL = {'multipleOf': 1}
+
+
+class _Compiler(object):
+    """
+    Compiles the columns of a JSON schema document.
+    """
+    def __init__(self, root, draft_version):
+        self.root = root
+        self.draft_version = draft_version
+        self.ignored = validation._OTHER_DRAFT_KEYWORDS[draft_version] | \
+            validation._ANNOTATION_KEYWORDS
+
+    def dereference(self, schema):
+        ref = schema.get('$ref')
+        while ref is not None and len(schema) == 1:
+            if not ref.startswith('#'):
+                raise ValueError(
+                    'Only local references are supported: %s' % ref)
+            schema = self.root
+            for token in ref[1:].split('/')[1:]:
+                token = hammer._unescape_pointer(token)
+                schema = schema[int(token) if isinstance(schema, list)
+                                else token]
+            ref = schema.get('$ref')
+        return schema
+
+    def validator(self, schema):
+        """
+        Return a :class:`hammer.validation.Validator` for ``schema``.
+        """
+        if schema is not self.root and 'definitions' in self.root:
+            schema = dict(schema, definitions=self.root['definitions'])
+        return validation.Validator(schema, draft_version=self.draft_version)
+
+    def column(self, schema, path):
+        schema = self.dereference(schema)
+        keywords = set(schema) - self.ignored
+        json_type = schema.get('type')
+        keywords.discard('type')
+
+        for column_type, column, supported in _COLUMN_KEYWORDS:
+            if json_type != column_type:
+                continue
+            # Keywords for instances of other types do not apply, nor does
+            # the required flag of draft 3, which the parent checks.
+            for group_types, group in _TYPE_GROUPS:
+                if column_type not in group_types:
+                    keywords.difference_update(group)
+            if self.draft_version == 3:
+                keywords.discard('required')
+            if not keywords <= supported:
+                break
+            if 'not' in keywords and schema['not'] != _NOT_INTEGRAL:
+                break
+            if 'enum' in keywords and (
+                    _members(schema['enum']) is None if column is _Strings
+                    else not all(map(_exact, schema['enum']))):
+                break
+            if not all(_exact(schema[bound]) for bound in
+                       ('minimum', 'maximum')
+                       if schema.get(bound) is not None):
+                break
+            if column is _Arrays and not isinstance(schema.get('items', {}),
+                                                    (list, dict)):
+                break
+            if column is _Objects and 'required' in keywords and \
+                    not isinstance(schema['required'], list):
+                break
+            if column is _Objects and \
+                    schema.get('additionalProperties', True) not in (
+                        True, False):
+                break
+            return column(schema, path, self)
+
+        return _Fallback(schema, path, self)
+
+
+def _result(errors, size):
+    invalid = numpy.zeros(size, dtype=bool)
+    for path, indexes in errors.items():
+        mask = numpy.zeros(size, dtype=bool)
+        for each in indexes:
+            mask[each] = True
+        invalid |= mask
+        errors[path] = numpy.flatnonzero(mask)
+    return BatchResult(numpy.flatnonzero(invalid), errors)
+
+
+class ColumnarValidator(object):
+    """
+    Validates lists of records against the JSON schema document
+    ``json_schema`` for JSON Schema draft ``draft_version``: either the
+    schema of a record, or an array schema whose ``items`` is.
+    """
+    def __init__(self, json_schema, draft_version=4):
+        self.json_schema = json_schema
+        self.draft_version = draft_version
+        compiler = _Compiler(json_schema, draft_version)
+
+        schema = compiler.dereference(json_schema)
+        if schema.get('type') == 'array' and \
+                isinstance(schema.get('items'), dict):
+            keywords = set(schema) - compiler.ignored - set(
+                ('type', 'items', 'required', 'minLength', 'maxLength'))
+            if keywords:
+                raise ValueError('Unsupported keywords of the array: %s'
+                                 % ', '.join(sorted(keywords)))
+            schema = schema['items']
+
+        self.column = compiler.column(schema, ())
+
+    def validate(self, records):
+        """
+        Return the :class:`BatchResult` of validating the list
+        ``records``.
+        """
+        records = list(records)
+        errors = {}
+        self.column.check(records, _kinds(records),
+                          numpy.arange(len(records)), errors)
+        return _result(errors, len(records))
+
+    def validate_columns(self, columns):
+        """
+        Return the :class:`BatchResult` of validating records given as
+        columns, e.g. as read from a CSV file: ``columns`` maps property
+        names to sequences of the values of the property in every record.
+        Each record has the properties in ``columns`` and no others.
+
+        NumPy arrays of numbers, booleans and strings are validated without
+        converting their values to Python objects.
+        """
+        if not isinstance(self.column, _Objects):
+            raise ValueError('Records are not validated as columns')
+        sizes = set(len(values) for values in columns.values())
+        if len(sizes) > 1:
+            raise ValueError('Columns differ in length')
+
+        size = sizes.pop() if sizes else 0
+        errors = {}
+        self.column.check_columns(columns, numpy.arange(size), errors)
+        return _result(errors, size)
+
+    def is_valid(self, records):
+        """
+        Return True if every record in ``records`` is valid.
+        """
+        return self.validate(records).valid
+
+
+def compile_columnar_validator(schema, draft_version=4, include_types=True,
+                               registry=None):
+    """
+    Return a :class:`ColumnarValidator` for the Colander schema *instance*
+    ``schema``, either of a record or a ``colander.Sequence`` of records.
+    See :func:`hammer.validation.compile_validator`.
+    """
+    json_schema = hammer.to_json_schema(schema, draft_version=draft_version,
+                                        include_types=include_types,
+                                        registry=registry)
+    return ColumnarValidator(json_schema, draft_version=draft_version)
@@ -0,0 +1,306 @@
+# coding=utf-8
+"""
+compact.py: Shrink JSON schema documents without changing what they accept.
+
+A compacted document validates exactly the instances the original does, but
+leaves out what does not affect validation:
+
+    - the ``alphanumeric`` format of strings, which is not a JSON Schema
+      format, and Hammer's own ``optional`` flag
+    - keywords set to their default, e.g. ``"minLength": 0``, ``"required":
+      []`` or a bound of ``null``
+    - keywords that only apply to instances of a type the schema's ``type``
+      does not allow, like the ``required`` of an array
+    - ``type`` where an ``enum`` only allows values of that type anyway
+    - keywords of a subschema in ``allOf`` (or ``extends``) that restate the
+      same keyword of the schema it applies to
+
+and a subschema in ``allOf`` whose keywords do not interact with those of
+the schema it applies to is merged into it:
+
+    json_schema = compact.compact(hammer.to_json_schema(Person()))
+    print(compact.savings(hammer.to_json_schema(Person())))
+
+References to ``definitions`` still resolve, but JSON pointers to other
+parts of a document may not.
+"""
+from collections import Counter, namedtuple
+import hashlib
+
+import hammer
+
+
+_ALPHANUMERIC = 'alphanumeric'
+
+# Keywords whose value has no effect if it is one of the given values.
+_DEFAULTS = {
+    'minLength': (0, None),
+    'maxLength': (None,),
+    'minItems': (0, None),
+    'maxItems': (None,),
+    'minProperties': (0, None),
+    'maxProperties': (None,),
+    'minimum': (None,),
+    'maximum': (None,),
+    'uniqueItems': (False,),
+    'additionalProperties': (True, {}),
+    'additionalItems': (True, {}),
+    'properties': ({},),
+    'patternProperties': ({},),
+    'definitions': ({},),
+    'required': ([], False),
+    'exclusiveMinimum': (False,),
+    'exclusiveMaximum': (False,),
+}
+
+# Groups of keywords that change each other's meaning, and so must stay in
+# the same schema.
+_INTERACTING = (
+    frozenset(('properties', 'patternProperties', 'additionalProperties')),
+    frozenset(('items', 'additionalItems')),
+    frozenset(('minimum', 'exclusiveMinimum')),
+    frozenset(('maximum', 'exclusiveMaximum')),
+)
+
+# Keywords that must not move to another place in a document.
+_UNMOVABLE = frozenset(('$ref', 'id', '$schema', 'definitions'))
+
+# Maps keywords that only constrain instances of some JSON types to those
+# types. The ``required`` list of draft 4 is an object keyword, but the
+# ``required`` flag of draft 3 is not.
+_TYPE_KEYWORDS = {
+    'properties': ('object',),
+    'patternProperties': ('object',),
+    'additionalProperties': ('object',),
+    'dependencies': ('object',),
+    'minProperties': ('object',),
+    'maxProperties': ('object',),
+    'items': ('array',),
+    'additionalItems': ('array',),
+    'minItems': ('array',),
+    'maxItems': ('array',),
+    'uniqueItems': ('array',),
+    'minLength': ('string',),
+    'maxLength': ('string',),
+    'pattern': ('string',),
+    'minimum': ('number', 'integer'),
+    'maximum': ('number', 'integer'),
+    'exclusiveMinimum': ('number', 'integer'),
+    'exclusiveMaximum': ('number', 'integer'),
+    'multipleOf': ('number', 'integer'),
+    'divisibleBy': ('number', 'integer'),
+}
+
+_TYPE_TESTS = {
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: value.__class__ is bool,
+    'integer': lambda value: isinstance(value, int) and
+    value.__class__ is not bool,
+    'number': lambda value: isinstance(value, (int, float)) and
+    value.__class__ is not bool,
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'null': lambda value: value is None,
+}
+
+
+class Savings(namedtuple('Savings', 'original compacted removed')):
+    """
+    The size in bytes of a document's canonical JSON text (see
+    :func:`hammer.to_json_schema_bytes`) before and after it was compacted,
+    and a :class:`collections.Counter` of the keywords removed.
+    """
+    __slots__ = ()
+
+    @property
+    def saved(self):
+        return self.original - self.compacted
+
+    @property
+    def ratio(self):
+        """
+        The fraction of the original size that was saved.
+        """
+        if not self.original:
+            return 0.0
+        return float(self.saved) / self.original
+
+    def __str__(self):
+        return '%d bytes, down from %d (%.1f%% saved)' % (
+            self.compacted, self.original, self.ratio * 100)
+
+
+def _copy_schemas(json_schema):
+    """
+    Return a copy of ``json_schema`` in which every subschema, and every
+    dict or list of subschemas, is a new object, and a list of the
+    subschemas in the copy with each one before those nested in it.
+    """
+    root = dict(json_schema)
+    schemas = [root]
+    pending = [root]
+
+    while pending:
+        schema = pending.pop()
+        for keyword, value in list(schema.items()):
+            if keyword in hammer._SCHEMA_DICT_KEYWORDS and \
+                    isinstance(value, dict):
+                schema[keyword] = dict(value)
+            elif keyword in hammer._SCHEMA_LIST_KEYWORDS and \
+                    isinstance(value, list):
+                schema[keyword] = list(value)
+
+        for container, key, _ in hammer._subschema_slots(schema):
+            subschema = container[key] = dict(container[key])
+            schemas.append(subschema)
+            pending.append(subschema)
+
+    return root, schemas
+
+
+def _is_default(keyword, value):
+    for default in _DEFAULTS.get(keyword, ()):
+        if value == default and value.__class__ is default.__class__:
+            return True
+    return False
+
+
+def _type_names(types):
+    return [each for each in types if isinstance(each, str)]
+
+
+def _implied_by_enum(json_type, choices):
+    types = json_type if isinstance(json_type, list) else [json_type]
+    names = _type_names(types)
+    if len(names) < len(types) or \
+            not all(each in _TYPE_TESTS for each in names):
+        return False
+    tests = [_TYPE_TESTS[each] for each in types]
+    return all(any(test(choice) for test in tests) for choice in choices)
+
+
+def _applies(keyword, value, json_type):
+    if keyword == 'required':
+        applies_to = ('object',) if isinstance(value, list) else None
+    else:
+        applies_to = _TYPE_KEYWORDS.get(keyword)
+    if applies_to is None:
+        return True
+    types = json_type if isinstance(json_type, list) else [json_type]
+    names = _type_names(types)
+    # Unknown types, like a schema in a draft 3 union, may allow anything.
+    if len(names) < len(types):
+        return True
+    return any(each in applies_to or each not in _TYPE_TESTS
+               for each in names)
+
+
+def _interacts(keyword, schema):
+    for group in _INTERACTING:
+        if keyword in group:
+            return any(other in schema for other in group
+                       if other != keyword)
+    return False
+
+
+def _mergeable(schema, subschema):
+    if '$ref' in schema:
+        return False
+    if not _UNMOVABLE.isdisjoint(subschema):
+        return False
+    if any(keyword in schema for keyword in subschema):
+        return False
+    for group in _INTERACTING:
+        if not group.isdisjoint(schema) and not group.isdisjoint(subschema):
+            return False
+    return True
+
+
+def _compact_schema(schema, draft_version, removed):
+    for keyword in list(schema):
+        value = schema[keyword]
+        if keyword == 'optional' or _is_default(keyword, value) or (
+                keyword == 'format' and value == _ALPHANUMERIC) or (
+                'type' in schema and
+                not _applies(keyword, value, schema['type'])):
+            del schema[keyword]
+            removed[keyword] += 1
+
+    keyword = 'extends' if draft_version == 3 else 'allOf'
+    subschemas = schema.pop(keyword, None)
+
+    if subschemas is not None:
+        if isinstance(subschemas, dict):
+            subschemas = [subschemas]
+        remaining = []
+        for subschema in subschemas:
+            for name in list(subschema):
+                if name in schema and schema[name] == subschema[name] and \
+                        not _interacts(name, subschema):
+                    del subschema[name]
+                    removed[name] += 1
+            if not subschema:
+                removed[keyword] += 1
+            elif _mergeable(schema, subschema):
+                schema.update(subschema)
+                removed[keyword] += 1
+            else:
+                remaining.append(subschema)
+
+        if len(remaining) == 1 and draft_version == 3:
+            schema[keyword] = remaining[0]
+        elif remaining:
+            schema[keyword] = remaining
+
+    if 'type' in schema and 'enum' in schema and \
+            _implied_by_enum(schema['type'], schema['enum']):
+        del schema['type']
+        removed['type'] += 1
+
+
+def compact(json_schema, draft_version=4, removed=None):
+    """
+    Return a compacted copy of the JSON schema document ``json_schema`` for
+    ``draft_version``. If ``removed`` is a :class:`collections.Counter`, it
+    is updated with the keywords removed.
+
+    The copy shares values that are not compacted, like enums, with the
+    original.
+    """
+    if removed is None:
+        removed = Counter()
+
+    root, schemas = _copy_schemas(json_schema)
+    # Subschemas are compacted before the schemas they are nested in, so
+    # that what is merged into a schema is compacted already.
+    for schema in reversed(schemas):
+        _compact_schema(schema, draft_version, removed)
+
+    return root
+
+
+def savings(json_schema, draft_version=4):
+    """
+    Return the :class:`Savings` of compacting ``json_schema``.
+    """
+    removed = Counter()
+    compacted = compact(json_schema, draft_version=draft_version,
+                        removed=removed)
+    return Savings(len(hammer._canonical_text(json_schema).encode('utf-8')),
+                   len(hammer._canonical_text(compacted).encode('utf-8')),
+                   removed)
+
+
+def to_compact_bytes(schema, draft_version=4, include_types=True,
+                     use_definitions=False, registry=None):
+    """
+    Return the compacted JSON schema document for the Colander schema
+    *instance* ``schema`` as a :class:`hammer.SerializedSchema` of canonical
+    JSON bytes, which are as compact as JSON text gets.
+    """
+    json_schema = compact(hammer.to_json_schema(
+        schema, draft_version=draft_version, include_types=include_types,
+        use_definitions=use_definitions, registry=registry),
+        draft_version=draft_version)
+    data = hammer._canonical_text(json_schema).encode('utf-8')
+    return hammer.SerializedSchema(data, hashlib.sha256(data).hexdigest())
@@ -0,0 +1,215 @@
+# coding=utf-8
+"""
+freeze.py: Precompute JSON schemas at build time.
+
+Converted documents are written either as a generated Python module, which
+builds each document from a literal and imports neither Colander nor Hammer,
+or as a compact JSON artifact that needs only :mod:`json` to load. Both record
+a fingerprint of their contents so a build can tell whether they are stale:
+
+    documents = freeze.convert({'Person': Person()}, draft_versions=(3, 4))
+    freeze.write_module(documents, 'myapp/frozen_schemas.py')
+
+    # At runtime:
+    from myapp import frozen_schemas
+    frozen_schemas.get_schema('Person', draft_version=4)
+
+    # In the build:
+    freeze.is_stale('myapp/frozen_schemas.py', {'Person': Person()})
+"""
+import ast
+import hashlib
+import json
+
+import hammer
+
+
+FORMAT_VERSION = 1
+
+
+def _canonical(document):
+    return json.dumps(document, sort_keys=True, separators=(',', ':'),
+                      default=hammer._json_default)
+
+
+def convert(schemas, draft_versions=(4,), **options):
+    """
+    Convert the Colander schema instances in the mapping ``schemas`` of names
+    to schemas, returning a dict mapping each name to a dict of documents by
+    draft version.
+
+    Documents are normalised to plain JSON values, so e.g. a
+    :class:`decimal.Decimal` bound becomes a float. Additional keyword
+    arguments are passed to :func:`hammer.to_json_schema`.
+    """
+    documents = {}
+    for name, schema in schemas.items():
+        documents[name] = dict(
+            (draft_version, json.loads(_canonical(hammer.to_json_schema(
+                schema, draft_version=draft_version, **options))))
+            for draft_version in draft_versions)
+    return documents
+
+
+def fingerprint(documents, options=None):
+    """
+    Return a hex digest identifying ``documents``, as returned by
+    :func:`convert`, and the ``options`` they were converted with.
+    """
+    digest = hashlib.sha256()
+    digest.update(_canonical([FORMAT_VERSION, options or {}]).encode('utf-8'))
+    for name in sorted(documents):
+        for draft_version in sorted(documents[name]):
+            digest.update(_canonical(
+                [name, draft_version, documents[name][draft_version]]
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _draft_versions(documents):
+    return tuple(sorted(set(draft_version for drafts in documents.values()
+                            for draft_version in drafts)))
+
+
+_MODULE_HEADER = '''\
+# coding=utf-8
+"""
+JSON schemas frozen by hammer.freeze. Do not edit; regenerate instead.
+"""
+import json
+
+FINGERPRINT = %(fingerprint)r
+DRAFT_VERSIONS = %(draft_versions)r
+OPTIONS = %(options)r
+
+
+'''
+
+_MODULE_FOOTER = '''
+
+def names():
+    """
+    Return the names of the frozen schemas.
+    """
+    return sorted(set(name for name, draft_version in _SCHEMAS))
+
+
+def get_schema(name, draft_version=4):
+    """
+    Return a new copy of the JSON schema document frozen for ``name`` and
+    ``draft_version``.
+    """
+    return _SCHEMAS[name, draft_version]()
+'''
+
+
+def render_module(documents, options=None):
+    """
+    Return the source of a Python module holding ``documents``, as returned
+    by :func:`convert`.
+    """
+    sources = [_MODULE_HEADER % {
+        'fingerprint': fingerprint(documents, options),
+        'draft_versions': _draft_versions(documents),
+        'options': options or {},
+    }]
+    table = []
+
+    for name in sorted(documents):
+        for draft_version in sorted(documents[name]):
+            document = documents[name][draft_version]
+            function = '_schema_%d' % len(table)
+            constants = {}
+            source = hammer._literal_source(document, constants)
+
+            if source is None or constants:
+                # Too deeply nested for a literal, or holding a value such
+                # as NaN that has no literal.
+                source = 'json.loads(%r)' % _canonical(document)
+
+            sources.append('def %s():\n    return %s\n\n\n' % (function,
+                                                               source))
+            table.append('    (%r, %d): %s,' % (name, draft_version,
+                                                function))
+
+    sources.append('_SCHEMAS = {\n%s\n}\n' % '\n'.join(table))
+    sources.append(_MODULE_FOOTER)
+    return ''.join(sources)
+
+
+def write_module(documents, path, options=None):
+    """
+    Write ``documents``, as returned by :func:`convert`, to ``path`` as a
+    Python module. See :func:`render_module`.
+    """
+    with open(path, 'w') as fp:
+        fp.write(render_module(documents, options))
+
+
+def write_artifact(documents, path, options=None):
+    """
+    Write ``documents``, as returned by :func:`convert`, to ``path`` as a
+    compact JSON artifact, which :func:`load_artifact` reads.
+    """
+    artifact = {
+        'format': FORMAT_VERSION,
+        'fingerprint': fingerprint(documents, options),
+        'draft_versions': _draft_versions(documents),
+        'options': options or {},
+        'schemas': dict(
+            (name, dict((str(draft_version), document)
+                        for draft_version, document in drafts.items()))
+            for name, drafts in documents.items()),
+    }
+    with open(path, 'w') as fp:
+        fp.write(_canonical(artifact))
+
+
+def load_artifact(path):
+    """
+    Return the documents in the JSON artifact at ``path`` in the form
+    :func:`convert` returns them.
+    """
+    with open(path) as fp:
+        artifact = json.load(fp)
+    return dict(
+        (name, dict((int(draft_version), document)
+                    for draft_version, document in drafts.items()))
+        for name, drafts in artifact['schemas'].items())
+
+
+def read_metadata(path):
+    """
+    Return the ``(fingerprint, draft_versions, options)`` recorded in the
+    frozen module or artifact at ``path``, without importing it.
+    """
+    with open(path) as fp:
+        text = fp.read()
+
+    if not path.endswith('.py'):
+        artifact = json.loads(text)
+        return (artifact['fingerprint'], tuple(artifact['draft_versions']),
+                artifact['options'])
+
+    metadata = {}
+    for statement in ast.parse(text).body:
+        if isinstance(statement, ast.Assign) and \
+                len(statement.targets) == 1 and \
+                isinstance(statement.targets[0], ast.Name):
+            name = statement.targets[0].id
+            if name in ('FINGERPRINT', 'DRAFT_VERSIONS', 'OPTIONS'):
+                metadata[name] = ast.literal_eval(statement.value)
+    return (metadata['FINGERPRINT'], metadata['DRAFT_VERSIONS'],
+            metadata['OPTIONS'])
+
+
+def is_stale(path, schemas):
+    """
+    Return True if the frozen module or artifact at ``path`` does not hold
+    exactly the documents the mapping ``schemas`` of names to Colander
+    schema instances converts to now, e.g. because a schema or an adapter
+    changed since it was written.
+    """
+    recorded, draft_versions, options = read_metadata(path)
+    documents = convert(schemas, draft_versions=draft_versions, **options)
+    return fingerprint(documents, options) != recorded
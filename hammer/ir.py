@@ -0,0 +1,520 @@
+# coding=utf-8
+"""
+ir.py: A compact, immutable representation of JSON schema documents.
+
+:func:`to_json_schema` returns a tree of plain dicts and lists, one of each
+for every node and validator it converts. A large schema repeats the same
+few property shapes many times over, so most of those dicts are equal. The
+representation built by :func:`to_schema_ir` stores each distinct
+subschema once:
+
+    - every object in the document is a :class:`SchemaIR`, a read-only
+      :class:`collections.abc.Mapping` with ``__slots__`` and no dict of
+      its own
+    - objects with the same keys in the same order share one table of
+      them, so a ``{"type": "string"}`` costs a tuple of values
+    - equal objects and arrays are the same object, so a subschema that
+      occurs a thousand times is stored once
+    - arrays are tuples
+
+The document is converted as :func:`to_json_schema_events` converts it,
+and each object and array is interned as soon as its adapter has built it,
+bottom-up, so the dicts the adapters build are released as soon as they have
+been read. A mapping, sequence or tuple equal to one converted before is not
+converted again at all, so its adapters build no dicts for it:
+
+    ir = hammer.ir.to_schema_ir(Person())
+    ir['properties']['name']['type']
+    json_schema = ir.to_dict()
+    text = ir.to_json()
+
+Equal values are only the same object if they are of the same type, so
+``1``, ``1.0`` and ``True`` stay apart.
+"""
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import json
+import weakref
+
+import hammer
+
+
+class _Shape(object):
+    """
+    The keys of :class:`SchemaIR` objects that have the same keys in the same
+    order, and the position of each key among them.
+    """
+    __slots__ = ('keys', 'index', '__weakref__')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((key, position)
+                          for position, key in enumerate(keys))
+
+
+# Shapes are shared by every object with their keys while any exists.
+_shapes = weakref.WeakValueDictionary()
+
+
+def _shape(keys):
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes[keys] = _Shape(keys)
+    return shape
+
+
+# Arrays nested in a value only add this many of their items to its hash,
+# so that hashing an object does not walk every choice of a large enum.
+_HASHED_ITEMS = 8
+
+
+def _value_hash(value, items=_HASHED_ITEMS):
+    """
+    Hash the frozen value ``value``. Values that :func:`_same` tells apart,
+    like ``1`` and ``True``, may have the same hash.
+    """
+    if value.__class__ is SchemaIR:
+        return value._hash
+    if isinstance(value, tuple):
+        return hash((len(value),) + tuple(
+            item._hash if item.__class__ is SchemaIR else
+            _value_hash(item) if isinstance(item, tuple) else hash(item)
+            for item in value[:items]))
+    return hash(value)
+
+
+def _same(first, second):
+    """
+    Whether two frozen values are equal and of the same types throughout.
+    """
+    if first is second:
+        return True
+    if first.__class__ is not second.__class__:
+        return False
+    if first.__class__ is SchemaIR:
+        if first._hash != second._hash or first._shape is not second._shape:
+            return False
+        first = first._values
+        second = second._values
+    elif not isinstance(first, tuple):
+        return first == second
+    elif len(first) != len(second):
+        return False
+
+    for one, other in zip(first, second):
+        if one is other:
+            continue
+        if one.__class__ is not other.__class__:
+            return False
+        if one.__class__ is SchemaIR or isinstance(one, tuple):
+            if not _same(one, other):
+                return False
+        elif not one == other:
+            return False
+    return True
+
+
+class Array(tuple):
+    """
+    An array in a :class:`SchemaIR` document. It is a tuple to everything
+    that reads it, :mod:`json` included, but equal to a list with equal
+    items.
+    """
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and \
+                all(item == each for item, each in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = tuple.__hash__
+
+    def __reduce__(self):
+        return Array, (tuple(self),)
+
+
+class SchemaIR(Mapping):
+    """
+    An object in a JSON schema document built by :func:`to_schema_ir`. It
+    cannot be changed, and is equal to any mapping with equal items, or to
+    another :class:`SchemaIR` whose items are also of the same types.
+    """
+    __slots__ = ('_shape', '_values', '_hash')
+
+    def __init__(self, items=()):
+        if isinstance(items, Mapping):
+            items = items.items()
+        keys = []
+        values = []
+        for key, value in items:
+            keys.append(key)
+            values.append(value)
+        self._set(_shape(tuple(keys)), tuple(values))
+
+    @classmethod
+    def _make(cls, shape, values):
+        ir = cls.__new__(cls)
+        ir._set(shape, values)
+        return ir
+
+    def _set(self, shape, values):
+        set_slot = object.__setattr__
+        set_slot(self, '_shape', shape)
+        set_slot(self, '_values', values)
+        set_slot(self, '_hash', hash((shape.keys,
+                                      _value_hash(values, None))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('SchemaIR objects cannot be changed')
+
+    def __getitem__(self, key):
+        return self._values[self._shape.index[key]]
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if other.__class__ is SchemaIR:
+            return _same(self, other)
+        if not isinstance(other, Mapping) or len(other) != len(self):
+            return False
+        for key, value in zip(self._shape.keys, self._values):
+            if key not in other or not value == other[key]:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'SchemaIR(%r)' % dict(zip(self._shape.keys, self._values))
+
+    def __reduce__(self):
+        return _unpickle, (self._shape.keys, self._values)
+
+    def to_dict(self):
+        """
+        Return the document as plain dicts and lists, which are new objects
+        however many times the same subschema occurs in it.
+        """
+        return materialize(self)
+
+    def events(self):
+        """
+        Yield the document as ``(event, value)`` pairs. See
+        :func:`hammer.to_json_schema_events`.
+        """
+        return _events(self)
+
+    def to_json(self, **kwargs):
+        """
+        Return the document as JSON text. ``kwargs`` are passed on to
+        :func:`json.dumps`.
+        """
+        default = kwargs.pop('default', hammer._json_default)
+        return json.dumps(self, default=_ir_default(default), **kwargs)
+
+
+def _unpickle(keys, values):
+    return SchemaIR._make(_shape(keys), values)
+
+
+def _ir_default(default):
+    def encode(value):
+        if value.__class__ is SchemaIR:
+            return dict(zip(value._shape.keys, value._values))
+        return default(value)
+    return encode
+
+
+class InternTable(object):
+    """
+    The distinct objects and arrays of the documents built with it. Passing
+    one table to several calls to :func:`to_schema_ir` shares what their
+    documents have in common, for as long as the table is kept.
+
+    Objects and arrays are built bottom-up with :meth:`schema` and
+    :meth:`array`, whose items are then already stored, so that looking one
+    up only hashes its own keys and items, and compares the objects and
+    arrays in it by identity. Nothing is built for a value that is stored
+    already.
+    """
+
+    def __init__(self):
+        self._values = {}
+        # Maps the keys and items of each stored object or array, with the
+        # objects and arrays among them by id, to it.
+        self._members = {}
+        # The stored objects and arrays by id.
+        self._stored = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        self._values.clear()
+        self._members.clear()
+        self._stored.clear()
+
+    def intern(self, value):
+        """
+        Return the stored value equal to, and of the same types as, the
+        frozen value ``value``, storing ``value`` if there is none.
+        """
+        if self._stored.get(id(value)) is value:
+            return value
+        key = _Key(value)
+        stored = self._values.get(key)
+        if stored is None:
+            self._values[key] = stored = value
+            self._stored[id(value)] = value
+        return stored
+
+    def _member_keys(self, values):
+        """
+        Return the items ``values`` with every object and array in them
+        replaced by the stored one, and the key of the items.
+        """
+        keys = []
+        for index, value in enumerate(values):
+            if value.__class__ is SchemaIR or isinstance(value, tuple):
+                if self._stored.get(id(value)) is not value:
+                    value = values[index] = self.intern(value)
+                keys.append(id(value))
+            else:
+                # Keep e.g. 1, 1.0 and True apart.
+                keys.append((value.__class__, value))
+        return tuple(keys)
+
+    def schema(self, keys, values):
+        """
+        Return the stored object with the keys ``keys`` and the frozen
+        values ``values``, storing a new one if there is none.
+        """
+        values = list(values)
+        shape = _shape(tuple(keys))
+        key = (shape, self._member_keys(values))
+        stored = self._members.get(key)
+        if stored is None:
+            stored = self._members[key] = self.intern(
+                SchemaIR._make(shape, tuple(values)))
+        return stored
+
+    def array(self, values):
+        """
+        Return the stored array of the frozen values ``values``, storing a
+        new one if there is none.
+        """
+        values = list(values)
+        key = (Array, self._member_keys(values))
+        stored = self._members.get(key)
+        if stored is None:
+            stored = self._members[key] = self.intern(Array(values))
+        return stored
+
+
+class _Key(object):
+    """
+    Wraps a frozen value to compare it with :func:`_same` in a dict.
+    """
+    __slots__ = ('value', 'hash')
+
+    def __init__(self, value):
+        self.value = value
+        self.hash = _value_hash(value, None)
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return self.hash == other.hash and _same(self.value, other.value)
+
+
+def freeze(value, table=None):
+    """
+    Return the JSON value ``value`` as a :class:`SchemaIR` document,
+    resolving any :class:`hammer.Deferred` properties in it as they are
+    reached. Scalars are kept as they are.
+
+    ``table`` may be an :class:`InternTable` to share objects and arrays
+    with other documents built with it.
+    """
+    return _freeze(value, table)
+
+
+def _freeze(value, table=None, fingerprints=None):
+    """
+    Freeze ``value`` (see :func:`freeze`). If ``fingerprints`` maps the id
+    of every Colander node in the schema ``value`` was converted from to its
+    interned fingerprint (see :func:`hammer._interned_fingerprints`), a
+    :class:`hammer.Deferred` property for a subtree equal to one frozen
+    before is not converted again, but shares what it was frozen as.
+    """
+    if table is None:
+        table = InternTable()
+    # Read-only values, like large enums, are shared between the documents
+    # that use them already, and are only frozen once.
+    memo = {}
+    # Maps the key of each subtree frozen so far to what it was frozen as.
+    subtrees = {}
+    result = []
+    # Each frame is an iterator of (key, value) pairs, the keys and values
+    # read from it so far, the value it reads and the key of the subtree it
+    # was converted from, if any.
+    stack = [(iter(((None, value),)), None, result, None, None)]
+
+    while stack:
+        items, keys, values, source, subtree = stack[-1]
+        for key, item in items:
+            if keys is not None:
+                keys.append(key)
+            node_key = None
+            if item.__class__ is hammer.Deferred:
+                if fingerprints is not None:
+                    # A node's name is not part of its property, so equal
+                    # subtrees under different names share a key.
+                    node = item.node
+                    node_key = hammer._node_fingerprint(node)[1:] + (
+                        tuple(fingerprints[id(each)]
+                              for each in node.children),)
+                    frozen = subtrees.get(node_key)
+                    if frozen is not None:
+                        values.append(frozen)
+                        continue
+                item = item.resolve()
+
+            if isinstance(item, (dict, list, tuple)) and \
+                    item.__class__ is not SchemaIR:
+                frozen = memo.get(id(item))
+                if frozen is not None:
+                    values.append(frozen[1])
+                    continue
+                if isinstance(item, dict):
+                    stack.append((iter(item.items()), [], [], item,
+                                  node_key))
+                else:
+                    stack.append((((None, each) for each in item), None, [],
+                                  item, node_key))
+                break
+
+            if item.__class__ is SchemaIR:
+                item = table.intern(item)
+            values.append(item)
+        else:
+            stack.pop()
+            if not stack:
+                break
+            if keys is None:
+                frozen = table.array(values)
+            else:
+                frozen = table.schema(keys, values)
+            if isinstance(source, (hammer._ReadOnlyList,
+                                   hammer._ReadOnlyDict)):
+                # Keep the source alive so that its id is not reused.
+                memo[id(source)] = (source, frozen)
+            if subtree is not None:
+                subtrees[subtree] = frozen
+            stack[-1][2].append(frozen)
+
+    return result[0]
+
+
+def to_schema_ir(schema, draft_version=4, include_types=True, registry=None,
+                 table=None):
+    """
+    Return the JSON schema document for the Colander schema *instance*
+    ``schema`` as a :class:`SchemaIR`. See :func:`freeze`.
+
+    Mappings, sequences and tuples equal to one converted before in the
+    same schema, by :func:`hammer.fingerprint` but for their names, are
+    only converted once.
+    """
+    if draft_version not in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+        raise ValueError(
+            'The following JSON Schema draft versions are supported: '
+            '%s' % ', '.join(map(str, hammer.SUPPORTED_JSON_DRAFT_VERSIONS)))
+
+    return _freeze(hammer._convert_root(schema, draft_version, include_types,
+                                        registry=registry),
+                   table, hammer._interned_fingerprints(schema, {}))
+
+
+def materialize(value):
+    """
+    Return the frozen value ``value`` as plain dicts and lists.
+    """
+    if value.__class__ is not SchemaIR and not isinstance(value, tuple):
+        return value
+
+    def container(value):
+        if value.__class__ is SchemaIR:
+            return {}, zip(value._shape.keys, value._values)
+        return [], ((None, item) for item in value)
+
+    root, items = container(value)
+    stack = [(root, items)]
+    while stack:
+        target, items = stack[-1]
+        for key, item in items:
+            if item.__class__ is SchemaIR or isinstance(item, tuple):
+                copy, children = container(item)
+                stack.append((copy, children))
+            else:
+                copy = item
+            if key is None:
+                target.append(copy)
+            else:
+                target[key] = copy
+            if copy is not item:
+                break
+        else:
+            stack.pop()
+    return root
+
+
+def _events(value):
+    if value.__class__ is not SchemaIR and not isinstance(value, tuple):
+        yield 'value', value
+        return
+
+    def start(value):
+        if value.__class__ is SchemaIR:
+            return ('start_object', 'end_object',
+                    zip(value._shape.keys, value._values))
+        return 'start_array', 'end_array', ((None, item) for item in value)
+
+    event, end, items = start(value)
+    yield event, None
+    stack = [(end, items)]
+    while stack:
+        end, items = stack[-1]
+        for key, item in items:
+            if key is not None:
+                yield 'key', key
+            if item.__class__ is SchemaIR or isinstance(item, tuple):
+                event, child_end, children = start(item)
+                yield event, None
+                stack.append((child_end, children))
+                break
+            yield 'value', item
+        else:
+            stack.pop()
+            yield end, None
@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+profiling.py: Find out which adapters and subtrees make a conversion slow.
+
+A :class:`Profiler` is a :class:`hammer.Hook` that records, for every adapter
+and for every node path, how many times it ran, its cumulative time (including
+the adapters it called) and its self time, and optionally the memory its
+calls allocated:
+
+    with Profiler(trace_memory=True) as profiler:
+        hammer.to_json_schema(Person())
+    print(profiler.report())
+
+Node paths are the names of the nodes from the root down, joined with ``/``;
+the root's path is ``/``.
+"""
+import threading
+import time
+import tracemalloc
+
+import hammer
+
+
+class Stats(object):
+    """
+    What was recorded for one adapter or node path. Times are in seconds and
+    allocations in bytes (net of what was freed before the call returned).
+    """
+    __slots__ = ('calls', 'cumulative', 'self_time', 'allocated',
+                 'self_allocated')
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.self_time = 0.0
+        self.allocated = 0
+        self.self_allocated = 0
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return '<Stats calls=%d cumulative=%.6f self_time=%.6f>' % (
+            self.calls, self.cumulative, self.self_time)
+
+
+class _Frame(object):
+    __slots__ = ('adapter', 'path', 'started', 'memory', 'child_time',
+                 'child_memory', 'outermost')
+
+    def __init__(self, adapter, path, started, memory, outermost):
+        self.adapter = adapter
+        self.path = path
+        self.started = started
+        self.memory = memory
+        self.child_time = 0.0
+        self.child_memory = 0
+        self.outermost = outermost
+
+
+def adapter_name(adapter):
+    """
+    Return the name ``adapter`` is reported under.
+    """
+    name = getattr(adapter, '__qualname__', None) or \
+        getattr(adapter, '__name__', None)
+    if name is None:
+        return repr(adapter)
+    return '%s.%s' % (getattr(adapter, '__module__', None) or '?', name)
+
+
+def _child_path(parent, node):
+    if parent is None:
+        return '/'
+    return '%s%s%s' % (parent, '' if parent.endswith('/') else '/',
+                       node.name)
+
+
+class Profiler(hammer.Hook):
+    """
+    Record the cost of adapter calls while added as a hook, e.g. in a
+    ``with`` block.
+
+    ``adapters`` and ``paths`` map adapter names (see :func:`adapter_name`)
+    and node paths to :class:`Stats`. The time validator adapters take counts
+    towards the self time of the validator adapter, not of the node. If
+    ``trace_memory`` is True, allocations are traced with :mod:`tracemalloc`,
+    which slows conversions down considerably.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.adapters = {}
+        self.paths = {}
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def reset(self):
+        """
+        Forget everything recorded so far.
+        """
+        self.adapters.clear()
+        self.paths.clear()
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        hammer.add_hook(self)
+
+    def stop(self):
+        hammer.remove_hook(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _state(self):
+        local = self._local
+        if not hasattr(local, 'stack'):
+            # Maps the ids of deferred nodes to their parent's path.
+            local.stack, local.deferred, local.active = [], {}, {}
+        return local
+
+    def defer(self, node):
+        state = self._state()
+        parent = state.stack[-1].path if state.stack else None
+        state.deferred[id(node)] = parent
+
+    def enter(self, kind, target, adapter):
+        state = self._state()
+        stack = state.stack
+        path = None
+
+        if kind == 'schema':
+            if stack:
+                parent = stack[-1].path
+            else:
+                parent = state.deferred.pop(id(target), None)
+            path = _child_path(parent, target)
+
+        active = state.active.get(adapter, 0)
+        state.active[adapter] = active + 1
+        memory = tracemalloc.get_traced_memory()[0] \
+            if self.trace_memory else 0
+        stack.append(_Frame(adapter, path, time.perf_counter(), memory,
+                            not active))
+
+    def exit(self, kind, target, adapter):
+        elapsed_at = time.perf_counter()
+        state = self._state()
+        frame = state.stack.pop()
+        state.active[adapter] -= 1
+
+        elapsed = elapsed_at - frame.started
+        allocated = 0
+        if self.trace_memory:
+            allocated = tracemalloc.get_traced_memory()[0] - frame.memory
+
+        if state.stack:
+            parent = state.stack[-1]
+            parent.child_time += elapsed
+            parent.child_memory += allocated
+
+        records = [(self.adapters, adapter_name(adapter), frame.outermost)]
+        if frame.path is not None:
+            records.append((self.paths, frame.path, True))
+
+        for table, key, outermost in records:
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = Stats()
+            stats.calls += 1
+            stats.self_time += elapsed - frame.child_time
+            stats.self_allocated += allocated - frame.child_memory
+            # Recursive calls are already included in the outermost one.
+            if outermost:
+                stats.cumulative += elapsed
+                stats.allocated += allocated
+
+    def report(self, limit=20, sort='self_time'):
+        """
+        Return a text table of the ``limit`` adapters and the ``limit`` node
+        paths with the highest ``sort``: the name of a :class:`Stats`
+        attribute.
+        """
+        lines = []
+        columns = '%10s %12s %12s' % ('calls', 'cumulative', 'self')
+        if self.trace_memory:
+            columns += ' %12s %12s' % ('allocated', 'self alloc')
+
+        for title, table in (('adapter', self.adapters),
+                             ('node path', self.paths)):
+            rows = sorted(table.items(),
+                          key=lambda item: getattr(item[1], sort),
+                          reverse=True)[:limit]
+            width = max([len(title)] + [len(key) for key, _ in rows])
+            if lines:
+                lines.append('')
+            lines.append('%-*s %s' % (width, title, columns))
+            for key, stats in rows:
+                line = '%-*s %10d %12.6f %12.6f' % (
+                    width, key, stats.calls, stats.cumulative,
+                    stats.self_time)
+                if self.trace_memory:
+                    line += ' %12d %12d' % (stats.allocated,
+                                            stats.self_allocated)
+                lines.append(line)
+
+        return '\n'.join(lines)
+
+
+def profile(schema, trace_memory=False, **kwargs):
+    """
+    Convert ``schema`` with :func:`hammer.to_json_schema`, passing on
+    ``kwargs``, and return the :class:`Profiler` that recorded it.
+    """
+    with Profiler(trace_memory=trace_memory) as profiler:
+        hammer.to_json_schema(schema, **kwargs)
+    return profiler
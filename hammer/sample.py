@@ -0,0 +1,674 @@
+# coding=utf-8
+"""
+sample.py: Generate instances of Colander schemas, e.g. for load tests.
+
+A :class:`Sampler` compiles a schema once, reading the constraints of every
+node from the JSON schema the adapter registry converts it to, so it honours
+``Range``, ``Length``, ``OneOf`` and ``Regex`` validators, the lengths of
+tuples and the items of sequences, and any adapter registered for other
+types or validators. It then streams batches of JSON-compatible instances:
+
+    sampler = sample.Sampler(Person())
+    for batch in sampler.batches(batch_size=10000, count=10 ** 6, seed=1):
+        post_many(batch.instances)
+
+Instances are generated a column at a time, so numbers, strings, choices
+and dates of a whole batch are drawn at once, with NumPy if it is installed.
+With ``invalid_ratio``, that fraction of instances is made invalid against
+the JSON schema by changing one of their values, and their indexes are in
+the ``invalid`` of each batch.
+
+The same seed generates the same instances, but not with and without NumPy.
+"""
+from collections import namedtuple
+import datetime
+import math
+import random
+import re
+import string
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import colander
+import hammer
+
+
+class Batch(namedtuple('Batch', 'instances invalid')):
+    """
+    A list of generated ``instances`` and the sorted list of the indexes of
+    those that are ``invalid``.
+    """
+    __slots__ = ()
+
+
+_ALPHABET = string.ascii_letters + string.digits
+_PRINTABLE = ''.join(chr(code) for code in range(32, 127))
+
+# Bounds used when a schema does not give any. Integers stay within what a
+# double represents exactly.
+_DEFAULT_SPREAD = 1000000
+_MAX_INTEGER = 2 ** 53
+_MAX_LENGTH = 16
+_MAX_ITEMS = 4
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MAX_SECONDS = 2 ** 31 - 1
+
+_PATTERN_ATTEMPTS = 100
+
+# A value of another type for each JSON type.
+_WRONG_TYPES = {
+    'string': 0,
+    'number': 'x',
+    'integer': 'x',
+    'boolean': 'x',
+    'null': 'x',
+    'object': [],
+    'array': {},
+}
+
+
+class _PythonRandom(object):
+    """
+    Draws columns of random values one value at a time.
+    """
+    def __init__(self, seed):
+        self.scalar = random.Random(seed)
+
+    def integers(self, low, high, size):
+        randint = self.scalar.randint
+        return [randint(low, high) for _ in range(size)]
+
+    def floats(self, low, high, size):
+        uniform = self.scalar.uniform
+        return [uniform(low, high) for _ in range(size)]
+
+    def fractions(self, size):
+        rand = self.scalar.random
+        return [rand() for _ in range(size)]
+
+    def text(self, lengths, alphabet):
+        text = ''.join(self.scalar.choices(alphabet, k=sum(lengths)))
+        return _split(text, lengths)
+
+
+class _NumpyRandom(object):
+    """
+    Draws columns of random values with NumPy.
+    """
+    def __init__(self, seed):
+        self.generator = numpy.random.default_rng(seed)
+        # Values that can only be drawn one at a time, like strings that
+        # match a pattern, are drawn from a generator seeded by this one.
+        self.scalar = random.Random(int(self.generator.integers(2 ** 62)))
+        self.alphabets = {}
+
+    def integers(self, low, high, size):
+        return self.generator.integers(low, high, size=size,
+                                       endpoint=True).tolist()
+
+    def floats(self, low, high, size):
+        return self.generator.uniform(low, high, size).tolist()
+
+    def fractions(self, size):
+        return self.generator.random(size).tolist()
+
+    def text(self, lengths, alphabet):
+        codes = self.alphabets.get(alphabet)
+        if codes is None:
+            codes = self.alphabets[alphabet] = numpy.frombuffer(
+                alphabet.encode('ascii'), dtype=numpy.uint8)
+        indexes = self.generator.integers(0, len(codes), size=sum(lengths))
+        return _split(codes[indexes].tobytes().decode('ascii'), lengths)
+
+
+def _random(seed, vectorize=None):
+    if vectorize is None:
+        vectorize = numpy is not None
+    if vectorize:
+        if numpy is None:
+            raise ValueError('NumPy is not installed')
+        return _NumpyRandom(seed)
+    return _PythonRandom(seed)
+
+
+def _split(text, lengths):
+    parts = []
+    start = 0
+    for length in lengths:
+        end = start + length
+        parts.append(text[start:end])
+        start = end
+    return parts
+
+
+def _split_list(values, lengths):
+    parts = []
+    start = 0
+    for length in lengths:
+        end = start + length
+        parts.append(values[start:end])
+        start = end
+    return parts
+
+
+def _keywords(json_property):
+    """
+    Return the keywords of ``json_property`` merged with those of its
+    ``allOf`` or ``extends`` subschemas, keeping the tighter bound and the
+    common choices, and with every pattern in a list under ``'patterns'``.
+    """
+    keywords = {'patterns': []}
+    pending = [json_property]
+
+    while pending:
+        schema = pending.pop(0)
+        for keyword, value in schema.items():
+            if keyword in ('allOf', 'extends'):
+                pending.extend(value if isinstance(value, list) else [value])
+            elif keyword == 'pattern':
+                keywords['patterns'].append(value)
+            elif keyword == 'enum' and 'enum' in keywords:
+                keywords['enum'] = [choice for choice in keywords['enum']
+                                    if choice in value]
+            elif keyword in hammer._LOWER_BOUNDS and keyword in keywords:
+                keywords[keyword] = max(keywords[keyword], value)
+            elif keyword in hammer._UPPER_BOUNDS and keyword in keywords:
+                keywords[keyword] = min(keywords[keyword], value)
+            else:
+                keywords.setdefault(keyword, value)
+
+    return keywords
+
+
+class _Field(object):
+    """
+    Generates the values of one node.
+    """
+    def __init__(self, keywords):
+        json_type = keywords.get('type')
+        if not isinstance(json_type, str) or json_type not in _WRONG_TYPES:
+            json_type = None
+        self.json_type = json_type
+        self.enum = keywords.get('enum')
+
+    @property
+    def corruptible(self):
+        return self.json_type is not None or self.enum is not None
+
+    def sample(self, rng, size):
+        raise NotImplementedError
+
+    def corrupt(self, value, rng):
+        """
+        Return a value that the JSON schema of the node does not accept.
+        """
+        if self.json_type is not None:
+            return _WRONG_TYPES[self.json_type]
+        return ['not one of the choices']
+
+
+class _Anything(_Field):
+    def sample(self, rng, size):
+        return [None] * size
+
+
+class _Choices(_Field):
+    def __init__(self, keywords):
+        super(_Choices, self).__init__(keywords)
+        if not self.enum:
+            raise ValueError('No choice is allowed: %r' % keywords)
+        self.choices = list(self.enum)
+
+    def sample(self, rng, size):
+        choices = self.choices
+        return [choices[index] for index in
+                rng.integers(0, len(choices) - 1, size)]
+
+
+class _Booleans(_Field):
+    def sample(self, rng, size):
+        return [fraction < 0.5 for fraction in rng.fractions(size)]
+
+
+class _Numbers(_Field):
+    def __init__(self, keywords, integral):
+        super(_Numbers, self).__init__(keywords)
+        self.integral = integral
+        low = keywords.get('minimum')
+        high = keywords.get('maximum')
+        if low is None:
+            low = 0 if high is None or high > 0 else high - _DEFAULT_SPREAD
+        if high is None:
+            high = low + _DEFAULT_SPREAD
+
+        if integral:
+            low = max(int(math.ceil(low)), -_MAX_INTEGER)
+            high = min(int(math.floor(high)), _MAX_INTEGER)
+            if keywords.get('exclusiveMinimum') and \
+                    low == keywords.get('minimum'):
+                low += 1
+            if keywords.get('exclusiveMaximum') and \
+                    high == keywords.get('maximum'):
+                high -= 1
+        if low > high:
+            raise ValueError('No number is in range: %r' % keywords)
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        if self.integral:
+            return rng.integers(self.low, self.high, size)
+
+        low, high = self.low, self.high
+        values = rng.floats(low, high, size)
+        for index, value in enumerate(values):
+            # Floats are converted as numbers that are not integers, which
+            # a bound may be, and so may be what is drawn.
+            if value == low or value == high or value.is_integer():
+                values[index] = low + (high - low) / 3.0
+        return values
+
+
+class _Dates(_Field):
+    def __init__(self, keywords, method):
+        super(_Dates, self).__init__(keywords)
+        self.method = method
+
+    def sample(self, rng, size):
+        method = self.method
+        return [method(_EPOCH + datetime.timedelta(seconds=seconds))
+                for seconds in rng.integers(0, _MAX_SECONDS, size)]
+
+
+def _date_text(value):
+    return value.date().isoformat()
+
+
+def _time_text(value):
+    return value.time().isoformat()
+
+
+def _datetime_text(value):
+    return value.isoformat()
+
+
+class _Pattern(object):
+    """
+    Generates strings that match a regular expression, retrying those that
+    a construct it cannot generate, like a lookahead, makes fail.
+    """
+    def __init__(self, pattern, spread):
+        self.regex = re.compile(pattern)
+        self.parsed = sre_parse.parse(pattern)
+        self.spread = spread
+        self.classes = {}
+
+    def sample(self, scalar, accept):
+        for _ in range(_PATTERN_ATTEMPTS):
+            out = []
+            self.emit(self.parsed, scalar, out, {})
+            text = ''.join(out)
+            if self.regex.search(text) and accept(text):
+                return text
+        raise ValueError('Cannot generate a string that matches %r'
+                         % self.regex.pattern)
+
+    def emit(self, parsed, scalar, out, groups):
+        for op, av in parsed:
+            if op == sre_parse.LITERAL:
+                out.append(chr(av))
+            elif op == sre_parse.NOT_LITERAL:
+                out.append(scalar.choice(_PRINTABLE.replace(chr(av), '')))
+            elif op == sre_parse.ANY:
+                out.append(scalar.choice(_ALPHABET))
+            elif op == sre_parse.IN:
+                out.append(scalar.choice(self.class_chars(av)))
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                        getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+                low, high, subpattern = av
+                high = min(high, low + self.spread)
+                for _ in range(scalar.randint(low, high)):
+                    self.emit(subpattern, scalar, out, groups)
+            elif op == sre_parse.SUBPATTERN:
+                start = len(out)
+                self.emit(av[-1], scalar, out, groups)
+                if av[0] is not None:
+                    groups[av[0]] = ''.join(out[start:])
+            elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+                self.emit(av, scalar, out, groups)
+            elif op == sre_parse.BRANCH:
+                self.emit(scalar.choice(av[1]), scalar, out, groups)
+            elif op == sre_parse.GROUPREF:
+                out.append(groups.get(av, ''))
+            elif op == sre_parse.GROUPREF_EXISTS:
+                group, yes, no = av[0], av[1], av[2]
+                branch = yes if group in groups else no
+                if branch is not None:
+                    self.emit(branch, scalar, out, groups)
+            elif op in (sre_parse.AT, sre_parse.ASSERT,
+                        sre_parse.ASSERT_NOT):
+                # Checked by matching what was generated.
+                continue
+            else:
+                raise ValueError('Cannot generate strings for %r: %s'
+                                 % (self.regex.pattern, op))
+
+    def class_chars(self, items):
+        """
+        Return the printable ASCII characters in a character class, or else
+        the first character of the class.
+        """
+        key = id(items)
+        chars = self.classes.get(key)
+        if chars is None:
+            chars = self.classes[key] = ''.join(
+                char for char in _PRINTABLE if _in_class(items, char)) or \
+                _first_in_class(items)
+        return chars
+
+
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: lambda char: char.isdigit(),
+    sre_parse.CATEGORY_NOT_DIGIT: lambda char: not char.isdigit(),
+    sre_parse.CATEGORY_SPACE: lambda char: char.isspace(),
+    sre_parse.CATEGORY_NOT_SPACE: lambda char: not char.isspace(),
+    sre_parse.CATEGORY_WORD: lambda char: char.isalnum() or char == '_',
+    sre_parse.CATEGORY_NOT_WORD:
+        lambda char: not (char.isalnum() or char == '_'),
+}
+
+
+def _in_class(items, char):
+    code = ord(char)
+    negate = False
+    for op, av in items:
+        if op == sre_parse.NEGATE:
+            negate = True
+        elif op == sre_parse.LITERAL and code == av or \
+                op == sre_parse.RANGE and av[0] <= code <= av[1] or \
+                op == sre_parse.CATEGORY and \
+                _CATEGORIES.get(av, lambda char: False)(char):
+            return not negate
+    return negate
+
+
+def _first_in_class(items):
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            return chr(av)
+        if op == sre_parse.RANGE:
+            return chr(av[0])
+    raise ValueError('Cannot generate characters for the class %r' % items)
+
+
+class _Strings(_Field):
+    def __init__(self, keywords):
+        super(_Strings, self).__init__(keywords)
+        self.min_length = max(keywords.get('minLength') or 0, 1)
+        max_length = keywords.get('maxLength')
+        if max_length is None:
+            # Strings that match a pattern are as long as they turn out.
+            max_length = _MAX_INTEGER if keywords['patterns'] else \
+                self.min_length + _MAX_LENGTH
+        self.max_length = max_length
+        if self.min_length > self.max_length:
+            raise ValueError('No length is in range: %r' % keywords)
+
+        self.email = keywords.get('format') == 'email'
+        patterns = keywords['patterns']
+        self.pattern = None
+        if patterns:
+            spread = max(_MAX_LENGTH // 2, self.min_length)
+            self.pattern = _Pattern(patterns[0], spread)
+            self.others = [re.compile(pattern) for pattern in patterns[1:]]
+
+    def accept(self, text):
+        return self.min_length <= len(text) <= self.max_length and \
+            all(regex.search(text) for regex in self.others)
+
+    def sample(self, rng, size):
+        if self.pattern is not None:
+            pattern, scalar, accept = self.pattern, rng.scalar, self.accept
+            return [pattern.sample(scalar, accept) for _ in range(size)]
+
+        if self.email:
+            return ['%s@example.com' % local for local in
+                    rng.text(rng.integers(1, _MAX_LENGTH, size), _ALPHABET)]
+
+        lengths = rng.integers(self.min_length, self.max_length, size)
+        return rng.text(lengths, _ALPHABET)
+
+
+class _Arrays(_Field):
+    def __init__(self, keywords, items):
+        super(_Arrays, self).__init__(keywords)
+        self.items = items
+        self.unique = bool(keywords.get('uniqueItems'))
+        # A Length validator of a sequence is converted to the keywords of
+        # strings.
+        low = max(keywords.get('minItems') or 0,
+                  keywords.get('minLength') or 0)
+        high = min(keywords.get('maxItems', _MAX_INTEGER),
+                   keywords.get('maxLength', _MAX_INTEGER))
+        if high == _MAX_INTEGER:
+            high = low + _MAX_ITEMS
+        if low > high:
+            raise ValueError('No length is in range: %r' % keywords)
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        lengths = rng.integers(self.low, self.high, size)
+        arrays = _split_list(self.items.sample(rng, sum(lengths)), lengths)
+        if self.unique:
+            arrays = [_unique(array) for array in arrays]
+        return arrays
+
+    def corrupt(self, value, rng):
+        if value and self.items.corruptible and rng.scalar.random() < 0.5:
+            value = list(value)
+            index = rng.scalar.randrange(len(value))
+            value[index] = self.items.corrupt(value[index], rng)
+            return value
+        return super(_Arrays, self).corrupt(value, rng)
+
+
+def _unique(values):
+    seen = []
+    for value in values:
+        if value not in seen:
+            seen.append(value)
+    return seen
+
+
+class _Tuples(_Field):
+    def __init__(self, keywords, fields):
+        super(_Tuples, self).__init__(keywords)
+        self.fields = fields
+
+    def sample(self, rng, size):
+        if not self.fields:
+            return [[] for _ in range(size)]
+        columns = [field.sample(rng, size) for field in self.fields]
+        return [list(values) for values in zip(*columns)]
+
+    def corrupt(self, value, rng):
+        indexes = [index for index, field in enumerate(self.fields)
+                   if field.corruptible]
+        if indexes and rng.scalar.random() < 0.5:
+            value = list(value)
+            index = rng.scalar.choice(indexes)
+            value[index] = self.fields[index].corrupt(value[index], rng)
+            return value
+        return super(_Tuples, self).corrupt(value, rng)
+
+
+class _Objects(_Field):
+    def __init__(self, keywords, fields):
+        super(_Objects, self).__init__(keywords)
+        self.fields = fields
+        required = keywords.get('required')
+        self.required = required if isinstance(required, list) else []
+
+    def sample(self, rng, size):
+        if not self.fields:
+            return [{} for _ in range(size)]
+        names = [name for name, _ in self.fields]
+        columns = [field.sample(rng, size) for _, field in self.fields]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def corrupt(self, value, rng):
+        names = [name for name, field in self.fields
+                 if field.corruptible and name in value]
+        choice = rng.scalar.random()
+        if names and choice < 0.5:
+            value = dict(value)
+            name = rng.scalar.choice(names)
+            value[name] = dict(self.fields)[name].corrupt(value[name], rng)
+            return value
+        required = [name for name in self.required if name in value]
+        if required and choice < 0.75:
+            value = dict(value)
+            del value[rng.scalar.choice(required)]
+            return value
+        return super(_Objects, self).corrupt(value, rng)
+
+
+def _compile(node, json_property):
+    """
+    Return the :class:`_Field` for ``node``, whose JSON schema is
+    ``json_property``.
+    """
+    keywords = _keywords(json_property)
+    typ = node.typ
+
+    if isinstance(typ, colander.Mapping):
+        properties = json_property.get('properties', {})
+        return _Objects(keywords, [
+            (child.name, _compile(child, properties.get(child.name, {})))
+            for child in node.children])
+
+    if isinstance(typ, colander.Tuple):
+        items = json_property.get('items')
+        if not isinstance(items, list):
+            items = []
+        return _Tuples(keywords, [
+            _compile(child, items[index] if index < len(items) else {})
+            for index, child in enumerate(node.children)])
+
+    if isinstance(typ, colander.Sequence):
+        items = json_property.get('items')
+        if not isinstance(items, dict):
+            items = {}
+        return _Arrays(keywords, _compile(node.children[0], items))
+
+    if keywords.get('enum') is not None:
+        return _Choices(keywords)
+
+    if isinstance(typ, colander.Set):
+        return _Arrays(keywords, _Strings({'patterns': []}))
+    if isinstance(typ, colander.Boolean):
+        return _Booleans(keywords)
+    if isinstance(typ, (colander.Float, colander.Decimal)):
+        return _Numbers(keywords, integral=False)
+    if isinstance(typ, colander.Integer):
+        return _Numbers(keywords, integral=True)
+    if isinstance(typ, colander.DateTime):
+        return _Dates(keywords, _datetime_text)
+    if isinstance(typ, colander.Date):
+        return _Dates(keywords, _date_text)
+    if isinstance(typ, colander.Time):
+        return _Dates(keywords, _time_text)
+    if isinstance(typ, colander.String):
+        return _Strings(keywords)
+
+    # Other types are generated from their JSON schema alone.
+    json_type = keywords.get('type')
+    if json_type == 'string':
+        return _Strings(keywords)
+    if json_type in ('number', 'integer'):
+        return _Numbers(keywords, integral=json_type == 'integer' or
+                        'not' not in keywords)
+    if json_type == 'boolean':
+        return _Booleans(keywords)
+    if json_type == 'array':
+        return _Arrays(keywords, _Anything({}))
+    if json_type == 'object':
+        return _Objects(keywords, [])
+    return _Anything(keywords)
+
+
+class Sampler(object):
+    """
+    Generates instances of the Colander schema *instance* ``schema``.
+
+    ``registry`` is the adapter registry whose JSON schema for ``schema``
+    gives the constraints of its nodes (see :func:`hammer.to_json_schema`).
+    Raises ValueError if a node allows no value, or has a pattern it cannot
+    generate strings for.
+    """
+    def __init__(self, schema, registry=None):
+        self.json_schema = hammer.to_json_schema(schema, registry=registry)
+        self.field = _compile(schema, self.json_schema)
+
+    def sample(self, rng, size, invalid_ratio=0.0):
+        instances = self.field.sample(rng, size)
+        invalid = []
+        if invalid_ratio:
+            if not self.field.corruptible:
+                raise ValueError('The schema accepts any instance')
+            field = self.field
+            for index, fraction in enumerate(rng.fractions(size)):
+                if fraction < invalid_ratio:
+                    instances[index] = field.corrupt(instances[index], rng)
+                    invalid.append(index)
+        return Batch(instances, invalid)
+
+    def batches(self, batch_size=1000, count=None, seed=None,
+                invalid_ratio=0.0, vectorize=None):
+        """
+        Yield :class:`Batch` objects of ``batch_size`` instances, up to
+        ``count`` instances in all or else forever.
+
+        ``seed`` seeds the random number generator. ``invalid_ratio`` is the
+        fraction of instances that are made invalid. ``vectorize`` tells
+        whether to draw values with NumPy, which by default it does if it
+        is installed.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        rng = _random(seed, vectorize)
+        remaining = count
+
+        while remaining is None or remaining > 0:
+            size = batch_size
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+            yield self.sample(rng, size, invalid_ratio=invalid_ratio)
+
+    def __iter__(self):
+        """
+        Yield valid instances forever.
+        """
+        for batch in self.batches():
+            for instance in batch.instances:
+                yield instance
+
+
+def sample_batches(schema, batch_size=1000, count=None, seed=None,
+                   invalid_ratio=0.0, registry=None):
+    """
+    Yield batches of instances of ``schema``. See :meth:`Sampler.batches`.
+    """
+    return Sampler(schema, registry=registry).batches(
+        batch_size=batch_size, count=count, seed=seed,
+        invalid_ratio=invalid_ratio)
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import colander
+import hammer
+
+from hammer import aio
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+class ConversionCounter(hammer.Hook):
+    def __init__(self, schemas):
+        self.schemas = set(map(id, schemas))
+        self.count = 0
+        self.release = threading.Event()
+
+    def enter(self, kind, target, adapter):
+        if id(target) in self.schemas:
+            self.count += 1
+            # Hold the conversion until every request has been made.
+            self.release.wait(5)
+
+
+class TestSingleFlight(HammerTestCase):
+    def run_concurrently(self, function, schema, requests=50, **kwargs):
+        # ``schema`` may be a class, to make a new instance per request.
+        schemas = [schema() if isinstance(schema, type) else schema
+                   for _ in range(requests)]
+        counter = ConversionCounter(schemas)
+
+        async def main():
+            tasks = [asyncio.ensure_future(function(each, **kwargs))
+                     for each in schemas]
+            await asyncio.sleep(0)
+            self.assertEqual(aio.in_flight(), 1)
+            counter.release.set()
+            return await asyncio.gather(*tasks)
+
+        hammer.add_hook(counter)
+        try:
+            results = asyncio.run(main())
+        finally:
+            hammer.remove_hook(counter)
+
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(aio.in_flight(), 0)
+        return results
+
+    def test_concurrent_requests_share_one_conversion(self):
+        schema = Person()
+        results = self.run_concurrently(aio.to_json_schema, schema,
+                                        draft_version=3)
+        expected = hammer.to_json_schema(schema, draft_version=3)
+        for result in results:
+            self.assertEqual(result, expected)
+
+        # Every caller owns its document.
+        results[0]['properties'].clear()
+        self.assertEqual(results[1], expected)
+
+    def test_requests_for_new_instances_share_one_conversion(self):
+        results = self.run_concurrently(aio.to_json_schema, Person)
+        expected = hammer.to_json_schema(Person())
+        for result in results:
+            self.assertEqual(result, expected)
+
+    def test_concurrent_requests_share_serialized_bytes(self):
+        schema = Person()
+        results = self.run_concurrently(aio.to_json_schema_bytes, schema,
+                                        cache=None)
+        self.assertEqual(len(set(map(id, results))), 1)
+        self.assertEqual(results[0],
+                         hammer.to_json_schema_bytes(schema, cache=None))
+
+    def test_different_options_are_converted_separately(self):
+        async def main():
+            return await asyncio.gather(
+                aio.to_json_schema(Person(), draft_version=3),
+                aio.to_json_schema(Person(), draft_version=4))
+
+        draft3, draft4 = asyncio.run(main())
+        self.assertEqual(draft3['properties']['name']['required'], True)
+        self.assertNotIn('required', draft4['properties']['name'])
+
+    def test_errors_reach_every_waiter(self):
+        class Unconvertible(colander.SchemaType):
+            pass
+
+        schema = colander.SchemaNode(colander.Mapping())
+        schema.add(colander.SchemaNode(Unconvertible(), name='thing'))
+
+        async def main():
+            return await asyncio.gather(
+                aio.to_json_schema(schema), aio.to_json_schema(schema),
+                return_exceptions=True)
+
+        for result in asyncio.run(main()):
+            self.assertIsInstance(result, hammer.Invalid)
+        self.assertEqual(aio.in_flight(), 0)
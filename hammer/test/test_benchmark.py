@@ -0,0 +1,76 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import colander
+import hammer
+
+from hammer import benchmark
+from hammer.test.test_hammer import HammerTestCase
+
+
+class TestGenerateSchema(HammerTestCase):
+    def test_schema_has_the_requested_shape(self):
+        schema = benchmark.generate_schema(width=5, depth=3)
+        node, depth = schema, 0
+        while node.children and node.children[0].children:
+            self.assertEqual(len(node.children), 5)
+            node, depth = node.children[0], depth + 1
+        self.assertEqual(depth, 3)
+        self.validate_schema(hammer.to_json_schema(schema))
+
+    def test_generation_is_deterministic(self):
+        first = benchmark.generate_schema(8, 2, seed=3)
+        second = benchmark.generate_schema(8, 2, seed=3)
+        third = benchmark.generate_schema(8, 2, seed=4)
+        self.assertEqual(hammer.fingerprint(first),
+                         hammer.fingerprint(second))
+        self.assertNotEqual(hammer.fingerprint(first),
+                            hammer.fingerprint(third))
+
+    def test_type_mix_and_validator_density(self):
+        schema = benchmark.generate_schema(20, 0, type_mix={'int': 1},
+                                           validator_density=1)
+        for node in schema.children:
+            self.assertIsInstance(node.typ, colander.Int)
+            self.assertIsInstance(node.validator, colander.Range)
+
+
+class TestRun(HammerTestCase):
+    def test_results_cover_every_case(self):
+        results = benchmark.run([2, 3], [1], draft_versions=(3, 4), repeat=1,
+                                number=1)
+        self.assertEqual([result['case'] for result in results], [
+            'width=2,depth=1,draft=3', 'width=2,depth=1,draft=4',
+            'width=3,depth=1,draft=3', 'width=3,depth=1,draft=4'])
+        for result in results:
+            self.assertGreater(result['best'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_compare_reports_regressions(self):
+        baseline = [{'case': 'a', 'best': 1.0}, {'case': 'b', 'best': 1.0}]
+        results = [{'case': 'a', 'best': 1.1}, {'case': 'b', 'best': 1.5},
+                   {'case': 'c', 'best': 9.0}]
+        self.assertEqual(benchmark.compare(baseline, results, 0.2),
+                         [('b', 1.0, 1.5)])
+
+    def test_main_writes_json_results_and_checks_the_baseline(self):
+        directory = tempfile.mkdtemp()
+        output = os.path.join(directory, 'results.json')
+        arguments = ['--width', '2', '--depth', '1', '--repeat', '1',
+                     '--number', '1']
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            first = benchmark.main(arguments + ['-o', output])
+            with open(output) as fp:
+                results = json.load(fp)
+            second = benchmark.main(arguments + ['--baseline', output,
+                                                 '--tolerance', '1000'])
+        finally:
+            sys.stdout = stdout
+            shutil.rmtree(directory)
+        self.assertEqual((first, second), (0, 0))
+        self.assertEqual(len(results), 2)
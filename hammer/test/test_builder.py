@@ -0,0 +1,174 @@
+import json
+
+import colander
+import hammer
+
+from hammer import builder
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+ADDRESS_BOOK = {
+    '$schema': 'http://json-schema.org/draft-04/schema#',
+    'type': 'object',
+    'definitions': {
+        'phone': {
+            'type': 'object',
+            'additionalProperties': False,
+            'properties': {
+                'location': {'enum': ['home', 'work']},
+                'number': {'type': 'string', 'pattern': '^[0-9-]+$'},
+            },
+            'required': ['number'],
+        },
+    },
+    'properties': {
+        'owner': {'type': 'string', 'title': 'Owner', 'minLength': 1},
+        'home': {'$ref': '#/definitions/phone'},
+        'work': {'$ref': '#/definitions/phone'},
+        'others': {
+            'type': 'array',
+            'items': {'$ref': '#/definitions/phone'},
+            'maxItems': 10,
+        },
+        'updated': {'type': ['string', 'null'], 'format': 'date-time'},
+        'rating': {'type': 'number', 'minimum': 0, 'maximum': 5,
+                   'default': 3},
+    },
+    'required': ['owner', 'home'],
+}
+
+
+class TestFromJsonSchema(HammerTestCase):
+    def test_round_trips_converted_schema(self):
+        expected = hammer.to_json_schema(Person())
+        schema = builder.from_json_schema(expected, cache=None)
+        json_schema = hammer.to_json_schema(schema)
+
+        self.assertEqual(json_schema['properties'].keys(),
+                         expected['properties'].keys())
+        self.assertEqual(json_schema['properties']['age'],
+                         expected['properties']['age'])
+        self.assertEqual(json_schema['required'], expected['required'])
+        self.assertIsInstance(schema['age'].typ, builder.Number)
+        self.assertIsInstance(schema['friends'].typ, colander.Sequence)
+        self.assertIsInstance(schema['friends']['item'].typ, colander.Tuple)
+
+    def test_round_trips_draft_3(self):
+        document = hammer.to_json_schema(Person(), draft_version=3)
+        schema = builder.from_json_schema(document, draft_version=3,
+                                          cache=None)
+        expected = hammer.to_json_schema(schema, draft_version=3)
+        schema = builder.from_json_schema(expected, draft_version=3,
+                                          cache=None)
+        self.assertEqual(hammer.to_json_schema(schema, draft_version=3),
+                         expected)
+        self.assertEqual(expected['properties']['name'],
+                         document['properties']['name'])
+
+    def test_round_trips_ints_and_floats(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.Int(), name='count',
+                                validator=colander.Range(0, 10)),
+            colander.SchemaNode(colander.Float(), name='ratio',
+                                validator=colander.Range(0, 1)))
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            expected = hammer.to_json_schema(schema,
+                                             draft_version=draft_version)
+            built = builder.from_json_schema(expected,
+                                             draft_version=draft_version,
+                                             cache=None)
+            self.assertIsInstance(built['count'].typ, builder.Number)
+            self.assertIsInstance(built['ratio'].typ, colander.Float)
+            self.assertEqual(hammer.to_json_schema(
+                built, draft_version=draft_version), expected)
+
+    def test_numbers_keep_their_fractions(self):
+        schema = builder.from_json_schema({
+            'type': 'object',
+            'properties': {
+                'price': {'type': 'number', 'minimum': 0},
+                'count': {'type': 'integer'},
+            },
+        }, cache=None)
+        self.assertIsInstance(schema['count'].typ, colander.Int)
+        self.assertEqual(schema.deserialize({'price': 2.75, 'count': 2}),
+                         {'price': 2.75, 'count': 2})
+        self.assertEqual(schema.deserialize({'price': '3'}), {'price': 3})
+        self.assertIs(type(schema.deserialize({'price': 3})['price']), int)
+        with self.assertRaises(colander.Invalid):
+            schema.deserialize({'price': 'cheap'})
+
+    def test_arrays_without_items_accept_anything(self):
+        document = {
+            'type': 'object',
+            'properties': {'values': {'type': 'array'}},
+        }
+        schema = builder.from_json_schema(document, cache=None)
+        values = [1, 'two', {'three': 3}, [4]]
+        self.assertEqual(schema.deserialize({'values': values}),
+                         {'values': values})
+        self.assertNotIn('items', hammer.to_json_schema(schema)[
+            'properties']['values'])
+
+    def test_builds_references_and_validators(self):
+        schema = builder.from_json_schema(ADDRESS_BOOK, cache=None)
+
+        self.assertEqual(schema['owner'].title, 'Owner')
+        self.assertIsInstance(schema['updated'].typ, colander.DateTime)
+        self.assertEqual(schema['home']['location'].validator.choices,
+                         ['home', 'work'])
+        self.assertEqual(schema['home'].typ.unknown, 'raise')
+        self.assertIsNot(schema['home'], schema['work'])
+        self.assertIs(schema['home']['number'].validator,
+                      schema['work']['number'].validator)
+
+        appstruct = schema.deserialize({
+            'owner': 'Ann',
+            'home': {'number': '555-1234'},
+            'others': [{'number': '1', 'location': 'work'}],
+        })
+        self.assertEqual(appstruct, {
+            'owner': 'Ann',
+            'home': {'number': '555-1234'},
+            'others': [{'number': '1', 'location': 'work'}],
+            'rating': 3,
+        })
+
+        with self.assertRaises(colander.Invalid) as context:
+            schema.deserialize({'owner': '', 'home': {'number': 'x'},
+                                'rating': 6})
+        self.assertEqual(sorted(context.exception.asdict()),
+                         ['home.number', 'owner', 'rating'])
+
+    def test_rejects_recursive_documents(self):
+        document = {
+            'type': 'object',
+            'properties': {'child': {'$ref': '#'}},
+        }
+        with self.assertRaises(ValueError):
+            builder.from_json_schema(document, cache=None)
+
+        with self.assertRaises(ValueError):
+            builder.from_json_schema(
+                {'$ref': 'http://example.com/schema.json'}, cache=None)
+
+
+class TestBuilderCache(HammerTestCase):
+    def test_reuses_builder_for_the_same_document(self):
+        cache = builder.BuilderCache(maxsize=2)
+        first = builder.compile_builder(ADDRESS_BOOK, cache=cache)
+        second = builder.compile_builder(json.dumps(ADDRESS_BOOK),
+                                         cache=cache)
+
+        self.assertIsNot(first, second)
+        self.assertIs(builder.compile_builder(
+            json.loads(json.dumps(ADDRESS_BOOK)), cache=cache), first)
+        self.assertEqual(cache.info(), hammer.CacheInfo(1, 2, 2, 2))
+
+        self.assertIsNot(first(), first())
+        self.assertEqual(hammer.to_json_schema(first()),
+                         hammer.to_json_schema(second()))
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
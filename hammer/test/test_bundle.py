@@ -0,0 +1,142 @@
+import io
+import json
+
+import colander
+import hammer
+
+from jsonschema import Draft3Validator, Draft4Validator
+from hammer import bundle
+from hammer.test.test_hammer import (
+    Friend, Friends, HammerTestCase, Person, Phone)
+
+
+class Contact(colander.MappingSchema):
+    home = Phone()
+    work = Phone()
+
+
+class OptionalContacts(colander.MappingSchema):
+    home = Phone(missing=colander.drop)
+    work = Phone(missing=colander.drop)
+    friends = Friends(validator=colander.Length(1, 10))
+    enemies = Friends(validator=colander.Length(1, 10))
+
+
+class TestBundle(HammerTestCase):
+    def test_emits_shared_subschemas_once(self):
+        document = bundle.bundle({
+            'Contact': Contact(),
+            'Person': Person(),
+            'Friend': Friend(),
+        })
+        definitions = document['definitions']
+
+        self.assertEqual(sorted(definitions),
+                         ['Contact', 'Friend', 'Person', 'home'])
+        self.assertEqual(definitions['Contact']['properties'], {
+            'home': {'$ref': '#/definitions/home'},
+            'work': {'$ref': '#/definitions/home'},
+        })
+        self.assertEqual(definitions['home'],
+                         hammer.to_json_schema(Phone()))
+        self.assertEqual(definitions['Friend'],
+                         hammer.to_json_schema(Friend()))
+        self.assertEqual(
+            definitions['Person']['properties']['friends']['items'],
+            {'$ref': '#/definitions/Friend'})
+        self.validate_schema(document)
+
+    def test_references_resolve(self):
+        document = bundle.bundle({'Person': Person(), 'Friends': Friends()})
+        schema = dict(document, **{'$ref': '#/definitions/Person'})
+        validator = Draft4Validator(schema)
+
+        self.assertTrue(validator.is_valid({
+            'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob', True]]}))
+        self.assertFalse(validator.is_valid({
+            'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob', 'yes']]}))
+
+    def test_definitions_match_converted_subschemas(self):
+        schema = OptionalContacts()
+        for draft_version in (3, 4):
+            for include_types in (True, False):
+                document = bundle.bundle({'Contacts': schema},
+                                         draft_version=draft_version,
+                                         include_types=include_types)
+                definitions = document['definitions']
+                properties = hammer.to_json_schema(
+                    schema, draft_version=draft_version,
+                    include_types=include_types)['properties']
+
+                self.assertEqual(sorted(definitions),
+                                 ['Contacts', 'friends', 'home'])
+                self.assertEqual(definitions['home'], properties['home'])
+                self.assertEqual(definitions['friends'],
+                                 properties['friends'])
+
+    def test_roots_are_only_referred_to_by_equal_properties(self):
+        document = bundle.bundle([('Phone', Phone()), ('Contact', Contact())],
+                                 draft_version=3)
+        contact = hammer.to_json_schema(Contact(), draft_version=3)
+        home = document['definitions']['Contact']['properties']['home']
+        self.assertEqual(document['definitions']['home'],
+                         contact['properties']['home'])
+        self.assertEqual(home, {'$ref': '#/definitions/home',
+                                'required': True})
+
+        schema = dict(document, **{'$ref': '#/definitions/Contact'})
+        self.assertFalse(Draft3Validator(schema).is_valid({}))
+
+        # In draft 4, the property is the same as the root.
+        document = bundle.bundle([('Phone', Phone()), ('Contact', Contact())])
+        self.assertEqual(
+            document['definitions']['Contact']['properties']['home'],
+            {'$ref': '#/definitions/Phone'})
+
+    def test_schemas_differing_in_what_adapters_read_are_kept_apart(self):
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.String)
+        def adapt_described_string(schema, **kwargs):
+            json_property = hammer.adapt_string(schema, **kwargs)
+            json_property['description'] = schema.description
+            return json_property
+
+        def make(description):
+            return colander.SchemaNode(
+                colander.Mapping(),
+                colander.SchemaNode(colander.String(), name='x',
+                                    description=description))
+
+        document = bundle.bundle([('A', make('first')), ('B', make('second'))],
+                                 registry=registry)
+        self.assertEqual(document['definitions']['B'],
+                         hammer.to_json_schema(make('second'),
+                                               registry=registry))
+
+    def test_equal_schemas_refer_to_the_first(self):
+        document = bundle.bundle([('A', Contact()), ('B', Contact())])
+        self.assertEqual(document['definitions']['B'],
+                         {'$ref': '#/definitions/A'})
+
+    def test_openapi_style_and_min_occurrences(self):
+        document = bundle.bundle({'Contact': Contact()}, style='openapi',
+                                 min_occurrences=3)
+        contact = document['components']['schemas']['Contact']
+        self.assertEqual(contact, hammer.to_json_schema(Contact()))
+
+        document = bundle.bundle({'Contact': Contact()}, style='openapi')
+        self.assertEqual(
+            document['components']['schemas']['Contact']['properties'][
+                'home'],
+            {'$ref': '#/components/schemas/home'})
+
+        with self.assertRaises(ValueError):
+            bundle.bundle({'Contact': Contact()}, style='swagger')
+
+    def test_write_bundle_matches_bundle(self):
+        schemas = {'Person': Person(), 'Contact': Contact()}
+        fp = io.StringIO()
+        bundle.write_bundle(schemas, fp, draft_version=3, chunk_size=16)
+        self.assertEqual(json.loads(fp.getvalue()),
+                         bundle.bundle(schemas, draft_version=3))
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import hammer
+from hammer import cli
+from hammer.test.test_hammer import HammerTestCase, Person
+
+SCHEMA_CLASSES = ['Friend', 'Friends', 'Person', 'Phone', 'UniqueThings']
+TEST_MODULE = 'hammer.test.test_hammer'
+
+
+class TestFindSchemaClasses(HammerTestCase):
+    def test_finds_schema_classes_defined_in_a_module(self):
+        paths = cli.find_schema_classes(TEST_MODULE)
+        self.assertEqual(sorted(paths), ['%s.%s' % (TEST_MODULE, name)
+                                         for name in SCHEMA_CLASSES])
+
+    def test_finds_a_single_class(self):
+        for target in (TEST_MODULE + '.Person', TEST_MODULE + ':Person'):
+            self.assertEqual(cli.find_schema_classes(target),
+                             [TEST_MODULE + '.Person'])
+
+    def test_rejects_things_that_are_not_schema_classes(self):
+        with self.assertRaises(ValueError):
+            cli.find_schema_classes(TEST_MODULE + '.HammerTestCase')
+        with self.assertRaises(ImportError):
+            cli.find_schema_classes('hammer.test.no_such_module')
+
+
+class TestMain(HammerTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_writes_one_file_per_schema_and_draft(self):
+        status = cli.main([TEST_MODULE, '-d', '3', '-d', '4', '-j', '2',
+                           '-o', self.output_dir])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(os.listdir(self.output_dir)),
+                         len(SCHEMA_CLASSES) * 2)
+
+        for draft_version in (3, 4):
+            filename = os.path.join(self.output_dir, '%s.Person.draft%d.json'
+                                    % (TEST_MODULE, draft_version))
+            with open(filename) as fp:
+                self.assertEqual(json.load(fp), hammer.to_json_schema(
+                    Person(), draft_version=draft_version))
+
+    def test_creates_the_output_directory(self):
+        output_dir = os.path.join(self.output_dir, 'schemas', 'json')
+        status = cli.main([TEST_MODULE + '.Person', '-o', output_dir])
+        self.assertEqual(status, 0)
+        self.assertEqual(os.listdir(output_dir),
+                         ['%s.Person.draft4.json' % TEST_MODULE])
+
+    def test_rejects_bad_jobs_and_output_directories(self):
+        import sys
+        filename = os.path.join(self.output_dir, 'file')
+        open(filename, 'w').close()
+
+        for argv in (['-j', '0'], ['-j', '-2'], ['-o', filename]):
+            stderr, sys.stderr = sys.stderr, io.StringIO()
+            try:
+                with self.assertRaises(SystemExit) as context:
+                    cli.main([TEST_MODULE + '.Person'] + argv)
+                message = sys.stderr.getvalue()
+            finally:
+                sys.stderr = stderr
+            self.assertEqual(context.exception.code, 2)
+            self.assertIn('hammer: error:', message)
+
+    def test_writes_a_bundle(self):
+        bundle = os.path.join(self.output_dir, 'bundle.json')
+        status = cli.main([TEST_MODULE + '.Person', TEST_MODULE + '.Phone',
+                           '--no-types', '-j', '1', '-b', bundle])
+        self.assertEqual(status, 0)
+
+        with open(bundle) as fp:
+            documents = json.load(fp)
+        self.assertEqual(sorted(documents), [TEST_MODULE + '.Person',
+                                             TEST_MODULE + '.Phone'])
+        self.assertEqual(documents[TEST_MODULE + '.Person']['draft4'],
+                         hammer.to_json_schema(Person(), include_types=False))
+
+    def test_reports_targets_that_cannot_be_loaded(self):
+        import sys
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            status = cli.main(['hammer.test.no_such_module'])
+            message = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(status, 1)
+        self.assertIn('no_such_module', message)
@@ -0,0 +1,172 @@
+import unittest
+
+import colander
+import hammer
+
+from hammer import validation
+from hammer.test.test_hammer import HammerTestCase
+from hammer.test.test_sample import Order
+
+try:
+    import numpy
+    from hammer import columnar
+except ImportError:
+    numpy = None
+
+
+class Orders(colander.SequenceSchema):
+    order = Order()
+
+
+class Text(str):
+    pass
+
+
+def records():
+    order = {
+        'quantity': 2, 'price': 1.5, 'paid': True,
+        'placed': '2020-01-01T00:00:00', 'due': '2020-01-02',
+        'code': 'AB-123', 'note': 'abc', 'email': 'a@example.com',
+        'size': 'M', 'lines': [[1, 'pen'], [2, 'ink']],
+    }
+    changes = [
+        {},
+        {'quantity': True},
+        {'quantity': 2 ** 60},
+        {'quantity': 11},
+        {'quantity': 3.0},
+        {'price': 2.0},
+        {'price': 1},
+        {'size': Text('S')},
+        {'size': 'XL'},
+        {'code': 'AB-12'},
+        {'note': 'a'},
+        {'lines': []},
+        {'lines': [[1]]},
+        {'lines': [[1, 'pen'], ['2', 'ink']]},
+        {'lines': [[1, 'pen', 'extra']]},
+        {'extra': 1},
+    ]
+    rows = [dict(order, **change) for change in changes]
+    missing = dict(order)
+    del missing['size']
+    return rows + [missing, 'not an order', None]
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestColumnarValidator(HammerTestCase):
+    def assertSameAsValidator(self, json_schema, rows, draft_version=4):
+        result = columnar.ColumnarValidator(
+            json_schema, draft_version=draft_version).validate(rows)
+        if json_schema.get('type') == 'array':
+            json_schema = json_schema['items']
+        validator = validation.Validator(json_schema,
+                                         draft_version=draft_version)
+        self.assertEqual(result.invalid.tolist(),
+                         [index for index, row in enumerate(rows)
+                          if not validator.is_valid(row)])
+        return result
+
+    def test_accepts_what_the_validator_accepts(self):
+        rows = records()
+        result = self.assertSameAsValidator(
+            hammer.to_json_schema(Orders()), rows)
+        self.assertFalse(result.valid)
+        self.assertEqual(result.errors[('quantity',)].tolist(), [1, 2, 3])
+        self.assertEqual(result.errors[('price',)].tolist(), [5, 6])
+        self.assertEqual(result.errors[('size',)].tolist(), [7, 8])
+        self.assertEqual(result.errors[('lines', None)].tolist(), [12, 14])
+        self.assertEqual(result.errors[('lines', None, 0)].tolist(), [13])
+        self.assertEqual(result.errors[()].tolist(), [16, 17, 18])
+
+        self.assertSameAsValidator(
+            hammer.to_json_schema(Orders(), draft_version=3), rows,
+            draft_version=3)
+
+    def test_closed_objects_and_fallback(self):
+        json_schema = {
+            'type': 'object',
+            'properties': {
+                'tags': {'type': 'array', 'uniqueItems': True},
+                'point': {'type': 'array', 'items': [{'type': 'integer'}],
+                          'additionalItems': False},
+            },
+            'required': ['tags'],
+            'additionalProperties': False,
+        }
+        rows = [
+            {'tags': [1, 2], 'point': [1]},
+            {'tags': [1, 1]},
+            {'tags': [], 'point': [1.5]},
+            {'tags': [], 'point': [1, 2]},
+            {'tags': [], 'other': 1},
+            {'point': [1]},
+        ]
+        validator = columnar.ColumnarValidator(json_schema)
+        self.assertIsInstance(validator.column.properties[0][1],
+                              columnar._Fallback)
+        result = self.assertSameAsValidator(json_schema, rows)
+        self.assertEqual(result.invalid.tolist(), [1, 2, 3, 4, 5])
+
+    def test_integral_floats_are_not_integers(self):
+        json_schema = {'type': 'object',
+                       'properties': {'n': {'type': 'integer'}}}
+        rows = [{'n': 1}, {'n': 1.0}, {'n': 1.5}, {'n': True}]
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            result = self.assertSameAsValidator(json_schema, rows,
+                                                draft_version=draft_version)
+            self.assertEqual(result.errors[('n',)].tolist(), [1, 2, 3])
+
+        validator = columnar.ColumnarValidator(json_schema)
+        result = validator.validate_columns({'n': numpy.array([1.0, 2.0])})
+        self.assertEqual(result.errors[('n',)].tolist(), [0, 1])
+        result = validator.validate_columns({'n': numpy.array([1, 2])})
+        self.assertTrue(result.valid)
+
+    def test_one_sided_ranges(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.Int(), name='low',
+                                validator=colander.Range(max=10)),
+            colander.SchemaNode(colander.Float(), name='high',
+                                validator=colander.Range(min=0)))
+        json_schema = hammer.to_json_schema(schema)
+        rows = [
+            {'low': -5, 'high': 1000.5},
+            {'low': 11, 'high': 1.5},
+            {'low': 1, 'high': -0.5},
+        ]
+        validator = columnar.ColumnarValidator(json_schema)
+        for _, column in validator.column.properties:
+            self.assertIsInstance(column, columnar._Numbers)
+        result = self.assertSameAsValidator(json_schema, rows)
+        self.assertEqual(result.errors[('low',)].tolist(), [1])
+        self.assertEqual(result.errors[('high',)].tolist(), [2])
+
+    def test_validate_columns(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            *[Order()[name].clone()
+              for name in ('quantity', 'price', 'paid', 'size', 'note')])
+        validator = columnar.compile_columnar_validator(schema)
+        columns = {
+            'quantity': numpy.array([1, 10, 11, 5]),
+            'price': numpy.array([0.5, 1.5, 2.0, 3.5]),
+            'paid': numpy.array([True, False, True, False]),
+            'size': numpy.array(['S', 'M', 'XL', 'L']),
+            'note': ['ab', 'abcdef', 'abc', 3],
+        }
+        result = validator.validate_columns(columns)
+        self.assertEqual(result.invalid.tolist(), [1, 2, 3])
+        self.assertEqual(result.errors[('quantity',)].tolist(), [2])
+        self.assertEqual(result.errors[('price',)].tolist(), [2, 3])
+        self.assertEqual(result.errors[('size',)].tolist(), [2])
+        self.assertEqual(result.errors[('note',)].tolist(), [1, 3])
+
+        del columns['size']
+        result = validator.validate_columns(columns)
+        self.assertEqual(result.errors[()].tolist(), [0, 1, 2, 3])
+
+        columns['size'] = ['S']
+        with self.assertRaises(ValueError):
+            validator.validate_columns(columns)
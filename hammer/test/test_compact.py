@@ -0,0 +1,131 @@
+import copy
+import json
+
+import colander
+import hammer
+
+from jsonschema import Draft3Validator, Draft4Validator
+from hammer import compact
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+INSTANCES = [
+    {'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob', True]]},
+    {'name': 'Ann', 'age': 300, 'friends': []},
+    {'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob']]},
+    {'name': 'Ann', 'friends': [[1, 'Bob', 'yes']]},
+    {'name': 1, 'age': 30, 'friends': [[10000, 'Bob', True]]},
+    [],
+]
+
+
+class TestCompact(HammerTestCase):
+    def assertAcceptsTheSame(self, original, compacted, validator, instances):
+        for instance in instances:
+            self.assertEqual(validator(compacted).is_valid(instance),
+                             validator(original).is_valid(instance),
+                             instance)
+
+    def test_drops_keywords_that_do_not_validate(self):
+        original = hammer.to_json_schema(Person())
+        unchanged = copy.deepcopy(original)
+        compacted = compact.compact(original)
+
+        self.assertEqual(original, unchanged)
+        self.assertEqual(compacted['properties']['name'], {'type': 'string'})
+        self.assertNotIn('required',
+                         compacted['properties']['friends']['items'])
+        self.assertEqual(compacted['required'], ['name', 'age', 'friends'])
+        self.validate_schema(compacted)
+        self.assertAcceptsTheSame(original, compacted, Draft4Validator,
+                                  INSTANCES)
+
+    def test_draft_3(self):
+        original = hammer.to_json_schema(Person(), draft_version=3)
+        compacted = compact.compact(original, draft_version=3)
+        self.assertEqual(compacted['properties']['name'],
+                         {'type': 'string', 'required': True})
+        self.assertAcceptsTheSame(original, compacted, Draft3Validator,
+                                  INSTANCES)
+
+    def test_drops_defaults_and_types_implied_by_enums(self):
+        original = {
+            'type': 'object',
+            'properties': {
+                'kind': {'type': 'string', 'enum': ['a', 'b']},
+                'size': {'type': 'number', 'enum': [1, 'a']},
+                'tags': {'type': 'array', 'minItems': 0,
+                         'uniqueItems': False, 'optional': True},
+            },
+            'additionalProperties': True,
+            'required': [],
+        }
+        self.assertEqual(compact.compact(original), {
+            'type': 'object',
+            'properties': {
+                'kind': {'enum': ['a', 'b']},
+                'size': {'type': 'number', 'enum': [1, 'a']},
+                'tags': {'type': 'array'},
+            },
+        })
+
+    def test_merges_all_of(self):
+        original = {
+            'type': 'string',
+            'minLength': 1,
+            'allOf': [{'minLength': 1, 'pattern': 'a'}, {'pattern': 'b'},
+                      {'minLength': 1}],
+        }
+        compacted = compact.compact(original)
+        self.assertEqual(compacted, {
+            'type': 'string',
+            'minLength': 1,
+            'pattern': 'a',
+            'allOf': [{'pattern': 'b'}],
+        })
+        self.assertAcceptsTheSame(original, compacted, Draft4Validator,
+                                  ['', 'a', 'b', 'ab', 'ba', 1])
+
+        original = dict(original)
+        original['extends'] = original.pop('allOf')
+        compacted = compact.compact(original, draft_version=3)
+        self.assertEqual(compacted['extends'], {'pattern': 'b'})
+
+    def test_keeps_keywords_that_interact(self):
+        original = {
+            'type': 'object',
+            'properties': {'a': {}},
+            'allOf': [{'properties': {'a': {}},
+                       'additionalProperties': False},
+                      {'$ref': '#/definitions/b'}],
+            'definitions': {'b': {'maxProperties': 1}},
+        }
+        self.assertEqual(compact.compact(original), original)
+
+    def test_read_only_values(self):
+        registry = hammer.default_registry.copy()
+        registry.register(colander.OneOf, hammer.LargeEnumAdapter(min_size=2))
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='kind',
+                                validator=colander.OneOf(['a', 'b'])))
+        original = hammer.to_json_schema(schema, registry=registry)
+        compacted = compact.compact(original)
+        self.assertEqual(compacted['properties']['kind'],
+                         {'enum': ['a', 'b']})
+
+    def test_savings(self):
+        original = hammer.to_json_schema(Person())
+        savings = compact.savings(original)
+        self.assertEqual(savings.original,
+                         len(hammer.to_json_schema_bytes(Person()).data))
+        self.assertEqual(savings.removed,
+                         {'format': 2, 'required': 2})
+        self.assertEqual(savings.saved, savings.original - savings.compacted)
+        self.assertTrue(0 < savings.ratio < 1)
+        self.assertIn('saved', str(savings))
+
+        serialized = compact.to_compact_bytes(Person())
+        self.assertEqual(len(serialized.data), savings.compacted)
+        self.assertEqual(json.loads(serialized.data.decode('utf-8')),
+                         compact.compact(original))
@@ -0,0 +1,79 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+
+import colander
+import hammer
+
+from hammer import cli, freeze
+from hammer.test.test_hammer import HammerTestCase, Person, Phone
+
+
+def import_path(path):
+    spec = importlib.util.spec_from_file_location('frozen_schemas', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestFreeze(HammerTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.schemas = {'Person': Person(), 'Phone': Phone()}
+        self.documents = freeze.convert(self.schemas, draft_versions=(3, 4))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_module_builds_the_converted_documents(self):
+        path = os.path.join(self.directory, 'frozen_schemas.py')
+        freeze.write_module(self.documents, path)
+
+        with open(path) as fp:
+            source = fp.read()
+        self.assertNotIn('colander', source)
+        self.assertNotIn('hammer', source.split('"""')[2])
+
+        module = import_path(path)
+        self.assertEqual(module.names(), ['Person', 'Phone'])
+        for draft_version in (3, 4):
+            self.assertEqual(module.get_schema('Person', draft_version),
+                             hammer.to_json_schema(
+                                 Person(), draft_version=draft_version))
+
+        document = module.get_schema('Phone')
+        document['properties'].clear()
+        self.assertEqual(module.get_schema('Phone'),
+                         hammer.to_json_schema(Phone()))
+
+    def test_artifact_round_trips(self):
+        path = os.path.join(self.directory, 'schemas.json')
+        freeze.write_artifact(self.documents, path)
+        self.assertEqual(freeze.load_artifact(path), self.documents)
+
+    def test_staleness(self):
+        for filename in ('frozen_schemas.py', 'schemas.json'):
+            path = os.path.join(self.directory, filename)
+            documents = freeze.convert(self.schemas, use_definitions=True)
+            if filename.endswith('.py'):
+                freeze.write_module(documents, path, {'use_definitions': True})
+            else:
+                freeze.write_artifact(documents, path,
+                                      {'use_definitions': True})
+
+            self.assertFalse(freeze.is_stale(path, self.schemas))
+
+            changed = dict(self.schemas, Phone=Phone().clone())
+            changed['Phone']['number'].validator = colander.Length(1, 20)
+            self.assertTrue(freeze.is_stale(path, changed))
+            self.assertTrue(freeze.is_stale(path, {'Person': Person()}))
+
+    def test_cli_freezes_converted_documents(self):
+        path = os.path.join(self.directory, 'frozen_schemas.py')
+        status = cli.main(['hammer.test.test_hammer.Phone', '-j', '1',
+                           '-o', self.directory, '--freeze', path])
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            import_path(path).get_schema('hammer.test.test_hammer.Phone'),
+            hammer.to_json_schema(Phone()))
@@ -1,3 +1,7 @@
+import json
+import sys
+import threading
+
 import colander
 import hammer
 
@@ -376,3 +380,930 @@ class TestDropConvertsToOptional(HammerTestCase):
         self.assertTrue(field['optional'])
 
         self.validate_schema(json_schema)
+
+
+class TestSchemaCache(HammerTestCase):
+    def test_structurally_identical_schemas_share_an_entry(self):
+        cache = hammer.SchemaCache()
+        first = hammer.to_json_schema(Person(), cache=cache)
+        second = hammer.to_json_schema(Person(), cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.info(), hammer.CacheInfo(1, 1, 128, 1))
+        self.validate_schema(first)
+
+    def test_options_are_part_of_the_key(self):
+        cache = hammer.SchemaCache()
+        cache.get(Person(), draft_version=3)
+        cache.get(Person(), draft_version=4)
+        cache.get(Person(), include_types=False)
+        self.assertEqual(cache.info().misses, 3)
+        self.assertEqual(len(cache), 3)
+
+    def test_different_validator_state_misses(self):
+        class Bounded(colander.Schema):
+            number = colander.SchemaNode(colander.Int(),
+                                         validator=colander.Range(0, 5))
+
+        cache = hammer.SchemaCache()
+        cache.get(Bounded())
+        schema = Bounded()
+        schema['number'].validator = colander.Range(0, 10)
+        json_schema = cache.get(schema)
+        self.assertEqual(json_schema['properties']['number']['maximum'], 10)
+        self.assertEqual(cache.info().misses, 2)
+
+    def test_results_cannot_be_mutated_into_the_cache(self):
+        cache = hammer.SchemaCache()
+        json_schema = cache.get(Phone())
+        json_schema['properties']['location']['enum'].append('mobile')
+        del json_schema['properties']['number']
+        self.assertEqual(cache.get(Phone()), hammer.to_json_schema(Phone()))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = hammer.SchemaCache(maxsize=2)
+        cache.get(Phone())
+        cache.get(Friend())
+        cache.get(Phone())
+        cache.get(Friends())
+        self.assertEqual(len(cache), 2)
+        cache.get(Phone())
+        self.assertEqual(cache.info().hits, 2)
+        cache.get(Friend())
+        self.assertEqual(cache.info().misses, 4)
+
+    def test_invalidate(self):
+        cache = hammer.SchemaCache()
+        cache.get(Phone())
+        cache.get(Phone(), draft_version=3)
+        cache.get(Friend())
+        cache.invalidate(Phone())
+        self.assertEqual(len(cache), 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_titles_descriptions_and_types_are_part_of_the_key(self):
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.String)
+        def adapt_described_string(schema, **kwargs):
+            json_property = hammer.adapt_string(schema, **kwargs)
+            json_property['description'] = schema.description
+            return json_property
+
+        def make(**kwargs):
+            return colander.SchemaNode(
+                colander.Mapping(),
+                colander.SchemaNode(colander.String(), name='x', **kwargs))
+
+        cache = hammer.SchemaCache()
+        first = make(description='first')
+        for other in (make(description='second'), make(title='Other'),
+                      colander.SchemaNode(
+                          colander.Mapping(unknown='raise'),
+                          colander.SchemaNode(colander.String(), name='x',
+                                              description='first'))):
+            self.assertNotEqual(hammer.fingerprint(other),
+                                hammer.fingerprint(first))
+            self.assertFalse(hammer.compile(first).matches(other))
+
+        self.assertEqual(hammer.to_json_schema(
+            first, cache=cache, registry=registry)['properties']['x'][
+                'description'], 'first')
+        self.assertEqual(hammer.to_json_schema(
+            make(description='second'), cache=cache, registry=registry)[
+                'properties']['x']['description'], 'second')
+        # Titles made from the name are covered by the name.
+        self.assertEqual(hammer.fingerprint(make()), hammer.fingerprint(make()))
+
+    def test_registering_an_adapter_invalidates_caches(self):
+        registry = hammer.default_registry.copy()
+        cache = hammer.SchemaCache()
+        cache.get(Phone(), registry=registry)
+        registry.register(colander.Bool, hammer.adapt_bool)
+        self.assertEqual(len(cache), 0)
+
+
+class TestCompile(HammerTestCase):
+    def test_plan_emits_the_same_document_as_to_json_schema(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for include_types in (True, False):
+                plan = hammer.compile(Person(), draft_version=draft_version,
+                                      include_types=include_types)
+                expected = hammer.to_json_schema(
+                    Person(), draft_version=draft_version,
+                    include_types=include_types)
+                self.assertEqual(plan.emit(), expected)
+
+    def test_each_emitted_document_is_new(self):
+        plan = hammer.compile(Phone())
+        first = plan()
+        first['properties']['location']['enum'].append('mobile')
+        self.assertEqual(plan(), hammer.to_json_schema(Phone()))
+        self.assertIsNot(plan(), plan())
+
+    def test_non_literal_values_are_preserved(self):
+        import decimal
+
+        class Price(colander.Schema):
+            amount = colander.SchemaNode(
+                colander.Decimal(),
+                validator=colander.Range(min=decimal.Decimal('0.01')))
+
+        plan = hammer.compile(Price())
+        field = plan()['properties']['amount']
+        self.assertEqual(field['minimum'], decimal.Decimal('0.01'))
+        self.assertIsInstance(field['minimum'], decimal.Decimal)
+
+    def test_deeply_nested_documents_are_emitted(self):
+        schema = colander.SchemaNode(colander.Mapping(), name='root')
+        node = schema
+        for depth in range(60):
+            child = colander.SchemaNode(colander.Mapping(),
+                                        name='level%d' % depth)
+            node.add(child)
+            node = child
+
+        plan = hammer.compile(schema)
+        self.assertEqual(plan(), hammer.to_json_schema(schema))
+
+    def test_plan_matches_schemas_of_the_same_shape(self):
+        plan = hammer.compile(Person())
+        self.assertTrue(plan.matches(Person()))
+        self.assertFalse(plan.matches(Phone()))
+
+    def test_plan_recompiles_when_adapters_change(self):
+        class Flag(colander.Boolean):
+            pass
+
+        class Flagged(colander.Schema):
+            flag = colander.SchemaNode(Flag())
+
+        registry = hammer.default_registry.copy()
+        registry.register(Flag, hammer.adapt_bool)
+        plan = hammer.compile(Flagged(), registry=registry)
+        self.assertEqual(plan()['properties']['flag']['type'], 'boolean')
+
+        registry.register(Flag, hammer.adapt_string)
+        self.assertEqual(plan()['properties']['flag']['type'], 'string')
+
+
+class TestExtractDefinitions(HammerTestCase):
+    def test_repeated_subschemas_become_definitions(self):
+        class Contacts(colander.Schema):
+            home = Phone()
+            work = Phone()
+            mobile = Phone()
+            name = colander.SchemaNode(colander.String())
+
+        json_schema = hammer.to_json_schema(Contacts(), use_definitions=True)
+        phone = hammer.to_json_schema(Phone())
+        self.assertEqual(json_schema['definitions'], {'home': phone})
+        for name in ('home', 'work', 'mobile'):
+            self.assertEqual(json_schema['properties'][name],
+                             {'$ref': '#/definitions/home'})
+        self.assertEqual(json_schema['properties']['name']['type'], 'string')
+        self.validate_schema(json_schema)
+
+    def test_subschemas_occurring_once_are_not_extracted(self):
+        json_schema = hammer.to_json_schema(Person(), use_definitions=True)
+        self.assertEqual(json_schema, hammer.to_json_schema(Person()))
+
+    def test_nested_repeats_are_extracted_once(self):
+        class Household(colander.Schema):
+            first = Person()
+            second = Person()
+
+        json_schema = hammer.to_json_schema(Household(), use_definitions=True)
+        # The friends sequence only repeats inside Person, so it is inlined
+        # into the Person definition rather than given its own definition.
+        self.assertEqual(list(json_schema['definitions']), ['first'])
+        self.assertEqual(json_schema['definitions']['first'],
+                         hammer.to_json_schema(Person()))
+        self.validate_schema(json_schema)
+
+    def test_input_document_is_not_modified(self):
+        class Contacts(colander.Schema):
+            home = Phone()
+            work = Phone()
+
+        original = hammer.to_json_schema(Contacts())
+        expected = hammer.to_json_schema(Contacts())
+        hammer.extract_definitions(original)
+        self.assertEqual(original, expected)
+
+
+class TestStreaming(HammerTestCase):
+    def rebuild(self, events):
+        """
+        Rebuild a document from ``events``.
+        """
+        stack = [[]]
+        keys = []
+        for event, value in events:
+            if event == 'key':
+                keys.append(value)
+            elif event in ('start_object', 'start_array'):
+                stack.append({} if event == 'start_object' else [])
+            else:
+                if event in ('end_object', 'end_array'):
+                    value = stack.pop()
+                parent = stack[-1]
+                if isinstance(parent, dict):
+                    parent[keys.pop()] = value
+                else:
+                    parent.append(value)
+        return stack[0][0]
+
+    def test_events_describe_the_json_schema(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for schema in (Person(), Phone(), Friends(), UniqueThings()):
+                events = hammer.to_json_schema_events(
+                    schema, draft_version=draft_version, include_types=False)
+                self.assertEqual(
+                    self.rebuild(events),
+                    hammer.to_json_schema(schema, draft_version=draft_version,
+                                          include_types=False))
+
+    def test_events_for_a_tuple(self):
+        events = list(hammer.to_json_schema_events(Friend()))
+        self.assertEqual(events[:5], [
+            ('start_object', None),
+            ('key', 'type'),
+            ('value', 'array'),
+            ('key', 'minItems'),
+            ('value', 3),
+        ])
+        self.assertEqual(events[-1], ('end_object', None))
+
+    def test_children_are_converted_as_they_are_reached(self):
+        events = hammer.to_json_schema_events(Person())
+        self.assertEqual(next(events), ('start_object', None))
+
+        class Unconvertible(colander.SchemaType):
+            pass
+
+        schema = Person().clone()
+        schema['friends'].children[0].add(
+            colander.SchemaNode(Unconvertible(), name='oops'))
+        events = hammer.to_json_schema_events(schema)
+        seen = []
+        with self.assertRaises(hammer.Invalid):
+            for event in events:
+                seen.append(event)
+        self.assertIn(('key', 'friends'), seen)
+
+    def test_write_json_schema_matches_json_dumps(self):
+        import io
+        import json
+
+        for schema in (Person(), Phone(), Friends(), UniqueThings()):
+            fp = io.StringIO()
+            hammer.write_json_schema(schema, fp, chunk_size=16)
+            self.assertEqual(fp.getvalue(),
+                             json.dumps(hammer.to_json_schema(schema)))
+
+
+class TestLazySchema(HammerTestCase):
+    def convert(self, read):
+        hook = CountingHook()
+        hammer.add_hook(hook)
+        try:
+            result = read()
+        finally:
+            hammer.remove_hook(hook)
+        return result, hook.nodes
+
+    def test_children_are_converted_when_read(self):
+        json_schema, nodes = self.convert(
+            lambda: hammer.to_lazy_json_schema(Person()))
+        self.assertEqual(nodes, ['', 'name', 'age'])
+        self.assertEqual(list(json_schema['properties']),
+                         ['name', 'age', 'friends'])
+
+        friends, nodes = self.convert(
+            lambda: json_schema['properties']['friends'])
+        self.assertIsInstance(friends, hammer.LazySchema)
+        self.assertEqual(nodes, ['friends'])
+
+        friend, nodes = self.convert(lambda: friends['items']['items'])
+        self.assertIsInstance(friend, hammer.LazyArray)
+        self.assertEqual(nodes, ['friend', 'rank', 'name', 'still_friends'])
+        self.assertEqual(friend[0], {'type': 'number', 'minimum': 0,
+                                     'maximum': 9999})
+
+        _, nodes = self.convert(
+            lambda: json_schema['properties']['friends']['items'])
+        self.assertEqual(nodes, [])
+
+    def test_serializes_to_the_full_document(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for schema in (Person(), Phone(), Friends(), make_deep_schema(9)):
+                expected = hammer.to_json_schema(
+                    schema, draft_version=draft_version)
+                json_schema = hammer.to_lazy_json_schema(
+                    schema, draft_version=draft_version)
+                self.assertEqual(json_schema.to_dict(), expected)
+
+                json_schema = hammer.to_lazy_json_schema(
+                    schema, draft_version=draft_version)
+                json_schema.get('properties', {}).get('friends')
+                self.assertEqual(json_schema, expected)
+                self.assertEqual(
+                    ''.join(hammer.iter_json_text(json_schema.events())),
+                    json.dumps(expected))
+                self.assertEqual(json.dumps(json_schema.to_dict()),
+                                 json.dumps(expected))
+
+    def test_does_not_change_the_adapters_output(self):
+        json_schema = hammer.to_lazy_json_schema(Person())
+        json_schema['properties']['friends']['items']
+        self.assertIsInstance(json_schema._data['properties']['friends'],
+                              hammer.Deferred)
+        self.assertIs(type(json_schema.to_dict()['properties']), dict)
+
+
+def make_deep_schema(depth):
+    """
+    Return a schema of mappings nested ``depth`` levels deep, alternating with
+    sequences, with a string at the bottom.
+    """
+    schema = node = colander.SchemaNode(colander.Mapping(), name='root')
+    for level in range(depth):
+        if level % 2:
+            child = colander.SchemaNode(colander.Sequence(),
+                                        name='level%d' % level)
+        else:
+            child = colander.SchemaNode(colander.Mapping(),
+                                        name='level%d' % level)
+        node.add(child)
+        node = child
+    node.add(colander.SchemaNode(colander.String(), name='leaf',
+                                 validator=colander.Length(1, 5)))
+    return schema
+
+
+class TestIterativeTraversal(HammerTestCase):
+    def convert_recursively(self, schema, **kwargs):
+        adapter = hammer.get_schema_adapter(schema, **kwargs)
+        return adapter(schema)
+
+    def test_output_is_identical_to_recursive_conversion(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for schema in (Person(), Phone(), Friends(), make_deep_schema(9)):
+                json_schema = hammer.to_json_schema(
+                    schema, draft_version=draft_version)
+                expected = self.convert_recursively(
+                    schema, draft_version=draft_version, include_types=True)
+                self.assertEqual(json_schema, expected)
+                self.assertEqual(json.dumps(json_schema),
+                                 json.dumps(expected))
+
+    def test_converts_schemas_deeper_than_the_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        schema = make_deep_schema(depth)
+
+        with self.assertRaises(RecursionError):
+            self.convert_recursively(schema, draft_version=4,
+                                     include_types=True)
+
+        # Even levels and the root are mappings, which contain their child as
+        # a property; odd levels are sequences, which contain it as "items".
+        json_property = hammer.to_json_schema(schema)
+        for level in range(depth):
+            if level == 0 or level % 2 == 1:
+                json_property = json_property['properties']['level%d' % level]
+            else:
+                json_property = json_property['items']
+        self.assertEqual(json_property['items']['maxLength'], 5)
+        self.assertEqual(len(hammer.fingerprint(schema)), 10)
+
+    def test_options_handle_schemas_deeper_than_the_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        schema = make_deep_schema(depth)
+
+        # Deep documents cannot be compared with ==, which recurses.
+        def text(json_schema):
+            return ''.join(hammer.iter_json_text(
+                hammer._json_events(json_schema)))
+
+        expected = text(hammer.to_json_schema(schema))
+
+        cache = hammer.SchemaCache()
+        self.assertEqual(text(hammer.to_json_schema(schema, cache=cache)),
+                         expected)
+        self.assertEqual(text(hammer.to_json_schema(make_deep_schema(depth),
+                                                    cache=cache)),
+                         expected)
+        self.assertEqual(cache.info().hits, 1)
+
+        self.assertEqual(text(hammer.compile(schema)()), expected)
+
+        # No two levels are equal, so nothing is moved to definitions.
+        self.assertEqual(text(hammer.to_json_schema(schema,
+                                                    use_definitions=True)),
+                         expected)
+
+
+class TestInheritedAdapters(HammerTestCase):
+    def test_subclasses_use_the_adapter_of_their_base_class(self):
+        class Name(colander.String):
+            pass
+
+        class Bounded(colander.Range):
+            pass
+
+        class Attributes(colander.Mapping):
+            pass
+
+        class Record(colander.Schema):
+            name = colander.SchemaNode(Name(), validator=Bounded(1, 2))
+            attributes = colander.SchemaNode(Attributes())
+
+        json_schema = hammer.to_json_schema(Record())
+        self.assertEqual(json_schema['properties']['name'], {
+            'type': 'string',
+            'format': 'alphanumeric',
+            'minimum': 1,
+            'maximum': 2,
+        })
+        self.assertEqual(json_schema['properties']['attributes']['type'],
+                         'object')
+        self.validate_schema(json_schema)
+
+    def test_most_specific_adapter_wins(self):
+        class Code(colander.String):
+            pass
+
+        class Record(colander.Schema):
+            code = colander.SchemaNode(Code())
+
+        self.assertEqual(
+            hammer.to_json_schema(Record())['properties']['code']['type'],
+            'string')
+
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(Code)
+        def adapt_code(schema, **kwargs):
+            return {'type': 'integer'}
+
+        self.assertEqual(
+            hammer.to_json_schema(Record(), registry=registry)[
+                'properties']['code']['type'],
+            'integer')
+
+    def test_unregistered_types_are_still_invalid(self):
+        class Unconvertible(colander.SchemaType):
+            pass
+
+        class Record(colander.Schema):
+            thing = colander.SchemaNode(Unconvertible())
+
+        with self.assertRaises(hammer.Invalid):
+            hammer.to_json_schema(Record())
+
+
+class CountingHook(hammer.Hook):
+    def __init__(self):
+        self.nodes = []
+
+    def enter(self, kind, target, adapter):
+        if kind == 'schema':
+            self.nodes.append(target.name)
+
+
+class TestIncrementalConverter(HammerTestCase):
+    def convert(self, converter):
+        hook = CountingHook()
+        hammer.add_hook(hook)
+        try:
+            json_schema = converter()
+        finally:
+            hammer.remove_hook(hook)
+        self.assertEqual(json_schema, hammer.to_json_schema(converter.schema))
+        return hook.nodes
+
+    def test_unchanged_schema_is_not_converted_again(self):
+        converter = hammer.IncrementalConverter(Person().clone())
+        self.assertEqual(len(self.convert(converter)), 8)
+        self.assertEqual(self.convert(converter), [])
+
+    def test_only_the_changed_path_is_converted_again(self):
+        schema = Person().clone()
+        schema.add(Phone(name='phone'))
+        converter = hammer.IncrementalConverter(schema)
+        self.convert(converter)
+
+        schema['phone'].add(colander.SchemaNode(colander.String(),
+                                                name='extension'))
+        # The root, its leaves, the phone mapping and its children, but not
+        # the friends sequence.
+        self.assertEqual(sorted(self.convert(converter)), [
+            '', 'age', 'extension', 'location', 'name', 'number', 'phone'])
+
+        del schema['phone']['extension']
+        self.assertNotIn('friends', self.convert(converter))
+        self.assertNotIn(
+            'extension',
+            converter()['properties']['phone']['properties'])
+
+    def test_insertion_and_moves(self):
+        schema = make_deep_schema(6)
+        converter = hammer.IncrementalConverter(schema)
+        self.convert(converter)
+
+        schema.insert(0, colander.SchemaNode(colander.Int(), name='first'))
+        self.assertEqual(sorted(self.convert(converter)),
+                         ['first', 'root'])
+
+        level = schema.children[1]
+        moved = level.children.pop()
+        schema.add(moved)
+        self.convert(converter)
+        level.add(colander.SchemaNode(colander.Int(), name='last'))
+        self.convert(converter)
+
+    def test_other_changes_need_invalidating(self):
+        schema = Person().clone()
+        converter = hammer.IncrementalConverter(schema)
+        converter()
+
+        schema['friends']['friend']['rank'].validator = colander.Range(1, 2)
+        converter.invalidate(schema['friends']['friend']['rank'])
+        self.convert(converter)
+
+    def test_adapter_changes_convert_everything_again(self):
+        class Code(colander.String):
+            pass
+
+        registry = hammer.default_registry.copy()
+        schema = Person().clone()
+        converter = hammer.IncrementalConverter(schema, registry=registry)
+        converter()
+        registry.register(Code, hammer.adapt_string)
+        self.assertEqual(len(self.convert(converter)), 8)
+
+    def test_tracked_nodes_still_copy_to_plain_lists(self):
+        schema = Person().clone()
+        hammer.IncrementalConverter(schema)()
+        self.assertIs(schema.clone().children.__class__, list)
+        self.assertEqual(hammer.to_json_schema(schema.clone()),
+                         hammer.to_json_schema(schema))
+
+
+class TestSerializedSchema(HammerTestCase):
+    def canonical(self, schema, **kwargs):
+        return json.dumps(hammer.to_json_schema(schema, **kwargs),
+                          sort_keys=True, separators=(',', ':'),
+                          default=float).encode('utf-8')
+
+    def test_bytes_are_canonical_json(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for cache in (None, hammer.SchemaCache()):
+                serialized = hammer.to_json_schema_bytes(
+                    Person(), draft_version=draft_version, cache=cache)
+                self.assertEqual(serialized.data, self.canonical(
+                    Person(), draft_version=draft_version))
+                self.assertEqual(len(serialized.digest), 64)
+
+        serialized = hammer.to_json_schema_bytes(
+            Person(), cache=None, use_definitions=True)
+        self.assertEqual(serialized.data,
+                         self.canonical(Person(), use_definitions=True))
+
+    def test_serialized_documents_are_cached(self):
+        cache = hammer.SchemaCache()
+        first = hammer.to_json_schema_bytes(Person(), cache=cache)
+        second = hammer.to_json_schema_bytes(Person().clone(), cache=cache)
+        self.assertIs(first, second)
+        self.assertEqual(cache.info().hits, 1)
+
+        cache.invalidate(Person())
+        self.assertIsNot(hammer.to_json_schema_bytes(Person(), cache=cache),
+                         first)
+
+    def test_shared_subtrees_are_serialized_once(self):
+        cache = hammer.SchemaCache()
+        hammer.to_json_schema_bytes(Person(), cache=cache)
+
+        schema = colander.SchemaNode(colander.Mapping())
+        schema.add(Friends(name='friends'))
+        schema.add(colander.SchemaNode(colander.Int(), name='count'))
+        converted = []
+
+        class Hook(hammer.Hook):
+            def enter(self, kind, target, adapter):
+                converted.append(target.name)
+
+        hook = Hook()
+        hammer.add_hook(hook)
+        try:
+            serialized = hammer.to_json_schema_bytes(schema, cache=cache)
+        finally:
+            hammer.remove_hook(hook)
+
+        self.assertEqual(converted, ['', 'count'])
+        self.assertEqual(serialized.data, self.canonical(schema))
+
+    def test_deep_schemas(self):
+        schema = make_deep_schema(sys.getrecursionlimit() * 2)
+        cache = hammer.SchemaCache()
+        serialized = hammer.to_json_schema_bytes(schema, cache=cache)
+        self.assertEqual(serialized,
+                         hammer.to_json_schema_bytes(schema, cache=None))
+        self.assertIs(serialized,
+                      hammer.to_json_schema_bytes(schema, cache=cache))
+
+    def test_conditional_get(self):
+        serialized = hammer.to_json_schema_bytes(Person())
+        headers = dict(serialized.headers())
+        self.assertEqual(headers['ETag'], '"%s"' % serialized.digest)
+        self.assertEqual(headers['Content-Length'],
+                         str(len(serialized.data)))
+
+        self.assertTrue(serialized.not_modified(serialized.etag))
+        self.assertTrue(serialized.not_modified(
+            '"other", W/%s' % serialized.etag))
+        self.assertTrue(serialized.not_modified('*'))
+        self.assertFalse(serialized.not_modified('"other"'))
+        self.assertFalse(serialized.not_modified(None))
+
+
+class TestRegistry(HammerTestCase):
+    def make_registry(self):
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.String)
+        def adapt_upper_string(schema, **kwargs):
+            return {'type': 'string', 'pattern': '^[A-Z]*$'}
+
+        return registry
+
+    def test_registries_are_independent(self):
+        registry = self.make_registry()
+        name = hammer.to_json_schema(
+            Person(), registry=registry)['properties']['name']
+        self.assertEqual(name['pattern'], '^[A-Z]*$')
+        self.assertNotIn('pattern', hammer.to_json_schema(
+            Person())['properties']['name'])
+        # Nested nodes use the registry too.
+        friend = hammer.to_json_schema(
+            Person(), registry=registry)['properties']['friends']['items']
+        self.assertEqual(friend['items'][1]['pattern'], '^[A-Z]*$')
+
+    def test_empty_registry_converts_nothing(self):
+        self.assertIsNone(hammer.get_schema_adapter(
+            Person(), draft_version=4, registry=hammer.Registry()))
+
+    def test_registering_publishes_a_new_snapshot(self):
+        registry = hammer.default_registry.copy()
+        snapshot = registry.snapshot()
+        registry.register(colander.String, hammer.adapt_int)
+        self.assertIsNot(registry.snapshot(), snapshot)
+        self.assertIs(snapshot.find_schema_adapter(
+            colander.SchemaNode(colander.String()), 4), hammer.adapt_string)
+        with self.assertRaises(TypeError):
+            snapshot.adapters[4][colander.String] = hammer.adapt_int
+
+    def test_caches_and_plans_keep_registries_apart(self):
+        registry = self.make_registry()
+        cache = hammer.SchemaCache()
+        upper = hammer.to_json_schema(Person(), cache=cache,
+                                      registry=registry)
+        plain = hammer.to_json_schema(Person(), cache=cache)
+        self.assertNotEqual(upper, plain)
+        self.assertNotEqual(
+            hammer.to_json_schema_bytes(Person(), registry=registry),
+            hammer.to_json_schema_bytes(Person()))
+
+        plan = hammer.compile(Person(), registry=registry)
+        self.assertEqual(plan(), upper)
+
+        @registry.adapts(colander.Int)
+        def adapt_count(schema, **kwargs):
+            return {'type': 'integer'}
+
+        self.assertEqual(plan()['properties']['age']['type'], 'integer')
+
+    def test_conversions_run_while_adapters_are_registered(self):
+        registry = hammer.default_registry.copy()
+        expected = hammer.to_json_schema(Person(), registry=registry)
+        failures = []
+
+        def convert():
+            for _ in range(200):
+                if hammer.to_json_schema(Person(),
+                                         registry=registry) != expected:
+                    failures.append(True)
+
+        threads = [threading.Thread(target=convert) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(200):
+            registry.register(colander.String, hammer.adapt_string)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+
+class TestMultipleDrafts(HammerTestCase):
+    def test_matches_separate_conversions(self):
+        for schema in (Person(), Phone(), Friends(), UniqueThings()):
+            documents = hammer.to_json_schemas(schema)
+            self.assertEqual(sorted(documents), [3, 4])
+            for draft_version in (3, 4):
+                self.assertEqual(documents[draft_version],
+                                 hammer.to_json_schema(
+                                     schema, draft_version=draft_version))
+
+    def test_shares_draft_independent_properties(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='nickname',
+                                missing=colander.drop),
+            colander.SchemaNode(colander.Float(), name='score',
+                                missing=colander.drop),
+            Phone(name='phone'))
+        documents = hammer.to_json_schemas(schema)
+        draft3 = documents[3]['properties']
+        draft4 = documents[4]['properties']
+
+        self.assertIs(draft3['nickname'], draft4['nickname'])
+        # Floats differ between drafts.
+        self.assertIsNot(draft3['score'], draft4['score'])
+        # Required properties differ only in their flag.
+        location3 = draft3['phone']['properties']['location']
+        location4 = draft4['phone']['properties']['location']
+        self.assertIs(location3['enum'], location4['enum'])
+        self.assertTrue(location3['required'])
+        self.assertNotIn('required', location4)
+
+    def test_uses_adapters_registered_for_one_draft(self):
+        registry = hammer.default_registry.copy()
+        registry.register(colander.String, lambda schema, **kwargs: {
+            'type': 'string', 'maxLength': 3}, draft_version=3)
+
+        documents = hammer.to_json_schemas(Person(), registry=registry)
+        self.assertEqual(documents[3]['properties']['name']['maxLength'], 3)
+        self.assertNotIn('maxLength', documents[4]['properties']['name'])
+        self.assertEqual(documents[4], hammer.to_json_schema(Person()))
+
+    def test_rejects_unsupported_drafts(self):
+        with self.assertRaises(ValueError):
+            hammer.to_json_schemas(Person(), draft_versions=(4, 5))
+
+
+class TestValidatorFields(HammerTestCase):
+    def test_fields_are_shared_and_read_only(self):
+        choices = colander.OneOf(['home', 'work'])
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='a',
+                                validator=choices),
+            colander.SchemaNode(colander.String(), name='b',
+                                validator=choices))
+        properties = hammer.to_json_schema(schema)['properties']
+
+        self.assertIs(properties['a']['enum'], properties['b']['enum'])
+        with self.assertRaises(TypeError):
+            properties['a']['enum'].append('mobile')
+        self.assertEqual(json.loads(json.dumps(properties['a']['enum'])),
+                         ['home', 'work'])
+
+        # Copies can be changed, and the validator's choices are not shared.
+        copied = hammer._copy_json(properties['a'])
+        copied['enum'].append('mobile')
+        self.assertEqual(choices.choices, ['home', 'work'])
+        self.assertEqual(hammer.to_json_schema(schema)['properties']['a'],
+                         {'type': 'string', 'format': 'alphanumeric',
+                          'enum': ['home', 'work']})
+
+    def test_fields_are_converted_once_per_validator(self):
+        calls = []
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.Range)
+        def adapt_range(validator, **kwargs):
+            calls.append(validator)
+            return hammer.adapt_range(validator, **kwargs)
+
+        bounded = colander.Range(0, 10)
+        schema = colander.SchemaNode(colander.Mapping(), *[
+            colander.SchemaNode(colander.Int(), name='n%d' % i,
+                                validator=bounded)
+            for i in range(5)])
+        hammer.to_json_schema(schema, registry=registry)
+        hammer.to_json_schema(schema, registry=registry)
+        self.assertEqual(calls, [bounded])
+
+        hammer.to_json_schema(schema, draft_version=3, registry=registry)
+        self.assertEqual(len(calls), 2)
+
+
+class TestAllAdapter(HammerTestCase):
+    def convert(self, validator, **kwargs):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.Int(), name='n',
+                                validator=validator))
+        return hammer.to_json_schema(schema, **kwargs)['properties']['n']
+
+    def test_merges_and_flattens_validators(self):
+        json_schema = self.convert(colander.All(
+            colander.Range(0, 100),
+            colander.All(colander.Range(10, 200),
+                         colander.OneOf([5, 10, 20, 300])),
+            colander.OneOf([20, 10, 40]),
+            colander.Function(lambda value: True)))
+
+        self.assertEqual(json_schema['minimum'], 10)
+        self.assertEqual(json_schema['maximum'], 100)
+        self.assertEqual(json_schema['enum'], [10, 20])
+        self.assertNotIn('allOf', json_schema)
+        self.validate_schema(json_schema)
+
+    def test_conflicting_fields_go_into_all_of(self):
+        validator = colander.All(colander.Regex('^a'), colander.Regex('b$'))
+        json_schema = self.convert(validator)
+        self.assertEqual(json_schema['pattern'], '^a')
+        self.assertEqual(json_schema['allOf'], [{'pattern': 'b$'}])
+        self.validate_schema(json_schema)
+
+        json_schema = self.convert(validator, draft_version=3)
+        self.assertEqual(json_schema['extends'], [{'pattern': 'b$'}])
+
+
+class TestLargeEnumAdapter(HammerTestCase):
+    def setUp(self):
+        self.adapter = hammer.LargeEnumAdapter(min_size=3, sort=True)
+        self.registry = hammer.default_registry.copy()
+        self.registry.register(colander.OneOf, self.adapter)
+        choices = ['b', 'a', 'c', 'a', True, 1]
+        self.schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.String(), name='first',
+                                validator=colander.OneOf(choices)),
+            colander.SchemaNode(colander.String(), name='second',
+                                validator=colander.OneOf(list(choices)),
+                                missing=colander.drop),
+            Phone(name='phone'))
+
+    def test_choices_are_stored_once(self):
+        json_schema = hammer.to_json_schema(self.schema,
+                                            registry=self.registry)
+        properties = json_schema['properties']
+        first = properties['first']['allOf'][0]
+        self.assertIs(properties['second']['allOf'][0], first)
+        self.assertEqual(first, {'enum': [True, 1, 'a', 'b', 'c']})
+        # Small sets of choices are converted as usual.
+        self.assertEqual(
+            properties['phone']['properties']['location']['enum'],
+            ['home', 'work'])
+
+        choices = self.adapter.choices(self.schema['first'].validator)
+        self.assertIs(choices, first['enum'])
+        self.assertEqual(choices.members, frozenset(['a', 'b', 'c', 1]))
+        self.assertFalse(choices.strings)
+        self.validate_schema(json_schema)
+
+        json_schema = hammer.to_json_schema(self.schema, draft_version=3,
+                                            registry=self.registry)
+        self.assertIs(json_schema['properties']['first']['extends'][0], first)
+
+    def test_choices_are_emitted_by_reference(self):
+        json_schema = hammer.to_json_schema(self.schema, use_definitions=True,
+                                            registry=self.registry)
+        self.assertEqual(json_schema['definitions'],
+                         {'enum': {'enum': [True, 1, 'a', 'b', 'c']}})
+        for name in ('first', 'second'):
+            self.assertEqual(json_schema['properties'][name]['allOf'],
+                             [{'$ref': '#/definitions/enum'}])
+
+        validator = Draft4Validator(json_schema)
+        phone = {'location': 'home', 'number': '1'}
+        self.assertTrue(validator.is_valid({'first': 'a', 'phone': phone}))
+        self.assertFalse(validator.is_valid({'first': 'd', 'phone': phone}))
+
+    def test_serialized_once(self):
+        data = hammer.to_json_schema_bytes(self.schema, cache=None,
+                                           registry=self.registry).data
+        self.assertEqual(json.loads(data.decode('utf-8')),
+                         hammer.to_json_schema(self.schema,
+                                               registry=self.registry))
+        choices = self.adapter.choices(self.schema['first'].validator)
+        self.assertEqual(choices.text, '[true,1,"a","b","c"]')
+
+    def test_keyword_depends_on_draft(self):
+        documents = hammer.to_json_schemas(self.schema,
+                                           registry=self.registry)
+        first = self.adapter.choices(self.schema['first'].validator)
+        for draft_version, keyword in ((3, 'extends'), (4, 'allOf')):
+            properties = documents[draft_version]['properties']
+            for name in ('first', 'second'):
+                self.assertNotIn('extends' if draft_version == 4
+                                 else 'allOf', properties[name])
+                self.assertIs(properties[name][keyword][0]['enum'], first)
+            self.assertEqual(documents[draft_version],
+                             hammer.to_json_schema(
+                                 self.schema, draft_version=draft_version,
+                                 registry=self.registry))
@@ -0,0 +1,131 @@
+import json
+import pickle
+
+import colander
+import hammer
+
+from hammer import benchmark, ir
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+class TestSchemaIR(HammerTestCase):
+    def test_same_document_as_to_json_schema(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            schema = benchmark.generate_schema(12, 2, seed=draft_version)
+            json_schema = hammer.to_json_schema(schema,
+                                                draft_version=draft_version)
+            document = ir.to_schema_ir(schema, draft_version=draft_version)
+
+            self.assertEqual(document, json_schema)
+            self.assertEqual(document.to_dict(), json_schema)
+            self.assertIs(type(document.to_dict()), dict)
+            self.assertEqual(json.loads(document.to_json()), json_schema)
+            self.assertEqual(
+                list(document.events()),
+                list(hammer.to_json_schema_events(
+                    schema, draft_version=draft_version)))
+
+    def test_read_only_mapping(self):
+        document = ir.to_schema_ir(Person())
+        self.assertEqual(list(document), list(hammer.to_json_schema(Person())))
+        self.assertEqual(document['properties']['name']['type'], 'string')
+        self.assertIn('required', document)
+        self.assertIsInstance(document['required'], ir.Array)
+        self.assertEqual(document['required'], ['name', 'age', 'friends'])
+        with self.assertRaises(TypeError):
+            document['type'] = 'array'
+        with self.assertRaises(AttributeError):
+            document._values = ()
+
+    def test_equal_subschemas_are_shared(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            *[colander.SchemaNode(colander.String(), name='name%d' % index,
+                                  validator=colander.Length(1, 5))
+              for index in range(20)])
+        properties = ir.to_schema_ir(schema)['properties']
+        self.assertEqual(len(set(map(id, properties.values()))), 1)
+        self.assertEqual(properties['name0'],
+                         {'type': 'string', 'format': 'alphanumeric',
+                          'minLength': 1, 'maxLength': 5})
+
+    def test_equal_subtrees_are_converted_once(self):
+        calls = []
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.Mapping, deferrable=True)
+        def adapt_mapping(schema, **kwargs):
+            calls.append(schema.name)
+            return hammer.adapt_mapping(schema, **kwargs)
+
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            *[Person(name='person%d' % index) for index in range(5)])
+        document = ir.to_schema_ir(schema, registry=registry)
+        self.assertEqual(calls, ['', 'person0'])
+        self.assertIs(document['properties']['person0'],
+                      document['properties']['person4'])
+        self.assertEqual(document, hammer.to_json_schema(schema))
+
+    def test_subtrees_differing_in_what_adapters_read_are_not_shared(self):
+        registry = hammer.default_registry.copy()
+
+        @registry.adapts(colander.String)
+        def adapt_described_string(schema, **kwargs):
+            json_property = hammer.adapt_string(schema, **kwargs)
+            json_property['description'] = schema.description
+            return json_property
+
+        schema = colander.SchemaNode(colander.Mapping(), *[
+            colander.SchemaNode(
+                colander.Mapping(),
+                colander.SchemaNode(colander.String(), name='x',
+                                    description=description),
+                name=name)
+            for name, description in (('a', 'first'), ('b', 'second'))])
+        document = ir.to_schema_ir(schema, registry=registry).to_dict()
+        self.assertEqual(document,
+                         hammer.to_json_schema(schema, registry=registry))
+        self.assertEqual(document['properties']['b']['properties']['x'][
+            'description'], 'second')
+
+    def test_keeps_types_apart(self):
+        table = ir.InternTable()
+        first = table.schema(['enum'], [table.array([1, 2])])
+        second = table.schema(['enum'], [table.array([True, 2])])
+        third = table.schema(['enum'], [table.array([1.0, 2])])
+        self.assertIsNot(first, second)
+        self.assertIsNot(first, third)
+        self.assertNotEqual(first, second)
+        self.assertIs(table.schema(['enum'], [table.array([1, 2])]), first)
+        self.assertEqual(first, {'enum': [1, 2]})
+        self.assertEqual(json.loads(third.to_json()), {'enum': [1.0, 2]})
+
+    def test_shared_table_and_pickle(self):
+        table = ir.InternTable()
+        first = ir.to_schema_ir(Person(), table=table)
+        size = len(table)
+        second = ir.to_schema_ir(Person(), table=table)
+        self.assertIs(first, second)
+        self.assertEqual(len(table), size)
+
+        copy = pickle.loads(pickle.dumps(first))
+        self.assertEqual(copy, first)
+        self.assertEqual(hash(copy), hash(first))
+
+    def test_large_enums(self):
+        registry = hammer.default_registry.copy()
+        registry.register(colander.OneOf, hammer.LargeEnumAdapter(min_size=2))
+        choices = ['choice%d' % index for index in range(100)]
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            *[colander.SchemaNode(colander.String(), name='kind%d' % index,
+                                  validator=colander.OneOf(choices))
+              for index in range(3)])
+        document = ir.to_schema_ir(schema, registry=registry)
+        enums = [document['properties']['kind%d' % index]['allOf'][0]
+                 for index in range(3)]
+        self.assertIs(enums[0], enums[2])
+        self.assertEqual(enums[0]['enum'], choices)
+        self.assertEqual(document, hammer.to_json_schema(schema,
+                                                         registry=registry))
@@ -0,0 +1,98 @@
+import hammer
+
+from hammer import profiling
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+class RecordingHook(hammer.Hook):
+    def __init__(self):
+        self.events = []
+
+    def enter(self, kind, target, adapter):
+        self.events.append(('enter', kind, adapter.__name__))
+
+    def exit(self, kind, target, adapter):
+        self.events.append(('exit', kind, adapter.__name__))
+
+    def defer(self, node):
+        self.events.append(('defer', node.name))
+
+
+class TestHooks(HammerTestCase):
+    def test_hook_is_notified_around_adapter_calls(self):
+        hook = RecordingHook()
+        hammer.add_hook(hook)
+        try:
+            hammer.to_json_schema(Person())
+        finally:
+            hammer.remove_hook(hook)
+
+        events = hook.events
+        self.assertEqual(events[0], ('enter', 'schema', 'adapt_mapping'))
+        self.assertIn(('defer', 'friends'), events)
+        self.assertIn(('enter', 'validator', 'adapt_range'), events)
+        enters = [e for e in events if e[0] == 'enter']
+        exits = [e for e in events if e[0] == 'exit']
+        self.assertEqual(len(enters), len(exits))
+
+        # The range validator runs within the ``age`` node's adapter call.
+        start = events.index(('enter', 'schema', 'adapt_int'))
+        self.assertEqual(events[start + 1:start + 4], [
+            ('enter', 'validator', 'adapt_range'),
+            ('exit', 'validator', 'adapt_range'),
+            ('exit', 'schema', 'adapt_int'),
+        ])
+
+    def test_removed_hook_is_not_notified(self):
+        hook = RecordingHook()
+        hammer.add_hook(hook)
+        hammer.remove_hook(hook)
+        hammer.to_json_schema(Person())
+        self.assertEqual(hook.events, [])
+
+    def test_hooks_do_not_change_the_result(self):
+        expected = hammer.to_json_schema(Person(), draft_version=3)
+        with profiling.Profiler():
+            self.assertEqual(
+                hammer.to_json_schema(Person(), draft_version=3), expected)
+
+
+class TestProfiler(HammerTestCase):
+    def test_records_adapters_and_node_paths(self):
+        profiler = profiling.profile(Person())
+
+        self.assertEqual(profiler.adapters['hammer.adapt_int'].calls, 2)
+        self.assertEqual(profiler.adapters['hammer.adapt_range'].calls, 2)
+        self.assertEqual(sorted(profiler.paths), [
+            '/', '/age', '/friends', '/friends/friend',
+            '/friends/friend/name', '/friends/friend/rank',
+            '/friends/friend/still_friends', '/name'])
+
+        root = profiler.paths['/']
+        self.assertEqual(root.calls, 1)
+        self.assertGreaterEqual(root.cumulative, root.self_time)
+        self.assertGreater(root.self_time, 0)
+
+        # Self times add up to the time spent in adapters.
+        total = sum(stats.self_time for stats in profiler.adapters.values())
+        outermost = root.cumulative + \
+            profiler.paths['/friends'].cumulative + \
+            profiler.paths['/friends/friend'].cumulative
+        self.assertAlmostEqual(total, outermost, places=3)
+
+    def test_traces_allocations(self):
+        profiler = profiling.profile(Person(), trace_memory=True)
+        self.assertGreater(profiler.paths['/'].allocated, 0)
+        self.assertIn('self alloc', profiler.report())
+
+    def test_report_lists_adapters_and_paths(self):
+        profiler = profiling.profile(Person())
+        report = profiler.report(limit=3)
+        self.assertIn('hammer.adapt_mapping', report)
+        self.assertIn('node path', report)
+        self.assertEqual(len(report.splitlines()), 9)
+
+    def test_profiler_is_removed_on_exit(self):
+        with profiling.Profiler() as profiler:
+            pass
+        self.assertNotIn(profiler, hammer._hooks)
@@ -0,0 +1,98 @@
+import unittest
+
+import colander
+import hammer
+
+from jsonschema import Draft4Validator
+from hammer import sample
+from hammer.test.test_hammer import HammerTestCase, Person
+
+
+class Order(colander.MappingSchema):
+    quantity = colander.SchemaNode(colander.Int(),
+                                   validator=colander.Range(1, 10))
+    price = colander.SchemaNode(colander.Float(),
+                                validator=colander.Range(0.5, 2.5))
+    paid = colander.SchemaNode(colander.Bool())
+    placed = colander.SchemaNode(colander.DateTime())
+    due = colander.SchemaNode(colander.Date())
+    code = colander.SchemaNode(colander.String(),
+                               validator=colander.Regex(r'^[A-Z]{2}-\d{3}$'))
+    note = colander.SchemaNode(colander.String(),
+                               validator=colander.Length(2, 5))
+    email = colander.SchemaNode(colander.String(),
+                                validator=colander.Email())
+    size = colander.SchemaNode(colander.String(),
+                               validator=colander.OneOf(['S', 'M', 'L']))
+    lines = colander.SchemaNode(
+        colander.Sequence(),
+        colander.SchemaNode(colander.Tuple(),
+                            colander.SchemaNode(colander.Int(), name='sku'),
+                            colander.SchemaNode(colander.String(),
+                                                name='name')),
+        validator=colander.Length(1, 3))
+
+
+class TestSampler(HammerTestCase):
+    vectorize = False
+
+    def batches(self, schema, **kwargs):
+        kwargs.setdefault('vectorize', self.vectorize)
+        return list(sample.Sampler(schema, **kwargs.pop('options', {}))
+                    .batches(**kwargs))
+
+    def test_instances_are_valid(self):
+        validator = Draft4Validator(hammer.to_json_schema(Order()))
+        batches = self.batches(Order(), batch_size=100, count=300, seed=1)
+        self.assertEqual([len(batch.instances) for batch in batches],
+                         [100, 100, 100])
+
+        for batch in batches:
+            self.assertEqual(batch.invalid, [])
+            for instance in batch.instances:
+                self.assertEqual(list(validator.iter_errors(instance)), [])
+                appstruct = Order().deserialize(instance)
+                self.assertTrue(1 <= appstruct['quantity'] <= 10)
+                self.assertTrue(1 <= len(appstruct['lines']) <= 3)
+                self.assertEqual(len(appstruct['lines'][0]), 2)
+                self.assertIn(appstruct['size'], ['S', 'M', 'L'])
+                self.assertTrue(2 <= len(appstruct['note']) <= 5)
+
+    def test_invalid_instances(self):
+        validator = Draft4Validator(hammer.to_json_schema(Order()))
+        batch, = self.batches(Order(), batch_size=500, count=500, seed=2,
+                              invalid_ratio=0.2)
+        self.assertTrue(50 < len(batch.invalid) < 150)
+        for index, instance in enumerate(batch.instances):
+            self.assertEqual(validator.is_valid(instance),
+                             index not in batch.invalid)
+
+    def test_seed_gives_the_same_instances(self):
+        first = self.batches(Person(), batch_size=7, count=10, seed=3)
+        second = self.batches(Person(), batch_size=7, count=10, seed=3)
+        self.assertEqual(first, second)
+        self.assertEqual([len(batch.instances) for batch in first], [7, 3])
+        self.assertNotEqual(
+            first, self.batches(Person(), batch_size=7, count=10, seed=4))
+
+    def test_uses_the_registry(self):
+        registry = hammer.default_registry.copy()
+        registry.register(colander.OneOf, hammer.LargeEnumAdapter(min_size=2))
+        batch, = self.batches(
+            Order(), batch_size=50, count=50, seed=5,
+            options={'registry': registry})
+        self.assertEqual(set(instance['size'] for instance in batch.instances),
+                         set(['S', 'M', 'L']))
+
+    def test_rejects_what_cannot_be_generated(self):
+        schema = colander.SchemaNode(
+            colander.Mapping(),
+            colander.SchemaNode(colander.Int(), name='count',
+                                validator=colander.Range(5, 1)))
+        with self.assertRaises(ValueError):
+            sample.Sampler(schema)
+
+
+@unittest.skipIf(sample.numpy is None, 'NumPy is not installed')
+class TestVectorizedSampler(TestSampler):
+    vectorize = True
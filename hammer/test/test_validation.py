@@ -0,0 +1,141 @@
+import colander
+import hammer
+
+from jsonschema import Draft3Validator, Draft4Validator
+
+from hammer.test.test_hammer import HammerTestCase, Person, Phone
+from hammer.validation import ValidationError, Validator, compile_validator
+
+
+class Record(colander.Schema):
+    code = colander.SchemaNode(colander.String(),
+                               validator=colander.Regex(r'^[A-Z]{3}$'))
+    label = colander.SchemaNode(colander.String(),
+                                validator=colander.Length(1, 8),
+                                missing=colander.drop)
+    price = colander.SchemaNode(colander.Float(),
+                                validator=colander.Range(0, 100))
+    tags = colander.SchemaNode(colander.Set())
+    home = Phone()
+    work = Phone()
+
+
+INSTANCES = [
+    {'code': 'ABC', 'price': 1.5, 'tags': [],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'label': 'cheap', 'price': 99.5, 'tags': [1, 2],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'abc', 'price': 1.5, 'tags': [],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'label': '', 'price': 1.5, 'tags': [],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'price': 2, 'tags': [],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'price': 101.5, 'tags': [1, 1],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'price': True, 'tags': [],
+     'home': {'location': 'home', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'price': 1.5, 'tags': [],
+     'home': {'location': 'office', 'number': '1'},
+     'work': {'location': 'work', 'number': '2'}},
+    {'code': 'ABC', 'price': 1.5, 'tags': [],
+     'home': {'location': 'home', 'number': '1'}},
+    {'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob', True]]},
+    {'name': 'Ann', 'age': 300, 'friends': [[1, 'Bob', True]]},
+    {'name': 'Ann', 'age': 30, 'friends': [[1, 'Bob']]},
+    {'name': 'Ann', 'age': 30, 'friends': [[1, 2, True]]},
+    {'name': 'Ann', 'age': 30, 'friends': [[-1, 'Bob', True]]},
+    {'name': 'Ann', 'age': 30, 'friends': {}},
+    [],
+    'Ann',
+    None,
+]
+
+
+class TestCompileValidator(HammerTestCase):
+    def assert_equivalent(self, schema, draft_version, include_types=True):
+        json_schema = hammer.to_json_schema(schema,
+                                            draft_version=draft_version,
+                                            include_types=include_types)
+        reference = {3: Draft3Validator, 4: Draft4Validator}[draft_version]
+        reference = reference(json_schema)
+        validator = compile_validator(schema, draft_version=draft_version,
+                                      include_types=include_types)
+
+        for instance in INSTANCES:
+            self.assertEqual(validator.is_valid(instance),
+                             reference.is_valid(instance), instance)
+
+    def test_agrees_with_jsonschema(self):
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            for include_types in (True, False):
+                for schema in (Record(), Person()):
+                    self.assert_equivalent(schema, draft_version,
+                                           include_types)
+
+    def test_validate_reports_the_path_of_the_problem(self):
+        validator = compile_validator(Person())
+        validator.validate(INSTANCES[9])
+
+        with self.assertRaises(ValidationError) as context:
+            validator.validate(INSTANCES[13])
+        self.assertEqual(context.exception.path, ('friends', 0, 0))
+        self.assertIn('minimum', context.exception.message)
+
+    def test_enums_are_frozensets_and_patterns_are_compiled(self):
+        validator = compile_validator(Record())
+        self.assertNotIn('re.compile', validator.source)
+        self.assertIn("x.__class__ is str and x in", validator.source)
+
+    def test_enum_does_not_confuse_booleans_and_numbers(self):
+        validator = Validator({'enum': [1, 'a']})
+        self.assertTrue(validator.is_valid(1))
+        self.assertTrue(validator.is_valid(1.0))
+        self.assertFalse(validator.is_valid(True))
+        self.assertFalse(validator.is_valid([1]))
+
+    def test_integers_agree_with_jsonschema(self):
+        json_schema = {'type': 'integer'}
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            reference = {3: Draft3Validator, 4: Draft4Validator}[
+                draft_version](json_schema)
+            validator = Validator(json_schema, draft_version=draft_version)
+            for instance in (1, -1, 1.0, 1.5, True, '1'):
+                self.assertEqual(validator.is_valid(instance),
+                                 reference.is_valid(instance), instance)
+        self.assertFalse(validator.is_valid(1.0))
+
+    def test_large_enums_use_their_members(self):
+        registry = hammer.default_registry.copy()
+        registry.register(colander.OneOf, hammer.LargeEnumAdapter(min_size=2))
+        for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+            validator = compile_validator(Phone(), draft_version=draft_version,
+                                          registry=registry)
+            self.assertTrue(validator.is_valid(
+                {'location': 'home', 'number': '1'}))
+            self.assertFalse(validator.is_valid(
+                {'location': 'mobile', 'number': '1'}))
+
+    def test_one_sided_ranges(self):
+        for validator, valid, invalid in ((colander.Range(max=10), -5, 11),
+                                          (colander.Range(min=0), 1000, -1)):
+            schema = colander.SchemaNode(
+                colander.Mapping(),
+                colander.SchemaNode(colander.Int(), name='n',
+                                    validator=validator))
+            for draft_version in hammer.SUPPORTED_JSON_DRAFT_VERSIONS:
+                compiled = compile_validator(schema,
+                                             draft_version=draft_version)
+                self.assertTrue(compiled.is_valid({'n': valid}))
+                self.assertFalse(compiled.is_valid({'n': invalid}))
+
+    def test_unsupported_keywords_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Validator({'type': 'string', 'dependencies': {}})
@@ -0,0 +1,524 @@
+# coding=utf-8
+"""
+validation.py: Generate Python validation functions from Colander schemas.
+
+A schema is converted to JSON schema with :func:`hammer.to_json_schema` and
+the document is then compiled into Python source with one function per
+subschema, so the generated validator accepts exactly what the emitted JSON
+schema accepts. Patterns are compiled and enumerations turned into frozensets
+once, when the validator is generated.
+
+As with JSON Schema validators by default, ``format`` is not validated.
+"""
+import numbers
+import re
+
+import hammer
+
+
+class ValidationError(Exception):
+    """
+    Raised by :meth:`Validator.validate` for an invalid instance.
+
+    ``path`` is a tuple of the keys and indexes leading from the validated
+    instance to the invalid value.
+    """
+    def __init__(self, message, path=()):
+        super(ValidationError, self).__init__(message, path)
+        self.message = message
+        self.path = path
+
+    def __str__(self):
+        if not self.path:
+            return self.message
+        return '%s (at %s)' % (self.message,
+                               '/'.join(str(key) for key in self.path))
+
+
+def _json_key(value):
+    """
+    Return a hashable key for the JSON value ``value`` that is equal to the
+    key of another value exactly when JSON Schema considers them equal. In
+    particular, booleans do not equal the numbers 0 and 1.
+    """
+    if value.__class__ is bool:
+        return bool, value
+    if isinstance(value, list):
+        return list, tuple(_json_key(item) for item in value)
+    if isinstance(value, dict):
+        return dict, frozenset((key, _json_key(item))
+                               for key, item in value.items())
+    return value
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and value.__class__ is not bool
+
+
+def _is_integer(value):
+    # Floats are never integers in drafts 3 and 4, even when integral.
+    return isinstance(value, numbers.Integral) and value.__class__ is not bool
+
+
+def _not_multiple(value, factor):
+    if isinstance(factor, float):
+        quotient = value / factor
+        return int(quotient) != quotient
+    return value % factor
+
+
+def _unique(value):
+    try:
+        keys = [_json_key(item) for item in value]
+        return len(set(keys)) == len(keys)
+    except TypeError:
+        return all(value.index(item) == index
+                   for index, item in enumerate(value))
+
+
+# Expressions testing whether ``x`` is of each JSON type. The common Python
+# types are checked first so the helpers only run for unusual values.
+_TYPE_TESTS = {
+    'string': 'isinstance(x, str)',
+    'boolean': 'x.__class__ is bool',
+    'object': 'isinstance(x, dict)',
+    'array': 'isinstance(x, list)',
+    'null': 'x is None',
+    'any': 'True',
+    'number': '(x.__class__ is int or x.__class__ is float or '
+              '_is_number(x))',
+    'integer': '(x.__class__ is int or _is_integer(x))',
+}
+
+# The instance types that the keywords of each group apply to.
+_NUMBER_KEYWORDS = ('minimum', 'maximum', 'multipleOf', 'divisibleBy')
+_STRING_KEYWORDS = ('minLength', 'maxLength', 'pattern')
+_ARRAY_KEYWORDS = ('items', 'minItems', 'maxItems', 'uniqueItems',
+                   'additionalItems')
+_OBJECT_KEYWORDS = ('properties', 'required', 'additionalProperties',
+                    'minProperties', 'maxProperties')
+
+# Keywords that do not affect validation.
+_ANNOTATION_KEYWORDS = frozenset((
+    '$schema', 'id', 'title', 'description', 'default', 'format',
+    'definitions', 'optional', 'exclusiveMinimum', 'exclusiveMaximum',
+))
+
+_SUPPORTED_KEYWORDS = frozenset(
+    ('type', 'enum', 'not', '$ref', 'allOf', 'anyOf', 'oneOf', 'extends') +
+    _NUMBER_KEYWORDS + _STRING_KEYWORDS + _ARRAY_KEYWORDS +
+    _OBJECT_KEYWORDS) | _ANNOTATION_KEYWORDS
+
+
+# Keywords that one draft defines and the other does not, and which
+# validators of that draft therefore ignore.
+_OTHER_DRAFT_KEYWORDS = {
+    3: frozenset(('not', 'multipleOf', 'allOf', 'anyOf', 'oneOf',
+                  'minProperties', 'maxProperties')),
+    4: frozenset(('divisibleBy', 'extends')),
+}
+
+
+class _Generator(object):
+    """
+    Generates the source of a validator for a JSON schema document.
+
+    Each subschema becomes a function of the instance ``x`` that returns None
+    if ``x`` is valid, else a ``(message, path)`` tuple.
+    """
+    def __init__(self, root, draft_version):
+        self.root = root
+        self.draft_version = draft_version
+        self.namespace = {
+            '_is_number': _is_number,
+            '_is_integer': _is_integer,
+            '_json_key': _json_key,
+            '_not_multiple': _not_multiple,
+            '_unique': _unique,
+        }
+        self.functions = {}
+        self.pending = []
+        self.sources = []
+
+    def generate(self):
+        """
+        Return the name of the function validating the root document.
+        """
+        name = self.function(self.root)
+
+        while self.pending:
+            self.sources.append(self.body(*self.pending.pop()))
+
+        return name
+
+    def constant(self, value):
+        name = '_c%d' % len(self.namespace)
+        self.namespace[name] = value
+        return name
+
+    def function(self, schema):
+        """
+        Return the name of the function for ``schema``, queueing it to be
+        generated if it has not been already.
+        """
+        schema = self.dereference(schema)
+        name = self.functions.get(id(schema))
+        if name is None:
+            name = self.functions[id(schema)] = '_v%d' % len(self.functions)
+            self.pending.append((name, schema))
+        return name
+
+    def dereference(self, schema):
+        """
+        Return the schema ``schema`` refers to if it is only a ``$ref``, else
+        ``schema`` itself.
+        """
+        ref = schema.get('$ref')
+        if ref is not None and len(schema) == 1:
+            return self.resolve(ref)
+        return schema
+
+    def resolve(self, ref):
+        if not ref.startswith('#'):
+            raise ValueError('Only local references are supported: %s' % ref)
+        schema = self.root
+        for token in ref[1:].split('/')[1:]:
+            token = hammer._unescape_pointer(token)
+            schema = schema[int(token) if isinstance(schema, list) else token]
+        return schema
+
+    def type_test(self, json_type):
+        if isinstance(json_type, list):
+            return '(%s)' % ' or '.join(self.type_test(each)
+                                        for each in json_type)
+        if json_type not in _TYPE_TESTS:
+            raise ValueError('Unsupported type: %r' % (json_type,))
+        return _TYPE_TESTS[json_type]
+
+    def body(self, name, schema):
+        ignored = _OTHER_DRAFT_KEYWORDS[self.draft_version]
+        schema = dict((keyword, value) for keyword, value in schema.items()
+                      if keyword not in ignored)
+        unsupported = set(schema) - _SUPPORTED_KEYWORDS
+        if unsupported:
+            raise ValueError('Unsupported keywords: %s' % ', '.join(
+                sorted(unsupported)))
+
+        lines = ['def %s(x):' % name]
+        json_type = schema.get('type')
+
+        if json_type is not None:
+            lines += [
+                '    if not %s:' % self.type_test(json_type),
+                '        return "%%r is not of type %%r" %% (x, %s), ()' %
+                self.constant(json_type),
+            ]
+
+        lines += self.any_checks(schema)
+
+        for group_type, keywords, checks in (
+                ('number', _NUMBER_KEYWORDS, self.number_checks),
+                ('string', _STRING_KEYWORDS, self.string_checks),
+                ('array', _ARRAY_KEYWORDS, self.array_checks),
+                ('object', _OBJECT_KEYWORDS, self.object_checks)):
+            group = checks(schema)
+            if not group:
+                continue
+            if json_type == group_type:
+                lines += group
+            else:
+                lines.append('    if %s:' % _TYPE_TESTS[group_type])
+                lines += ['    ' + line for line in group]
+
+        lines.append('    return None')
+        return '\n'.join(lines)
+
+    def fail(self, message, *values):
+        """
+        Return a line returning ``message`` formatted with the Python
+        expressions ``values``.
+        """
+        if values:
+            message = '%r %% (%s,)' % (message, ', '.join(values))
+        else:
+            message = repr(message)
+        return '        return %s, ()' % message
+
+    def delegate(self, subschema, expression, key, indent='    '):
+        """
+        Return lines validating ``expression`` against ``subschema`` and
+        prefixing the path of any error with the expression ``key``.
+        """
+        return [
+            indent + 'e = %s(%s)' % (self.function(subschema), expression),
+            indent + 'if e is not None:',
+            indent + '    return e[0], (%s,) + e[1]' % key,
+        ]
+
+    def any_checks(self, schema):
+        lines = []
+
+        if 'enum' in schema:
+            choices = schema['enum']
+            if choices.__class__ is hammer.EnumChoices and choices.strings:
+                # Strings are their own keys.
+                keys = choices.members
+                strings = True
+            else:
+                try:
+                    keys = frozenset(_json_key(choice) for choice in choices)
+                except TypeError:
+                    keys = None
+                strings = all(isinstance(c, str) for c in choices)
+
+            if keys is not None and strings:
+                test = 'x.__class__ is str and x in %s' % self.constant(keys)
+            elif keys is not None:
+                test = '_json_key(x) in %s' % self.constant(keys)
+            else:
+                test = 'x in %s' % self.constant(list(choices))
+            lines += [
+                '    if not (%s):' % test,
+                self.fail('%r is not one of %r', 'x',
+                          self.constant(choices)),
+            ]
+
+        if 'not' in schema:
+            lines += [
+                '    if %s(x) is None:' % self.function(schema['not']),
+                self.fail('%r is not allowed for %r',
+                          self.constant(schema['not']), 'x'),
+            ]
+
+        if '$ref' in schema:
+            lines += [
+                '    e = %s(x)' % self.function(self.resolve(schema['$ref'])),
+                '    if e is not None:',
+                '        return e',
+            ]
+
+        # Draft 3's "extends" is a schema or a list of them that all apply.
+        extends = schema.get('extends', ())
+        if isinstance(extends, dict):
+            extends = [extends]
+
+        for subschema in list(schema.get('allOf', ())) + list(extends):
+            lines += [
+                '    e = %s(x)' % self.function(subschema),
+                '    if e is not None:',
+                '        return e',
+            ]
+
+        if 'anyOf' in schema:
+            names = [self.function(subschema)
+                     for subschema in schema['anyOf']]
+            lines += [
+                '    if all(f(x) is not None for f in (%s,)):' %
+                ', '.join(names),
+                self.fail('%r is not valid under any of the given schemas',
+                          'x'),
+            ]
+
+        if 'oneOf' in schema:
+            names = [self.function(subschema)
+                     for subschema in schema['oneOf']]
+            lines += [
+                '    if sum(f(x) is None for f in (%s,)) != 1:' %
+                ', '.join(names),
+                self.fail('%r is not valid under exactly one of the given '
+                          'schemas', 'x'),
+            ]
+
+        return lines
+
+    def number_checks(self, schema):
+        lines = []
+
+        if schema.get('minimum') is not None:
+            minimum = self.constant(schema['minimum'])
+            operator = '<=' if schema.get('exclusiveMinimum') else '<'
+            lines += [
+                '    if x %s %s:' % (operator, minimum),
+                self.fail('%r is less than the minimum of %r', 'x', minimum),
+            ]
+
+        if schema.get('maximum') is not None:
+            maximum = self.constant(schema['maximum'])
+            operator = '>=' if schema.get('exclusiveMaximum') else '>'
+            lines += [
+                '    if x %s %s:' % (operator, maximum),
+                self.fail('%r is greater than the maximum of %r', 'x',
+                          maximum),
+            ]
+
+        for keyword in ('multipleOf', 'divisibleBy'):
+            if keyword in schema:
+                factor = self.constant(schema[keyword])
+                lines += [
+                    '    if _not_multiple(x, %s):' % factor,
+                    self.fail('%r is not a multiple of %r', 'x', factor),
+                ]
+
+        return lines
+
+    def string_checks(self, schema):
+        lines = []
+
+        if schema.get('minLength') is not None:
+            lines += [
+                '    if len(x) < %d:' % schema['minLength'],
+                self.fail('%r is too short', 'x'),
+            ]
+
+        if schema.get('maxLength') is not None:
+            lines += [
+                '    if len(x) > %d:' % schema['maxLength'],
+                self.fail('%r is too long', 'x'),
+            ]
+
+        if 'pattern' in schema:
+            search = self.constant(re.compile(schema['pattern']).search)
+            lines += [
+                '    if %s(x) is None:' % search,
+                self.fail('%r does not match %r', 'x',
+                          self.constant(schema['pattern'])),
+            ]
+
+        return lines
+
+    def array_checks(self, schema):
+        lines = []
+
+        if 'minItems' in schema:
+            lines += [
+                '    if len(x) < %d:' % schema['minItems'],
+                self.fail('%r is too short', 'x'),
+            ]
+
+        if 'maxItems' in schema:
+            lines += [
+                '    if len(x) > %d:' % schema['maxItems'],
+                self.fail('%r is too long', 'x'),
+            ]
+
+        if schema.get('uniqueItems'):
+            lines += [
+                '    if not _unique(x):',
+                self.fail('%r has non-unique elements', 'x'),
+            ]
+
+        items = schema.get('items')
+
+        if isinstance(items, dict):
+            lines.append('    for i, item in enumerate(x):')
+            lines += self.delegate(items, 'item', 'i', indent='        ')
+        elif isinstance(items, list):
+            for index, subschema in enumerate(items):
+                lines.append('    if len(x) > %d:' % index)
+                lines += self.delegate(subschema, 'x[%d]' % index,
+                                       str(index), indent='        ')
+
+            additional = schema.get('additionalItems', True)
+            if additional is False:
+                lines += [
+                    '    if len(x) > %d:' % len(items),
+                    self.fail('Additional items are not allowed'),
+                ]
+            elif isinstance(additional, dict):
+                lines.append('    for i in range(%d, len(x)):' % len(items))
+                lines += self.delegate(additional, 'x[i]', 'i',
+                                       indent='        ')
+
+        return lines
+
+    def object_checks(self, schema):
+        lines = []
+        properties = schema.get('properties', {})
+        required = schema.get('required')
+
+        if self.draft_version == 3:
+            required = [name for name, subschema in properties.items()
+                        if self.dereference(subschema).get('required') is True]
+
+        if isinstance(required, list):
+            for name in required:
+                lines += [
+                    '    if %r not in x:' % (name,),
+                    self.fail('%r is a required property' % (name,)),
+                ]
+
+        for keyword, limit, operator in (('minProperties', 'few', '<'),
+                                         ('maxProperties', 'many', '>')):
+            if keyword in schema:
+                lines += [
+                    '    if len(x) %s %d:' % (operator, schema[keyword]),
+                    self.fail('%%r has too %s properties' % limit, 'x'),
+                ]
+
+        for name, subschema in properties.items():
+            lines.append('    if %r in x:' % (name,))
+            lines += self.delegate(subschema, 'x[%r]' % (name,), repr(name),
+                                   indent='        ')
+
+        additional = schema.get('additionalProperties', True)
+        if additional is not True:
+            names = self.constant(frozenset(properties))
+            lines.append('    for key in x:')
+            lines.append('        if key not in %s:' % names)
+            if additional is False:
+                lines.append('    ' + self.fail(
+                    'Additional properties are not allowed (%r was '
+                    'unexpected)', 'key'))
+            else:
+                lines += self.delegate(additional, 'x[key]', 'key',
+                                       indent='            ')
+
+        return lines
+
+
+class Validator(object):
+    """
+    A Python validation function generated from the JSON schema document
+    ``json_schema``, which targets JSON Schema draft ``draft_version``.
+    """
+    def __init__(self, json_schema, draft_version=4):
+        generator = _Generator(json_schema, draft_version)
+        name = generator.generate()
+        namespace = generator.namespace
+
+        self.json_schema = json_schema
+        self.draft_version = draft_version
+        self.source = '\n\n'.join(generator.sources)
+        exec(self.source, namespace)
+        self._check = namespace[name]
+
+    def is_valid(self, instance):
+        """
+        Return True if ``instance`` is valid.
+        """
+        return self._check(instance) is None
+
+    __call__ = is_valid
+
+    def validate(self, instance):
+        """
+        Raise :class:`ValidationError` for the first problem found with
+        ``instance``, if it is invalid.
+        """
+        error = self._check(instance)
+        if error is not None:
+            raise ValidationError(*error)
+
+
+def compile_validator(schema, draft_version=4, include_types=True,
+                      registry=None):
+    """
+    Return a :class:`Validator` for the Colander schema *instance*
+    ``schema``, equivalent to validating against
+    ``hammer.to_json_schema(schema, draft_version, include_types, registry)``.
+    """
+    json_schema = hammer.to_json_schema(schema, draft_version=draft_version,
+                                        include_types=include_types,
+                                        use_definitions=True,
+                                        registry=registry)
+    return Validator(json_schema, draft_version=draft_version)
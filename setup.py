@@ -22,7 +22,11 @@ setup(name='hammer',
       include_package_data=True,
       zip_safe=False,
       install_requires=requires,
+      extras_require={'numpy': ['numpy']},
       tests_require=requires,
       test_suite="hammer",
+      entry_points={
+          'console_scripts': ['hammer = hammer.cli:main'],
+      },
       )
 